@@ -16,6 +16,35 @@ app = dash.Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.DARKL
 server = app.server
 print(server)
 
+# =============================================================================
+# Database query metrics 
+# =============================================================================
+@server.route('/api/db-stats')
+def db_stats():
+    from flask import jsonify
+    from db.db_interface import CompanyDbInterface
+    return jsonify(CompanyDbInterface.query_stats.snapshot())
+
+@server.route('/api/metric-cache-stats')
+def metric_cache_stats():
+    from flask import jsonify
+    from pipeline.memo import metric_cache
+    return jsonify(metric_cache.stats())
+
+@server.route('/api/<company>/financials.json')
+def company_financials(company):
+    # Every metric of the company in one JSON document, the payload of the dashboard financials store. Clients sending the ETag
+    # back (If-None-Match) get a 304 while the source data is unchanged. The company instance is shared by every request.
+    from flask import Response, request, abort
+    from pipeline.companies import registry
+    if company not in registry:
+        abort(404)
+    body, etag = registry.instance(company).encoded_financials()
+    response = Response(body, mimetype= 'application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 # =============================================================================
 # Layout components
 # =============================================================================
@@ -0,0 +1,49 @@
+// Client-side side of the financials store (see pages/tesla.py). The store holds the document served by
+// /api/<company>/financials.json, every metric of the company, and the charts built from it are drawn in the browser.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    financials: {
+        // Fetch the financials document. The browser sends the ETag of its cached copy back, so an unchanged document costs a
+        // 304 and leaves the store (and the charts reading it) untouched.
+        fetch: async function(n, url, current) {
+            const response = await fetch(url, {cache: 'no-cache'});
+            if (!response.ok) {
+                return window.dash_clientside.no_update;
+            }
+            const etag = response.headers.get('ETag');
+            if (current && etag && current.etag === etag) {
+                return window.dash_clientside.no_update;
+            }
+            const document = await response.json();
+            return {etag: etag, metrics: document.metrics};
+        },
+
+        // Figure of the selected dropdown values: arguments are the dropdown values, the store data, the figure specs of the
+        // chart ('value|value' -> {metric, x, y, figure}) and the plotly template shared by the specs.
+        figure: function() {
+            const args = Array.prototype.slice.call(arguments);
+            const template = args.pop();
+            const specs = args.pop();
+            const store = args.pop();
+            const spec = specs[args.join('|')];
+            if (spec === undefined) {
+                return '';
+            }
+            if (!store || !(spec.metric in store.metrics)) {
+                return window.dash_clientside.no_update;
+            }
+            const data = store.metrics[spec.metric].data;
+            // Oldest to newest period: quarters as '3Q22', years as numbers.
+            const period = function(value) {
+                const quarter = /^(\d)Q(\d{2})$/.exec(value);
+                return quarter ? 4 * Number(quarter[2]) + Number(quarter[1]) : Number(value);
+            };
+            const order = data[spec.x].map(function(value, i) { return i; });
+            order.sort(function(a, b) { return period(data[spec.x][a]) - period(data[spec.x][b]); });
+            const figure = JSON.parse(JSON.stringify(spec.figure));
+            figure.layout.template = template;
+            figure.data[0].x = order.map(function(i) { return data[spec.x][i]; });
+            figure.data[0].y = order.map(function(i) { return data[spec.y][i]; });
+            return figure;
+        }
+    }
+});
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Builders of MongoDb aggregation pipelines that compute the YoY and TTM timescales server side. Documents are expected to have a
+# 'date' field with quarter labels such as '3Q22'. $setWindowFields requires MongoDb >= 5.0.
+
+DATE_KEY = 'date'
+YEAR_KEY = 'Year'
+ORDINAL_KEY = '_quarterOrdinal'
+
+
+def _year_expression() -> dict:
+    # '3Q22' -> 2022
+    return {'$toInt': {'$concat': ['20', {'$substrCP': ['$' + DATE_KEY, 2, 2]}]}}
+
+
+def _quarter_ordinal_expression() -> dict:
+    # '3Q22' -> 2022 * 4 + 3 - 1. Increases by one every quarter.
+    return {'$add': [{'$multiply': [_year_expression(), 4]},
+                     {'$subtract': [{'$toInt': {'$substrCP': ['$' + DATE_KEY, 0, 1]}}, 1]}]}
+
+
+def yoy_pipeline(keys: list = []) -> list:
+    """ Pipeline that sums every key per calendar year. Output documents have 'Year' and the input keys (except 'date'), sorted by
+    year in descending order.
+
+    Args:
+        keys (list): fields to aggregate. 'date' is used for grouping and dropped from the output. Defaults to [].
+
+    Returns:
+        list: aggregation pipeline stages.
+    """
+    value_keys = [k for k in keys if k != DATE_KEY]
+    group_stage = {'_id': _year_expression()}
+    group_stage.update({k: {'$sum': '$' + k} for k in value_keys})
+    project_stage = {'_id': 0, YEAR_KEY: '$_id'}
+    project_stage.update({k: 1 for k in value_keys})
+    return [
+        {'$group': group_stage},
+        {'$sort': {'_id': -1}},
+        {'$project': project_stage}
+    ]
+
+
+def ttm_pipeline(keys: list = [], n_periods: int = 4) -> list:
+    """ Pipeline that adds a 'TTM' + key field holding the average of the key over the current and previous n_periods - 1 quarters.
+    Output documents are sorted from newest to oldest quarter and keep the original keys.
+
+    Args:
+        keys (list): fields to project. A trailing window is computed for every key except 'date'. Defaults to [].
+        n_periods (int): number of quarters in window. Defaults to 4.
+
+    Returns:
+        list: aggregation pipeline stages.
+    """
+    value_keys = [k for k in keys if k != DATE_KEY]
+    project_stage = {'_id': 0, ORDINAL_KEY: _quarter_ordinal_expression()}
+    project_stage.update({k: 1 for k in keys})
+    window_output = {'TTM' + k: {'$avg': '$' + k, 'window': {'documents': [-(n_periods - 1), 0]}} for k in value_keys}
+    return [
+        {'$project': project_stage},
+        {'$setWindowFields': {'sortBy': {ORDINAL_KEY: 1}, 'output': window_output}},
+        {'$sort': {ORDINAL_KEY: -1}},
+        {'$project': {ORDINAL_KEY: 0}}
+    ]
+
+
+def ttm_output_keys(keys: list = []) -> list:
+    """ Field order returned by the TTM timescale: trailing window fields first, then the original keys.
+
+    Args:
+        keys (list): input keys. Defaults to [].
+
+    Returns:
+        list: output keys.
+    """
+    return ['TTM' + k for k in keys if k != DATE_KEY] + list(keys)
+
+
+def yoy_output_keys(keys: list = []) -> list:
+    """ Field order returned by the YoY timescale: 'Year' first, then the aggregated keys.
+
+    Args:
+        keys (list): input keys. Defaults to [].
+
+    Returns:
+        list: output keys.
+    """
+    return [YEAR_KEY] + [k for k in keys if k != DATE_KEY]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.db_interface import MongoClientRegistry
+from utils.utils import *
+
+
+class AsyncCompanyDbInterface:
+    """ asyncio variant of a company data interface. As Motor does, blocking driver work (query and cursor iteration) runs in a
+    thread pool so that several fetches can be awaited together with asyncio.gather: a metric spanning N collections costs one
+    round trip of latency instead of N. The pooled MongoClient is thread-safe, so every worker thread shares its connections.
+
+    Args:
+        data_interface (object): synchronous CompanyDataInterface (CompanyDbInterface, CompanyFileInterface...) to wrap.
+        max_workers (int, optional): threads available for concurrent fetches. Defaults to MongoClientRegistry.max_pool_size.
+    """
+    # Process-wide executors shared by every async interface, one per max_workers value.
+    _executors = {}
+    _executors_lock = threading.Lock()
+
+    def __init__(self, data_interface: object, max_workers: int = None) -> None:
+        self._data_interface = data_interface
+        self._max_workers = max_workers or MongoClientRegistry.max_pool_size
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with AsyncCompanyDbInterface._executors_lock:
+            if self._max_workers not in AsyncCompanyDbInterface._executors:
+                AsyncCompanyDbInterface._executors[self._max_workers] = ThreadPoolExecutor(max_workers= self._max_workers, thread_name_prefix= 'async-db')
+            return AsyncCompanyDbInterface._executors[self._max_workers]
+
+    async def run(self, func, *args, **kwargs) -> object:
+        """ Run a blocking callable in the interface thread pool.
+
+        Args:
+            func (callable): blocking function.
+
+        Returns:
+            object: value returned by func.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    async def find_values_for_one_key(self, collection: str, key: str) -> list:
+        """ Coroutine that finds values for single key. The cursor is consumed in the worker thread.
+
+        Args:
+            collection (str): Collection name.
+            key (str): key/field to search in database.
+
+        Returns:
+            list: values of key.
+        """
+        return await self.run(lambda: unpack_cursor_object(self._data_interface.find_values_for_one_key(collection, key), key))
+
+    async def find_values_for_multiple_keys(self, collection: str, keys: list) -> dict:
+        """ Coroutine that finds values for multiple input keys. The cursor is consumed in the worker thread.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search in database.
+
+        Returns:
+            dict: unpacked data, one list per key.
+        """
+        return await self.run(lambda: unpack_cursor_object_multiple(self._data_interface._find_values_for_multiple_keys(collection, keys), keys))
+
+    async def gather_values_for_multiple_keys(self, requests: list) -> list:
+        """ Fetch several (collection, keys) pairs concurrently.
+
+        Args:
+            requests (list): list of (collection, keys) tuples.
+
+        Returns:
+            list: unpacked data dicts in the same order as requests.
+        """
+        return list(await asyncio.gather(*[self.find_values_for_multiple_keys(c, k) for c, k in requests]))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import struct
+import bson
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.snapshot_cache import SnapshotCursor
+
+# Decoding of raw BSON batches (pymongo find_raw_batches / aggregate_raw_batches) straight into one preallocated NumPy array
+# per field. Documents are never turned into Python dicts: every element is read in place from the batch bytes. Missing fields
+# (and BSON nulls) are flagged in a mask and returned as numpy.ma.MaskedArray, whose tolist() gives None for them.
+
+_INT32 = struct.Struct('<i')
+_INT64 = struct.Struct('<q')
+_DOUBLE = struct.Struct('<d')
+
+# Array dtype used for a column according to the Python type of its first value. Other types go to object arrays.
+_DTYPES = {int: np.int64, float: np.float64, bool: np.bool_}
+# Size in bytes of fixed length BSON element values, by element type.
+_FIXED_SIZES = {0x01: 8, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4, 0x11: 8, 0x12: 8, 0x13: 16, 0x7F: 0, 0xFF: 0}
+
+
+class _ColumnBuilder:
+    """ Preallocated values and missing-value mask of one field.
+    """
+    def __init__(self, n_rows: int) -> None:
+        self.n_rows = n_rows
+        self.values = None
+        self.kind = None
+        self.mask = np.ones(n_rows, dtype=bool)
+
+    def set(self, row: int, value: object) -> None:
+        kind = type(value)
+        if self.values is None:
+            self.kind = kind
+            self.values = np.empty(self.n_rows, dtype=_DTYPES.get(kind, object))
+        elif kind is not self.kind and self.values.dtype != object:
+            # Mixed types: keep Python values untouched, as CollectionSnapshot.from_documents does.
+            self.values = self.values.astype(object)
+        self.values[row] = value
+        self.mask[row] = False
+
+    def to_array(self) -> np.ndarray:
+        if self.values is None:
+            # Field only holds nulls.
+            self.values = np.empty(self.n_rows, dtype=object)
+        if self.mask.any():
+            return np.ma.MaskedArray(self.values, mask=self.mask)
+        return self.values
+
+
+def count_documents(batch: bytes) -> int:
+    """ Number of BSON documents concatenated in a raw batch. Only document length prefixes are read.
+
+    Args:
+        batch (bytes): raw batch.
+
+    Returns:
+        int: number of documents.
+    """
+    n_docs = 0
+    pos = 0
+    while pos < len(batch):
+        pos += _INT32.unpack_from(batch, pos)[0]
+        n_docs += 1
+    return n_docs
+
+
+def decode_raw_batches(batches, keys: list = None) -> SnapshotCursor:
+    """ Decode raw BSON batches into typed columns. '_id' is always skipped.
+
+    Args:
+        batches (_type_): iterable of bytes, e.g. a pymongo RawBatchCursor.
+        keys (list, optional): fields to decode. Defaults to None (every field).
+
+    Returns:
+        SnapshotCursor: cursor-like object with one array per field, in document order.
+    """
+    batches = [bytes(b) for b in batches]
+    n_rows = sum(count_documents(b) for b in batches)
+    wanted = None if keys is None else set(keys)
+    builders = {}
+    row = 0
+    for batch in batches:
+        start = 0
+        while start < len(batch):
+            size = _INT32.unpack_from(batch, start)[0]
+            _decode_document(batch, start, size, row, wanted, builders, n_rows)
+            start += size
+            row += 1
+    return SnapshotCursor({k: b.to_array() for k, b in builders.items()}, n_rows)
+
+
+def _decode_document(batch: bytes, start: int, size: int, row: int, wanted: set, builders: dict, n_rows: int) -> None:
+    pos = start + 4
+    end = start + size - 1
+    while pos < end:
+        element_type = batch[pos]
+        name_end = batch.index(b'\x00', pos + 1)
+        name = batch[pos + 1:name_end].decode('utf-8')
+        pos = name_end + 1
+        keep = name != '_id' and (wanted is None or name in wanted)
+        if element_type == 0x02:
+            length = _INT32.unpack_from(batch, pos)[0]
+            if keep:
+                _builder(builders, name, n_rows).set(row, batch[pos + 4:pos + 3 + length].decode('utf-8'))
+            pos += 4 + length
+        elif element_type in _FIXED_SIZES and (not keep or element_type in (0x01, 0x08, 0x0A, 0x10, 0x12)):
+            if keep and element_type != 0x0A:
+                if element_type == 0x01:
+                    value = _DOUBLE.unpack_from(batch, pos)[0]
+                elif element_type == 0x10:
+                    value = _INT32.unpack_from(batch, pos)[0]
+                elif element_type == 0x12:
+                    value = _INT64.unpack_from(batch, pos)[0]
+                else:
+                    value = batch[pos] == 1
+                _builder(builders, name, n_rows).set(row, value)
+            elif keep:
+                # BSON null: leave the value masked but make the field known.
+                _builder(builders, name, n_rows)
+            pos += _FIXED_SIZES[element_type]
+        elif element_type in (0x03, 0x04) and not keep:
+            pos += _INT32.unpack_from(batch, pos)[0]
+        else:
+            # Rare element type (embedded document, datetime, binary...): let bson decode this document.
+            document = bson.decode(batch[start:start + size])
+            for k, v in document.items():
+                if k != '_id' and (wanted is None or k in wanted):
+                    if v is None:
+                        _builder(builders, k, n_rows)
+                    else:
+                        _builder(builders, k, n_rows).set(row, v)
+            return
+
+
+def _builder(builders: dict, name: str, n_rows: int) -> _ColumnBuilder:
+    builder = builders.get(name)
+    if builder is None:
+        builder = builders[name] = _ColumnBuilder(n_rows)
+    return builder
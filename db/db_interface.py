@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 
 # GLOBAL IMPORTS
+import os
 import sys
 import abc
+import json
+import hashlib
 import collections
+import time
+import threading
 from multiprocessing.sharedctypes import Value
 from sys import argv
 from requests.exceptions import ConnectionError
@@ -11,6 +16,203 @@ import pymongo
 from pymongo import MongoClient
 sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
 from utils.utils import *
+from db.snapshot_cache import SnapshotCache, SnapshotCursor, CollectionSnapshot
+from db.instrumentation import InstrumentedCursor, query_stats
+from db.columnar import decode_raw_batches
+
+class MongoClientRegistry:
+    """ Process-wide registry of pymongo clients keyed by host url. Every interface pointing to the same host shares a single pooled
+    MongoClient, so instantiating several company classes does not open new connection pools nor repeat the initial handshake.
+    Clients are created lazily (connect=False): no round trip happens until the first query. The registry is keyed by process id as
+    well, so forked workers (e.g. gunicorn with preload) build their own client instead of reusing the parent's sockets.
+    """
+    # Default pool size per host and process. Can be overridden with the MONGO_MAX_POOL_SIZE environment variable.
+    max_pool_size = int(os.environ.get('MONGO_MAX_POOL_SIZE', 10))
+    _clients = {}
+    _database_names = {}
+    _collection_names = {}
+    # Reentrant: name lookups hold it while creating the client.
+    _lock = threading.RLock()
+
+    @classmethod
+    def get_client(cls, host_url: str, max_pool_size: int = None, connect: bool = False) -> MongoClient:
+        """ Return the pooled client for the given host url, creating it on first use.
+
+        Args:
+            host_url (str): url for host location.
+            max_pool_size (int, optional): maximum number of sockets in the pool. Only applies when the client is created. Defaults to cls.max_pool_size.
+            connect (bool, optional): connect eagerly in background. Defaults to False (connect on first operation).
+
+        Returns:
+            MongoClient: shared pymongo client instance.
+        """
+        key = (os.getpid(), host_url)
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None:
+                # Drop clients and names inherited from a parent process. Clients must not be used nor closed after a fork.
+                for cache in [cls._clients, cls._database_names, cls._collection_names]:
+                    for stale_key in [k for k in cache if k[0] != key[0]]:
+                        cache.pop(stale_key)
+                client = MongoClient(host_url, maxPoolSize= max_pool_size or cls.max_pool_size, connect= connect)
+                cls._clients[key] = client
+        return client
+
+    @classmethod
+    def get_database_names(cls, host_url: str, refresh: bool = False) -> list:
+        """ Cached list of database names for host. Only the first call per process hits the server.
+
+        Args:
+            host_url (str): url for host location.
+            refresh (bool, optional): read the names from the server again. Defaults to False.
+
+        Returns:
+            list: database names in host.
+        """
+        key = (os.getpid(), host_url)
+        with cls._lock:
+            if refresh or key not in cls._database_names:
+                cls._database_names[key] = cls.get_client(host_url).list_database_names()
+            return cls._database_names[key]
+
+    @classmethod
+    def get_collection_names(cls, host_url: str, database_name: str, refresh: bool = False) -> list:
+        """ Cached list of collection names for a database in host. Only the first call per process hits the server.
+
+        Args:
+            host_url (str): url for host location.
+            database_name (str): database name.
+            refresh (bool, optional): read the names from the server again. Defaults to False.
+
+        Returns:
+            list: collection names in database.
+        """
+        key = (os.getpid(), host_url, database_name)
+        with cls._lock:
+            if refresh or key not in cls._collection_names:
+                cls._collection_names[key] = cls.get_client(host_url)[database_name].list_collection_names()
+            return cls._collection_names[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        """ Close every client owned by the current process and clear cached metadata.
+        """
+        pid = os.getpid()
+        with cls._lock:
+            for key in [k for k in cls._clients if k[0] == pid]:
+                cls._clients.pop(key).close()
+            cls._database_names.clear()
+            cls._collection_names.clear()
+
+
+class CompanyDataInterface(metaclass=abc.ABCMeta):
+    """ Abstract read-only data source consumed by CompanyFinancials. Any backend returning cursor-like objects for single and
+    multiple keys of a named collection fulfils the contract (CompanyDbInterface, CompanyFileInterface).
+
+    Args:
+        metaclass (_type_, optional): _description_. Defaults to abc.ABCMeta.
+
+    Raises:
+        NotImplementedError: _description_
+        NotImplementedError: _description_
+    """
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return (hasattr(subclass, 'find_values_for_one_key') and 
+                callable(subclass.find_values_for_one_key) and 
+                hasattr(subclass, '_find_values_for_multiple_keys') and 
+                callable(subclass._find_values_for_multiple_keys) or 
+                NotImplemented)
+
+    @abc.abstractmethod
+    def find_values_for_one_key(self, collection: str, key: str) -> object:
+        """ Method that finds values for single key in a collection.
+
+        Args:
+            collection (str): Collection name.
+            key (str): key/field to search.
+
+        Raises:
+            NotImplementedError
+
+        Returns:
+            object: iterable cursor-like object with packed data.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _find_values_for_multiple_keys(self, collection: str, keys: list) -> object:
+        """ Method that finds values for multiple keys in a collection.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search.
+
+        Raises:
+            NotImplementedError
+
+        Returns:
+            object: iterable cursor-like object with packed data.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def find_values_for_quarter_range(self, collection: str, keys: list, start: object = None, end: object = None, last_n: int = None) -> object:
+        """ Method that finds values for multiple keys restricted to a range of quarters, sorted from newest to oldest quarter.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search.
+            start (object, optional): oldest quarter, label ('1Q21') or ordinal. Defaults to None.
+            end (object, optional): newest quarter, label ('3Q22') or ordinal. Defaults to None.
+            last_n (int, optional): return only the most recent last_n quarters of the range. Defaults to None.
+
+        Raises:
+            NotImplementedError
+
+        Returns:
+            object: iterable cursor-like object with packed data.
+        """
+        raise NotImplementedError
+
+    def get_collection_version(self, collection: str) -> object:
+        """ Token that changes whenever the data of a collection changes. Used to invalidate results computed from it.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: hashable version token, None when the backend cannot tell.
+        """
+        return None
+
+    def iter_batches(self, collection: str, keys: list, batch_size: int = 128) -> object:
+        """ Generator of cursor-like objects holding consecutive slices of at most batch_size documents of a collection, sorted from
+        newest to oldest quarter. Used by streaming computations over long histories (see pipeline.streaming). This default slices
+        the cursor of _find_values_for_multiple_keys; backends able to page through a collection override it.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search.
+            batch_size (int, optional): documents per batch. Defaults to 128.
+
+        Returns:
+            object: generator of cursor-like objects.
+        """
+        cursor = self._find_values_for_multiple_keys(collection, keys)
+        if hasattr(cursor, 'columns'):
+            for start in range(0, len(cursor), batch_size):
+                yield SnapshotCursor({k: v[start:start + batch_size] for k, v in cursor.columns.items()}, min(batch_size, len(cursor) - start))
+            return
+        documents = []
+        for document in cursor:
+            documents.append(document)
+            if len(documents) == batch_size:
+                yield documents
+                documents = []
+        if len(documents) > 0:
+            yield documents
+
 
 class MongoDbInterface(metaclass=abc.ABCMeta):
     """ Abstract API to database. Provides basic abstract method for connection to a host.
@@ -35,21 +237,23 @@ class MongoDbInterface(metaclass=abc.ABCMeta):
                 callable(subclass._set_database) or 
                 NotImplemented)
 
-    def __init__(self, host_url: str, database_name: str) -> None:
-        """Constructor of metaclass database interface for MongoDb.
+    def __init__(self, host_url: str, database_name: str, max_pool_size: int = None) -> None:
+        """Constructor of metaclass database interface for MongoDb. No round trip to the host happens here: the client is taken from
+        the process-wide MongoClientRegistry and database/collection metadata is loaded on first use.
 
         Args:
             host_url (str): url for host location.
             database_name (str): database name.
+            max_pool_size (int, optional): connection pool size for host. Only applies to the first interface created for host_url.
         """
         if not isinstance(host_url, str):
             raise TypeError("Host url must be an instance of str")
         if not isinstance(database_name, str):
             raise TypeError("Host url must be an instance of str")
+        self._host_url = host_url
+        self._max_pool_size = max_pool_size
         self._host = self._set_host(host_url)
-        # TODO: version validation condition.
-        self._version = self._host.server_info()['version']
-        self._db_collections = []
+        self._collections_cache = None
         self._db = self._set_database(database_name)
 
     @classmethod
@@ -86,8 +290,9 @@ class MongoDbInterface(metaclass=abc.ABCMeta):
         Returns:
             object: Pymongo MongoCliente class instance.
         """
+        host = None
         try:
-            host = MongoClient(str)
+            host = MongoClientRegistry.get_client(str, self._max_pool_size)
         except ConnectionError as e:
             print(['EXCEPTION'], e)
         return host
@@ -101,15 +306,50 @@ class MongoDbInterface(metaclass=abc.ABCMeta):
         Returns:
             object: Pymongo database class instance.
         """
-        if str not in self._host.list_database_names():
-            raise Exception("Database provided does not exist in host: {}. Please enter one of the available databases: [{}]".format(self._host.HOST, self._host.list_databases_names()))
-        else:
-            try:
-                db = self._host[str]
-                self._db_collections.extend(self._read_database_collections(db))
-            except ValueError as e:
-                print(['Input an existing database name'], e)
-            return db
+        db = None
+        try:
+            db = self._host[str]
+        except ValueError as e:
+            print(['Input an existing database name'], e)
+        return db
+
+    @property
+    def _version(self) -> str:
+        """ Server version. Lazy, the first access performs a round trip to host.
+
+        Returns:
+            str: MongoDb server version.
+        """
+        # TODO: version validation condition.
+        return self._host.server_info()['version']
+
+    @property
+    def _db_collections(self) -> list:
+        """ Collections available in database. Loaded once per process on first access through the MongoClientRegistry.
+
+        Returns:
+            list: list of strings with names of all database collections.
+        """
+        if self._collections_cache is None:
+            self._collections_cache = self._read_collection_names()
+        return self._collections_cache
+
+    def _read_collection_names(self, refresh: bool = False) -> list:
+        """ Collection names of the database through the MongoClientRegistry cache. Names missing from the cache (a database or a
+        collection created after first access, e.g. by db.ingest) are looked up again with refresh.
+
+        Args:
+            refresh (bool, optional): read the names from the server again. Defaults to False.
+
+        Returns:
+            list: list of strings with names of all database collections.
+        """
+        database_names = MongoClientRegistry.get_database_names(self._host_url, refresh)
+        if self._db.name not in database_names and not refresh:
+            database_names = MongoClientRegistry.get_database_names(self._host_url, refresh= True)
+        if self._db.name not in database_names:
+            raise Exception("Database provided does not exist in host: {}. Please enter one of the available databases: [{}]".format(self._host_url, database_names))
+        return MongoClientRegistry.get_collection_names(self._host_url, self._db.name, refresh)
 
     def _read_database_collections(self, obj) -> list:
         """ Return a list of strings containing all collections in a database
@@ -146,9 +386,50 @@ class CompanyDbInterface(MongoDbInterface):
     # Global flags for activating descriptor fucntionality in @Mutable decorator. Subclasses do not have access to get_database_in_any_host() and get_collections_in_any_database() methods.
     databases = True
     databaseCollections = True
-
-    def __init__(self, host_url = "mongodb://localhost:27017", database_name = "admin"):     
-        super().__init__(host_url, database_name)
+    # Collection where ingestion jobs bump a version counter per collection. Used to invalidate in-memory snapshots.
+    VERSIONS_COLLECTION = 'data_versions'
+    # Indexed field written by db.ingest with the quarter ordinal of each document (see utils.quarter_label_to_ordinal).
+    ORDINAL_FIELD = 'QuarterOrdinal'
+    # Process-wide snapshot store shared by every interface.
+    _snapshots = SnapshotCache()
+    # Process-wide query metrics (see db.instrumentation).
+    query_stats = query_stats
+
+    def __init__(self, host_url = "mongodb://localhost:27017", database_name = "admin", max_pool_size: int = None, use_snapshots: bool = True, instrument: bool = True, columnar: bool = True):     
+        super().__init__(host_url, database_name, max_pool_size)
+        self._use_snapshots = use_snapshots
+        self._instrument = instrument
+        self._columnar = columnar
+
+    def _instrumented(self, cursor: object, operation: str, collection: str, keys: list, started: float, explain = None, source: str = None) -> object:
+        # Wrap cursor so that latency, documents and bytes are reported to query_stats once it is consumed.
+        if not self._instrument:
+            return cursor
+        if source is None:
+            source = 'snapshot' if hasattr(cursor, 'columns') else 'mongo'
+        return InstrumentedCursor(cursor, self.query_stats, operation, collection, keys, started, source, explain)
+
+    def _find(self, collection: object, query: dict, keys: list, limit: int = None, start: int = None, end: int = None) -> object:
+        # Sorted find without '_id'. In columnar mode raw BSON batches are decoded straight into NumPy arrays. Collections not loaded
+        # through db.ingest have no ORDINAL_FIELD to sort on: they are read whole and sorted by the ordinal parsed from 'date', as
+        # snapshots are, and the start / end ordinals of query are applied in memory.
+        if not self._has_ordinals(collection):
+            loaded = decode_raw_batches(collection.find_raw_batches({}, {'_id': 0})) if self._columnar else collection.find({}, {'_id': 0})
+            snapshot = CollectionSnapshot(dict(loaded.columns)) if hasattr(loaded, 'columns') else CollectionSnapshot.from_documents(loaded)
+            return snapshot.sorted_by_quarter().find_quarter_range(keys, start, end, limit)
+        projection = {k: 1 for k in keys}
+        projection['_id'] = 0
+        if self._columnar:
+            cursor = collection.find_raw_batches(query, projection).sort(self.ORDINAL_FIELD, pymongo.DESCENDING)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            return decode_raw_batches(cursor, keys)
+        cursor = collection.find(query, projection).sort(self.ORDINAL_FIELD, pymongo.DESCENDING)
+        return cursor.limit(limit) if limit is not None else cursor
+
+    def _has_ordinals(self, collection: object) -> bool:
+        # True when every document of the collection holds ORDINAL_FIELD.
+        return collection.find_one({self.ORDINAL_FIELD: {'$exists': False}}, {'_id': 1}) is None
 
     def _get_single_collection(self, str) -> object:
         
@@ -161,7 +442,10 @@ class CompanyDbInterface(MongoDbInterface):
             object: Pymongo collection class instance.
         """
         if str not in self._db_collections:
-            raise Exception("Collection provided does not exist in database {}. Please enter one of the available collections: {}".format(self._db.name, self._db.list_collection_names()))
+            # The collection may have been created after the names were cached.
+            self._collections_cache = self._read_collection_names(refresh= True)
+        if str not in self._db_collections:
+            raise Exception("Collection provided does not exist in database {}. Please enter one of the available collections: {}".format(self._db.name, self._db_collections))
         else:
             try:
                 collection = self._db[str]
@@ -178,8 +462,12 @@ class CompanyDbInterface(MongoDbInterface):
         Returns:
             object: A pymongo.cluster.Cursor object with packed data.
         """
-        collection = self._get_single_collection(collection)
-        return collection.find({}, {key})
+        started = time.perf_counter()
+        if self._use_snapshots:
+            return self._instrumented(self._get_snapshot(collection).find([key]), 'find_values_for_one_key', collection, [key], started)
+        mongo_collection = self._get_single_collection(collection)
+        return self._instrumented(self._find(mongo_collection, {}, [key]), 'find_values_for_one_key', collection, [key], started,
+                                  lambda: mongo_collection.find({}, {key}).sort(self.ORDINAL_FIELD, pymongo.DESCENDING).explain(), 'mongo')
 
     def _find_values_for_multiple_keys(self, collection: str, keys: list) -> object:
         """ Method that finds values for multiple input keys and returns a cursor object with search result in database.
@@ -190,6 +478,399 @@ class CompanyDbInterface(MongoDbInterface):
         Returns:
             object: A pymongo.cluster.Cursor object with packed data.
         """
-        collection = self._get_single_collection(collection)
-        return collection.find({}, set(keys))
+        started = time.perf_counter()
+        if self._use_snapshots:
+            return self._instrumented(self._get_snapshot(collection).find(keys), '_find_values_for_multiple_keys', collection, keys, started)
+        mongo_collection = self._get_single_collection(collection)
+        return self._instrumented(self._find(mongo_collection, {}, keys), '_find_values_for_multiple_keys', collection, keys, started,
+                                  lambda: mongo_collection.find({}, set(keys)).sort(self.ORDINAL_FIELD, pymongo.DESCENDING).explain(), 'mongo')
+
+    def find_values_for_quarter_range(self, collection: str, keys: list, start: object = None, end: object = None, last_n: int = None) -> object:
+        """ Method that finds values for multiple input keys within a range of quarters. Rows are sorted from newest to oldest quarter
+        through the index on ORDINAL_FIELD, and only the rows of the range are fetched.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search in database.
+            start (object, optional): oldest quarter, label ('1Q21') or ordinal. Defaults to None.
+            end (object, optional): newest quarter, label ('3Q22') or ordinal. Defaults to None.
+            last_n (int, optional): return only the most recent last_n quarters of the range. Defaults to None.
+
+        Returns:
+            object: A pymongo.cluster.Cursor (or SnapshotCursor) object with packed data.
+        """
+        started = time.perf_counter()
+        start, end, last_n = _to_ordinal(start), _to_ordinal(end), _check_last_n(last_n)
+        if self._use_snapshots:
+            return self._instrumented(self._get_snapshot(collection).find_quarter_range(keys, start, end, last_n), 'find_values_for_quarter_range', collection, keys, started)
+        ordinal_filter = {}
+        if start is not None:
+            ordinal_filter['$gte'] = start
+        if end is not None:
+            ordinal_filter['$lte'] = end
+        query = {self.ORDINAL_FIELD: ordinal_filter} if len(ordinal_filter) > 0 else {}
+        mongo_collection = self._get_single_collection(collection)
+        return self._instrumented(self._find(mongo_collection, query, keys, last_n, start, end), 'find_values_for_quarter_range', collection, keys, started,
+                                  lambda: mongo_collection.find(query, {k: 1 for k in keys}).sort(self.ORDINAL_FIELD, pymongo.DESCENDING).explain(), 'mongo')
+
+    def iter_batches(self, collection: str, keys: list, batch_size: int = 128) -> object:
+        """ Page through a collection sorted from newest to oldest quarter. Snapshots are bypassed: raw BSON batches of batch_size
+        documents are fetched and decoded one at a time, so memory does not grow with the size of the collection.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search in database.
+            batch_size (int, optional): documents per batch. Defaults to 128.
+
+        Returns:
+            object: generator of SnapshotCursor objects.
+        """
+        started = time.perf_counter()
+        projection = {k: 1 for k in keys}
+        projection['_id'] = 0
+        cursor = self._get_single_collection(collection).find_raw_batches({}, projection).sort(self.ORDINAL_FIELD, pymongo.DESCENDING).batch_size(batch_size)
+        n_docs, n_bytes = 0, 0
+        for batch in cursor:
+            decoded = decode_raw_batches([batch], keys)
+            n_docs += len(decoded)
+            n_bytes += len(batch)
+            yield decoded
+        if self._instrument:
+            self.query_stats.record('iter_batches', collection, keys, time.perf_counter() - started, n_docs, n_bytes, 'mongo')
+
+    def aggregate(self, collection: str, pipeline: list) -> object:
+        """ Method that runs an aggregation pipeline on a collection and returns a cursor object with the aggregated documents.
+
+        Args:
+            collection (str): Collection name.
+            pipeline (list): list of aggregation stages.
+
+        Returns:
+            object: A pymongo.command_cursor.CommandCursor object (columnar cursor in columnar mode) with packed data.
+        """
+        started = time.perf_counter()
+        mongo_collection = self._get_single_collection(collection)
+        if self._columnar:
+            cursor = decode_raw_batches(mongo_collection.aggregate_raw_batches(pipeline))
+        else:
+            cursor = mongo_collection.aggregate(pipeline)
+        return self._instrumented(cursor, 'aggregate', collection, [], started,
+                                  lambda: self._db.command('aggregate', collection, pipeline= pipeline, explain= True), 'mongo')
+
+    def _read_collection_version(self, collection: str) -> object:
+        """ Version token of a collection. Uses the counter stored in VERSIONS_COLLECTION when available and falls back to a hash
+        of the collection content otherwise, so that in place restatements (same number of documents) are seen too.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: hashable version token.
+        """
+        version_doc = self._db[self.VERSIONS_COLLECTION].find_one({'_id': collection})
+        if version_doc is not None:
+            return ('version', version_doc.get('version'))
+        return ('hash', self._content_hash(collection))
+
+    def _content_hash(self, collection: str) -> str:
+        """ Hash of every document of a collection. Computed by the server (dbHash command) when allowed, otherwise from the raw
+        BSON documents sorted by '_id'.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            str: hex digest.
+        """
+        try:
+            return self._db.command('dbHash', collections= [collection])['collections'].get(collection)
+        except pymongo.errors.OperationFailure:
+            # dbHash needs its own privilege, which read only users lack.
+            digest = hashlib.blake2b(digest_size= 16)
+            for batch in self._get_single_collection(collection).find_raw_batches({}, {'_id': 0}).sort('_id', pymongo.ASCENDING):
+                digest.update(batch)
+            return digest.hexdigest()
+
+    def get_collection_version(self, collection: str) -> object:
+        """ Version token of a collection. Served by the snapshot cache when snapshots are enabled, so it only reaches the
+        database once every refresh interval.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: hashable version token.
+        """
+        if self._use_snapshots:
+            return self._get_snapshot(collection).version
+        return self._read_collection_version(collection)
+
+    def _get_snapshot(self, collection: str) -> object:
+        """ Columnar in-memory snapshot of a collection. It is loaded on first use and reloaded only when the collection version
+        changes, so repeated lookups are served from memory.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: CollectionSnapshot instance.
+        """
+        return self._snapshots.get((self._host_url, self._db.name, collection),
+                                   lambda: self._read_collection_version(collection),
+                                   lambda: self._load_collection(collection))
+
+    def _load_collection(self, collection: str) -> object:
+        """ Read every document of a collection (without '_id') for a snapshot.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: columnar cursor in columnar mode, otherwise a pymongo cursor.
+        """
+        started = time.perf_counter()
+        mongo_collection = self._get_single_collection(collection)
+        if self._columnar:
+            cursor = decode_raw_batches(mongo_collection.find_raw_batches({}, {'_id': 0}))
+        else:
+            cursor = mongo_collection.find({}, {'_id': 0})
+        return self._instrumented(cursor, '_load_snapshot', collection, [], started, source= 'mongo')
+
+    def invalidate_snapshots(self, collection: str = None) -> None:
+        """ Force reload of the snapshot of one collection (or of every collection) on next access.
+
+        Args:
+            collection (str, optional): Collection name. Defaults to None (all collections).
+        """
+        if collection is None:
+            self._snapshots.invalidate()
+        else:
+            self._snapshots.invalidate((self._host_url, self._db.name, collection))
+
+
+
+
+class CompanyFileInterface(CompanyDataInterface):
+    """ Offline data source that reads company collections from JSON files (the layout of db/tesla). Every file is parsed once per
+    process into a columnar snapshot and served from memory with the same contract as CompanyDbInterface. Files are parsed again
+    only if their modification time changes.
+
+    Args:
+        CompanyDataInterface (_type_): _description_
+    """
+    # Collection name -> file name inside company folder.
+    COLLECTION_FILES = {
+        'statement_operations': 'statement_ops.json',
+        'balance_sheet': 'balance_sheet.json',
+        'cash_flow': 'cash_flows.json',
+        'gaap_non_gaap': 'gaap_non_gaap.json'
+    }
+    # Process-wide snapshot store shared by every file interface. Version checks only stat the file.
+    _snapshots = SnapshotCache(refresh_interval= 5.0)
+    # Process-wide query metrics (see db.instrumentation).
+    query_stats = query_stats
+
+    def __init__(self, folder: str, collection_files: dict = None) -> None:
+        """ Constructor of file based company interface.
+
+        Args:
+            folder (str): path to company folder containing one JSON file per collection.
+            collection_files (dict, optional): collection name to file name mapping. Defaults to COLLECTION_FILES.
+        """
+        if not isinstance(folder, str):
+            raise TypeError("Folder must be an instance of str")
+        if not os.path.isdir(folder):
+            raise Exception("Folder provided does not exist: {}".format(folder))
+        self._folder = os.path.abspath(folder)
+        self._collection_files = collection_files or self.COLLECTION_FILES
+        self._host = 'file://' + self._folder
+        self._db = os.path.basename(self._folder)
+
+    @property
+    def _db_collections(self) -> list:
+        """ Collections available in folder.
+
+        Returns:
+            list: list of strings with names of all collections with an existing file.
+        """
+        return [c for c, f in self._collection_files.items() if os.path.isfile(os.path.join(self._folder, f))]
+
+    @property
+    def collections(self) -> list:
+        """Getter method for collection attribute.
+
+        Returns:
+            list: list of string names corresponding to each available collection.
+        """
+        if len(self._db_collections) < 1:
+            raise Exception('There are no collection for the current folder')
+        else:
+            return self._db_collections
+
+    def _get_file_path(self, collection: str) -> str:
+        if collection not in self._db_collections:
+            raise Exception("Collection provided does not exist in folder {}. Please enter one of the available collections: {}".format(self._folder, self._db_collections))
+        return os.path.join(self._folder, self._collection_files[collection])
+
+    def _get_snapshot(self, collection: str) -> object:
+        """ Columnar in-memory snapshot of a collection file.
 
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: CollectionSnapshot instance.
+        """
+        path = self._get_file_path(collection)
+        return self._snapshots.get((path,), lambda: os.path.getmtime(path), lambda: self._load_documents(path))
+
+    def _load_documents(self, path: str) -> list:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_collection_version(self, collection: str) -> object:
+        """ Version token of a collection file (its modification time).
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            object: hashable version token.
+        """
+        return self._get_snapshot(collection).version
+
+    def invalidate_snapshots(self, collection: str = None) -> None:
+        """ Force reload of one collection file (or of every file) on next access.
+
+        Args:
+            collection (str, optional): Collection name. Defaults to None (all collections).
+        """
+        if collection is None:
+            self._snapshots.invalidate()
+        else:
+            self._snapshots.invalidate((self._get_file_path(collection),))
+
+    def find_values_for_one_key(self, collection: str, key: str) -> object:
+        """ Method that finds values for single key and returns a cursor-like object with search result in folder.
+
+        Args:
+            collection (str): Collection name.
+            key (str): key/field to search.
+
+        Returns:
+            object: A SnapshotCursor object with packed data.
+        """
+        started = time.perf_counter()
+        return InstrumentedCursor(self._get_snapshot(collection).find([key]), self.query_stats, 'find_values_for_one_key', collection, [key], started, 'file')
+
+    def _find_values_for_multiple_keys(self, collection: str, keys: list) -> object:
+        """ Method that finds values for multiple input keys and returns a cursor-like object with search result in folder.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search.
+
+        Returns:
+            object: A SnapshotCursor object with packed data.
+        """
+        started = time.perf_counter()
+        return InstrumentedCursor(self._get_snapshot(collection).find(keys), self.query_stats, '_find_values_for_multiple_keys', collection, keys, started, 'file')
+
+    def find_values_for_quarter_range(self, collection: str, keys: list, start: object = None, end: object = None, last_n: int = None) -> object:
+        """ Method that finds values for multiple input keys within a range of quarters, sorted from newest to oldest quarter.
+
+        Args:
+            collection (str): Collection name.
+            keys (list): keys/fields to search.
+            start (object, optional): oldest quarter, label ('1Q21') or ordinal. Defaults to None.
+            end (object, optional): newest quarter, label ('3Q22') or ordinal. Defaults to None.
+            last_n (int, optional): return only the most recent last_n quarters of the range. Defaults to None.
+
+        Returns:
+            object: A SnapshotCursor object with packed data.
+        """
+        started = time.perf_counter()
+        cursor = self._get_snapshot(collection).find_quarter_range(keys, _to_ordinal(start), _to_ordinal(end), _check_last_n(last_n))
+        return InstrumentedCursor(cursor, self.query_stats, 'find_values_for_quarter_range', collection, keys, started, 'file')
+
+
+class MappedDataInterface(CompanyDataInterface):
+    """ View of a data interface under another naming: callers use the logical collection and field names of the pipeline (the
+    layout of db/tesla) and the view translates them to the names used by the company data. Returned cursors are keyed by
+    logical names. Server side aggregation is not exposed when fields are renamed, since pipelines reference field names.
+
+    Args:
+        interface (CompanyDataInterface): data interface of the company.
+        collections (dict, optional): logical collection name -> company collection name. Defaults to {}.
+        fields (dict, optional): logical field name -> company field name. Defaults to {}.
+    """
+    def __init__(self, interface: object, collections: dict = None, fields: dict = None) -> None:
+        self._interface = interface
+        self._collections = dict(collections or {})
+        self._fields = dict(fields or {})
+
+    def _collection(self, collection: str) -> str:
+        return self._collections.get(collection, collection)
+
+    def _rename(self, cursor: object, keys: list) -> object:
+        if len(self._fields) == 0:
+            return cursor
+        physical = {self._fields.get(k, k): k for k in keys}
+        if hasattr(cursor, 'columns'):
+            return SnapshotCursor({physical[k]: v for k, v in cursor.columns.items() if k in physical}, len(cursor))
+        return ({physical.get(k, k): v for k, v in doc.items()} for doc in cursor)
+
+    def find_values_for_one_key(self, collection: str, key: str) -> object:
+        return self._rename(self._interface.find_values_for_one_key(self._collection(collection), self._fields.get(key, key)), [key])
+
+    def _find_values_for_multiple_keys(self, collection: str, keys: list) -> object:
+        return self._rename(self._interface._find_values_for_multiple_keys(self._collection(collection), [self._fields.get(k, k) for k in keys]), keys)
+
+    def find_values_for_quarter_range(self, collection: str, keys: list, start: object = None, end: object = None, last_n: int = None) -> object:
+        cursor = self._interface.find_values_for_quarter_range(self._collection(collection), [self._fields.get(k, k) for k in keys], start, end, last_n)
+        return self._rename(cursor, keys)
+
+    def iter_batches(self, collection: str, keys: list, batch_size: int = 128) -> object:
+        for cursor in self._interface.iter_batches(self._collection(collection), [self._fields.get(k, k) for k in keys], batch_size):
+            yield self._rename(cursor, keys)
+
+    def get_collection_version(self, collection: str) -> object:
+        return self._interface.get_collection_version(self._collection(collection))
+
+    def invalidate_snapshots(self, collection: str = None) -> None:
+        if hasattr(self._interface, 'invalidate_snapshots'):
+            self._interface.invalidate_snapshots(None if collection is None else self._collection(collection))
+
+    def __getattr__(self, name: str):
+        if name == 'aggregate' and len(self._fields) > 0:
+            raise AttributeError(name)
+        return getattr(self._interface, name)
+
+
+def _to_ordinal(quarter: object) -> int:
+    if isinstance(quarter, str):
+        return quarter_label_to_ordinal(quarter)
+    return quarter
+
+
+def _check_last_n(last_n: int) -> int:
+    # A limit of 0 means no limit to MongoDb but no rows to a snapshot slice: both backends reject it instead.
+    if last_n is not None and last_n <= 0:
+        raise Exception('last_n must be a positive number of quarters, got {}'.format(last_n))
+    return last_n
+
+
+def get_company_interface(host_url: str, database_name: str) -> CompanyDataInterface:
+    """ Build the data interface matching the host url scheme. 'file://<path>' points to a company folder with JSON files (the
+    database name is ignored); any other url is treated as a MongoDb host.
+
+    Args:
+        host_url (str): url for host location, e.g. 'mongodb://localhost:27017' or 'file://db/tesla'.
+        database_name (str): database name.
+
+    Returns:
+        CompanyDataInterface: data interface instance.
+    """
+    if host_url.startswith('file://'):
+        return CompanyFileInterface(host_url[len('file://'):])
+    return CompanyDbInterface(host_url, database_name)
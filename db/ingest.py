@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+import pymongo
+from pymongo import UpdateOne
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.db_interface import CompanyDbInterface, CompanyFileInterface, MongoClientRegistry
+from utils.utils import quarter_label_to_ordinal
+
+# Bulk ingestion of company folders (same layout as db/tesla) into MongoDb. Documents are upserted by 'date', so re-running the
+# command only writes the quarters whose content changed. Each document also stores its indexed quarter ordinal. Usage:
+#   python -m db.ingest db/tesla --host mongodb://localhost:27017 --database tesla_db
+
+KEY_FIELD = 'date'
+
+
+def iter_json_documents(path: str, chunk_size: int = 1 << 16):
+    """ Stream the documents of a JSON file holding an array of objects without loading the whole file in memory.
+
+    Args:
+        path (str): path to JSON file.
+        chunk_size (int, optional): number of characters read per chunk. Defaults to 64k.
+
+    Yields:
+        dict: one document at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    with open(path, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            buffer += chunk
+            while True:
+                buffer = buffer.lstrip(' \t\r\n,')
+                if not started:
+                    if not buffer:
+                        break
+                    if buffer[0] != '[':
+                        raise ValueError('File {} does not contain a JSON array'.format(path))
+                    buffer = buffer[1:]
+                    started = True
+                    continue
+                if not buffer or buffer[0] == ']':
+                    break
+                try:
+                    document, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    # Incomplete document, wait for next chunk.
+                    break
+                buffer = buffer[end:]
+                yield document
+    if buffer.strip(' \t\r\n,') not in ['', ']']:
+        raise ValueError('Malformed JSON document in file {}'.format(path))
+
+
+def ensure_indexes(collection: object) -> None:
+    """ Create the indexes used by the pipeline. Idempotent. The quarter ordinal index is unique, so it can only be built once every
+    document holds its ordinal: call it after ingest_collection, documents loaded by other means have none.
+
+    Args:
+        collection (object): Pymongo collection class instance.
+    """
+    collection.create_index([(KEY_FIELD, pymongo.ASCENDING)], unique= True, name= 'date_unique')
+    # Backs sorted reads and quarter range queries (CompanyDbInterface.find_values_for_quarter_range).
+    collection.create_index([(CompanyDbInterface.ORDINAL_FIELD, pymongo.DESCENDING)], unique= True, name= 'quarter_ordinal')
+
+
+def ingest_collection(collection: object, documents, batch_size: int = 500) -> dict:
+    """ Upsert documents into a collection in unordered bulk batches keyed on 'date'.
+
+    Args:
+        collection (object): Pymongo collection class instance.
+        documents (_type_): iterable of documents.
+        batch_size (int, optional): operations per bulk write. Defaults to 500.
+
+    Returns:
+        dict: counters with matched, modified and upserted documents.
+    """
+    counters = {'matched': 0, 'modified': 0, 'upserted': 0}
+    batch = []
+    def flush():
+        if len(batch) > 0:
+            result = collection.bulk_write(batch, ordered= False)
+            counters['matched'] += result.matched_count
+            counters['modified'] += result.modified_count
+            counters['upserted'] += result.upserted_count
+            batch.clear()
+    for doc in documents:
+        if KEY_FIELD not in doc:
+            raise ValueError('Document without "{}" field in collection {}'.format(KEY_FIELD, collection.name))
+        doc.pop('_id', None)
+        doc[CompanyDbInterface.ORDINAL_FIELD] = quarter_label_to_ordinal(doc[KEY_FIELD])
+        batch.append(UpdateOne({KEY_FIELD: doc[KEY_FIELD]}, {'$set': doc}, upsert= True))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return counters
+
+
+def bump_collection_version(db: object, collection_name: str) -> None:
+    """ Increase the version counter of a collection so that in-memory snapshots get reloaded.
+
+    Args:
+        db (object): Pymongo database class instance.
+        collection_name (str): collection name.
+    """
+    db[CompanyDbInterface.VERSIONS_COLLECTION].update_one({'_id': collection_name},
+                                                           {'$inc': {'version': 1}, '$set': {'updated': datetime.now(timezone.utc)}},
+                                                           upsert= True)
+
+
+def ingest_company_folder(folder: str, host_url: str, database_name: str, collection_files: dict = None, batch_size: int = 500) -> dict:
+    """ Load every collection file found in a company folder into database.
+
+    Args:
+        folder (str): company folder, e.g. db/tesla.
+        host_url (str): url for host location.
+        database_name (str): target database name.
+        collection_files (dict, optional): collection name to file name mapping. Defaults to CompanyFileInterface.COLLECTION_FILES.
+        batch_size (int, optional): operations per bulk write. Defaults to 500.
+
+    Returns:
+        dict: counters per collection.
+    """
+    collection_files = collection_files or CompanyFileInterface.COLLECTION_FILES
+    db = MongoClientRegistry.get_client(host_url)[database_name]
+    summary = {}
+    for collection_name, file_name in collection_files.items():
+        path = os.path.join(folder, file_name)
+        if not os.path.isfile(path):
+            continue
+        collection = db[collection_name]
+        counters = ingest_collection(collection, iter_json_documents(path), batch_size)
+        ensure_indexes(collection)
+        if counters['modified'] + counters['upserted'] > 0:
+            bump_collection_version(db, collection_name)
+        summary[collection_name] = counters
+    return summary
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description= 'Load company JSON folders into MongoDb collections.')
+    parser.add_argument('folders', nargs= '+', help= 'company folders with the db/tesla layout')
+    parser.add_argument('--host', default= 'mongodb://localhost:27017', help= 'MongoDb host url')
+    parser.add_argument('--database', default= None, help= 'target database. Defaults to <folder name>_db')
+    parser.add_argument('--batch-size', type= int, default= 500, help= 'operations per bulk write')
+    args = parser.parse_args(argv)
+    for folder in args.folders:
+        database_name = args.database or os.path.basename(os.path.normpath(folder)) + '_db'
+        summary = ingest_company_folder(folder, args.host, database_name, batch_size= args.batch_size)
+        for collection_name, counters in summary.items():
+            print('[{}.{}] matched: {matched}, modified: {modified}, upserted: {upserted}'.format(database_name, collection_name, **counters))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import time
+import functools
+import logging
+import threading
+import contextlib
+import contextvars
+import collections
+import bson
+
+logger = logging.getLogger(__name__)
+
+# Label of the code path (e.g. a Dash callback) issuing queries. Set with QueryStats.tag().
+_current_tag = contextvars.ContextVar('query_tag', default= None)
+
+
+class QueryStats:
+    """ Thread-safe collector of data interface query metrics. For every (operation, collection, keys, tag) it keeps call counts,
+    a latency histogram, documents and bytes returned. Queries slower than slow_query_ms are logged and kept in a bounded list,
+    optionally with their explain() output.
+
+    Args:
+        slow_query_ms (float, optional): threshold for slow query log. Defaults to MONGO_SLOW_QUERY_MS env variable or 100 ms.
+        explain_slow_queries (bool, optional): capture explain() plan of slow queries. Defaults to False.
+        measure_bytes (bool, optional): measure BSON size of returned documents. Defaults to True.
+    """
+    # Upper bound (ms) of every latency bucket. Last bucket catches everything above.
+    LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+    def __init__(self, slow_query_ms: float = None, explain_slow_queries: bool = False, measure_bytes: bool = True) -> None:
+        self.slow_query_ms = slow_query_ms if slow_query_ms is not None else float(os.environ.get('MONGO_SLOW_QUERY_MS', 100))
+        self.explain_slow_queries = explain_slow_queries
+        self.measure_bytes = measure_bytes
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """ Clear all collected metrics.
+        """
+        with self._lock:
+            self._stats = {}
+            self.slow_queries = collections.deque(maxlen= 100)
+
+    @contextlib.contextmanager
+    def tag(self, name: str):
+        """ Context manager that labels every query issued inside it, e.g. with the name of a Dash callback.
+
+        Args:
+            name (str): label.
+        """
+        token = _current_tag.set(name)
+        try:
+            yield
+        finally:
+            _current_tag.reset(token)
+
+    def record(self, operation: str, collection: str, keys: list, seconds: float, n_docs: int, n_bytes: int, source: str = 'mongo', explain = None) -> None:
+        """ Add one finished query to the metrics.
+
+        Args:
+            operation (str): interface method name.
+            collection (str): collection name.
+            keys (list): projected keys.
+            seconds (float): elapsed time from query to cursor exhaustion.
+            n_docs (int): documents returned.
+            n_bytes (int): bytes returned.
+            source (str, optional): 'mongo', 'snapshot' or 'file'. Defaults to 'mongo'.
+            explain (callable, optional): returns the explain() document of the query. Only called for slow queries.
+        """
+        elapsed_ms = seconds * 1000
+        tag = _current_tag.get()
+        key = (operation, collection, tuple(keys), tag)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = {'operation': operation, 'collection': collection, 'keys': list(keys), 'tag': tag,
+                         'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'documents': 0, 'bytes': 0,
+                         'sources': collections.Counter(), 'histogram': [0] * len(self.LATENCY_BUCKETS_MS)}
+                self._stats[key] = entry
+            entry['calls'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['documents'] += n_docs
+            entry['bytes'] += n_bytes
+            entry['sources'][source] += 1
+            entry['histogram'][next(i for i, bound in enumerate(self.LATENCY_BUCKETS_MS) if elapsed_ms <= bound)] += 1
+        if elapsed_ms > self.slow_query_ms:
+            slow_query = {'operation': operation, 'collection': collection, 'keys': list(keys), 'tag': tag, 'ms': elapsed_ms,
+                          'documents': n_docs, 'bytes': n_bytes, 'source': source, 'time': time.time()}
+            if self.explain_slow_queries and explain is not None:
+                try:
+                    slow_query['explain'] = explain()
+                except Exception as e:
+                    slow_query['explain'] = repr(e)
+            logger.warning('Slow query %.1f ms: %s %s %s (%d docs, %d bytes, tag=%s)', elapsed_ms, operation, collection, list(keys), n_docs, n_bytes, tag)
+            with self._lock:
+                self.slow_queries.append(slow_query)
+
+    def snapshot(self) -> dict:
+        """ JSON serializable copy of collected metrics.
+
+        Returns:
+            dict: 'queries' (one entry per operation/collection/keys/tag), 'slow_queries' and histogram bucket bounds.
+        """
+        with self._lock:
+            queries = []
+            for entry in self._stats.values():
+                entry = dict(entry, sources= dict(entry['sources']), histogram= list(entry['histogram']))
+                entry['mean_ms'] = entry['total_ms'] / entry['calls']
+                queries.append(entry)
+            return {'queries': queries,
+                    'slow_queries': [dict(q, explain= str(q['explain'])) if 'explain' in q else dict(q) for q in self.slow_queries],
+                    'histogram_buckets_ms': [str(b) for b in self.LATENCY_BUCKETS_MS]}
+
+
+class InstrumentedCursor:
+    """ Wrapper around a cursor that times the query up to cursor exhaustion and reports documents and bytes to a QueryStats.
+    Columnar snapshot cursors are reported immediately since they are already materialized.
+    """
+    def __init__(self, cursor, stats: QueryStats, operation: str, collection: str, keys: list, started: float, source: str = 'mongo', explain = None) -> None:
+        self._cursor = cursor
+        self._stats = stats
+        self._operation = operation
+        self._collection = collection
+        self._keys = keys
+        self._started = started
+        self._source = source
+        self._explain = explain
+        self._recorded = False
+        if hasattr(cursor, 'columns'):
+            self.columns = cursor.columns
+            self._record(len(cursor), sum(getattr(v, 'nbytes', 0) for v in cursor.columns.values()))
+
+    def _record(self, n_docs: int, n_bytes: int) -> None:
+        if not self._recorded:
+            self._recorded = True
+            self._stats.record(self._operation, self._collection, self._keys, time.perf_counter() - self._started, n_docs, n_bytes, self._source, self._explain)
+
+    def __iter__(self):
+        n_docs = 0
+        n_bytes = 0
+        measure_bytes = self._stats.measure_bytes and not hasattr(self._cursor, 'columns')
+        for doc in self._cursor:
+            n_docs += 1
+            if measure_bytes:
+                n_bytes += len(bson.encode(doc))
+            yield doc
+        self._record(n_docs, n_bytes)
+
+    def __len__(self) -> int:
+        return len(self._cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+# Process-wide collector shared by every data interface.
+query_stats = QueryStats()
+
+
+def tagged(name: str = None):
+    """ Decorator that labels every query issued by a function with its name (see QueryStats.tag), e.g. a Dash callback, so that
+    /api/db-stats breaks queries down per callback.
+
+    Args:
+        name (str, optional): label. Defaults to None (function name).
+    """
+    def decorator(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with query_stats.tag(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
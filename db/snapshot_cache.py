@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import time
+import threading
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from utils.utils import QuarterIndex, DtypePolicy
+
+
+class SnapshotCursor:
+    """ Cursor-like view over a CollectionSnapshot projected on a list of keys. It can be iterated as a pymongo cursor (yields one dict
+    per document) but also exposes the projected columns directly, which is what unpack_cursor_object_multiple uses.
+    """
+    def __init__(self, columns: dict, n_rows: int) -> None:
+        self.columns = columns
+        self._n_rows = n_rows
+
+    def __iter__(self):
+        keys = list(self.columns.keys())
+        values = [self.columns[k].tolist() for k in keys]
+        for row in zip(*values):
+            yield {k: v for k, v in zip(keys, row) if v is not None}
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+
+class CollectionSnapshot:
+    """ In-memory columnar copy of a database collection. Every field is stored as a NumPy array. Snapshots held by SnapshotCache
+    are sorted from newest to oldest quarter. Documents missing a field hold None in an object array for that field.
+    """
+    def __init__(self, columns: dict, version: object = None, ordinals: np.ndarray = None) -> None:
+        self.columns = columns
+        self.version = version
+        self.n_rows = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        # Quarter ordinal of every row, set by sorted_by_quarter().
+        self.ordinals = ordinals
+
+    @classmethod
+    def from_documents(cls, documents, version: object = None) -> 'CollectionSnapshot':
+        """ Build a snapshot from an iterable of documents (e.g. a pymongo cursor). The '_id' field is dropped.
+
+        Args:
+            documents (_type_): iterable of dict-like documents.
+            version (object, optional): version token of the collection at load time. Defaults to None.
+
+        Returns:
+            CollectionSnapshot: snapshot with one array per field.
+        """
+        fields = {}
+        n_rows = 0
+        for doc in documents:
+            for k, v in doc.items():
+                if k == '_id':
+                    continue
+                if k not in fields:
+                    fields[k] = [None] * n_rows
+                fields[k].append(v)
+            n_rows += 1
+            for values in fields.values():
+                if len(values) < n_rows:
+                    values.append(None)
+        return cls({k: _to_array(v) for k, v in fields.items()}, version)
+
+    def find(self, keys: list) -> SnapshotCursor:
+        """ Project snapshot on keys.
+
+        Args:
+            keys (list): fields to return.
+
+        Returns:
+            SnapshotCursor: cursor-like object with the requested columns.
+        """
+        columns = {}
+        for k in keys:
+            if k in self.columns:
+                columns[k] = self.columns[k]
+        return SnapshotCursor(columns, self.n_rows)
+
+    def sorted_by_quarter(self, date_key: str = 'date') -> 'CollectionSnapshot':
+        """ Copy of snapshot with rows sorted from newest to oldest quarter, so results do not depend on insertion order.
+
+        Args:
+            date_key (str, optional): field holding quarter labels such as '3Q22'. Defaults to 'date'.
+
+        Returns:
+            CollectionSnapshot: sorted snapshot. Returned unchanged if date_key is missing.
+        """
+        if date_key not in self.columns:
+            return self
+        ordinals = QuarterIndex.from_labels(self.columns[date_key].tolist()).ordinals
+        order = np.argsort(-ordinals, kind='stable')
+        return CollectionSnapshot({k: v[order] for k, v in self.columns.items()}, self.version, ordinals[order])
+
+    def compacted(self, policy: DtypePolicy) -> 'CollectionSnapshot':
+        """ Copy of snapshot with columns stored in the compact dtypes of policy. Projections return the same values.
+
+        Args:
+            policy (DtypePolicy): storage dtypes.
+
+        Returns:
+            CollectionSnapshot: compact snapshot.
+        """
+        return CollectionSnapshot({k: policy.compact(v) for k, v in self.columns.items()}, self.version, self.ordinals)
+
+    def find_quarter_range(self, keys: list, start: int = None, end: int = None, last_n: int = None) -> SnapshotCursor:
+        """ Project snapshot on keys, keeping only rows between two quarter ordinals (both included), newest first.
+
+        Args:
+            keys (list): fields to return.
+            start (int, optional): oldest quarter ordinal. Defaults to None (no lower bound).
+            end (int, optional): newest quarter ordinal. Defaults to None (no upper bound).
+            last_n (int, optional): maximum number of (most recent) rows. Defaults to None.
+
+        Returns:
+            SnapshotCursor: cursor-like object with the requested columns.
+        """
+        if self.ordinals is None:
+            raise Exception('Snapshot is not sorted by quarter')
+        mask = np.ones(self.n_rows, dtype=bool)
+        if start is not None:
+            mask &= self.ordinals >= start
+        if end is not None:
+            mask &= self.ordinals <= end
+        rows = np.flatnonzero(mask)[:last_n]
+        return SnapshotCursor({k: self.columns[k][rows] for k in keys if k in self.columns}, len(rows))
+
+
+class SnapshotCache:
+    """ Thread-safe store of CollectionSnapshot objects. The version of a cached snapshot is checked against the database at most
+    once every refresh_interval seconds, so repeated reads inside that interval do not perform any round trip. Snapshots are stored
+    in the compact dtypes of policy.
+
+    Args:
+        refresh_interval (float, optional): seconds between version checks. Defaults to 60.
+        policy (DtypePolicy, optional): storage dtypes. Defaults to DtypePolicy.from_env().
+    """
+    def __init__(self, refresh_interval: float = 60.0, policy: DtypePolicy = None) -> None:
+        self.refresh_interval = refresh_interval
+        self.policy = policy if policy is not None else DtypePolicy.from_env()
+        self._snapshots = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, read_version, load_documents, date_key: str = 'date') -> CollectionSnapshot:
+        """ Return the snapshot stored under key, loading or reloading it when missing or when its version changed.
+
+        Args:
+            key (tuple): cache key, e.g. (host, database, collection).
+            read_version (callable): returns the current version token of the collection.
+            load_documents (callable): returns an iterable with every document of the collection, or a cursor-like object that
+                already exposes columns (see db.columnar.decode_raw_batches).
+            date_key (str, optional): field with quarter labels used to sort rows newest first. Defaults to 'date'.
+
+        Returns:
+            CollectionSnapshot: up to date snapshot.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            now = time.monotonic()
+            if snapshot is not None and now - self._checked_at[key] < self.refresh_interval:
+                return snapshot
+            version = read_version()
+            if snapshot is None or snapshot.version != version:
+                loaded = load_documents()
+                if hasattr(loaded, 'columns'):
+                    snapshot = CollectionSnapshot(dict(loaded.columns), version)
+                else:
+                    snapshot = CollectionSnapshot.from_documents(loaded, version)
+                snapshot = snapshot.sorted_by_quarter(date_key).compacted(self.policy)
+                self._snapshots[key] = snapshot
+            self._checked_at[key] = now
+            return snapshot
+
+    def invalidate(self, key: tuple = None) -> None:
+        """ Drop one snapshot, or every snapshot when key is None.
+
+        Args:
+            key (tuple, optional): cache key to drop. Defaults to None.
+        """
+        with self._lock:
+            if key is None:
+                self._snapshots.clear()
+                self._checked_at.clear()
+            else:
+                self._snapshots.pop(key, None)
+                self._checked_at.pop(key, None)
+
+
+def _to_array(values: list) -> np.ndarray:
+    # Keep python types untouched (object array) when a column mixes types or has missing values, so that unpacked lists are
+    # identical to the ones built from a database cursor.
+    if len(set(type(v) for v in values)) > 1:
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+    return np.asarray(values)
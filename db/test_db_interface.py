@@ -0,0 +1,462 @@
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import bson
+import pymongo
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.db_interface import CompanyDbInterface, CompanyFileInterface, CompanyDataInterface, MongoClientRegistry, get_company_interface
+from db.ingest import iter_json_documents, ingest_collection, ingest_company_folder
+from db.async_db_interface import AsyncCompanyDbInterface
+from db.instrumentation import QueryStats, InstrumentedCursor, tagged
+from db.columnar import decode_raw_batches
+from db.aggregation import yoy_pipeline, ttm_pipeline, yoy_output_keys, ttm_output_keys, ORDINAL_KEY
+from db.snapshot_cache import CollectionSnapshot, SnapshotCache
+from utils.utils import unpack_cursor_object_multiple, quarter_label_to_ordinal, DtypePolicy
+from pipeline.data_processing import TeslaFinancials
+
+
+class TestMongoClientRegistry(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        MongoClientRegistry.close_all()
+        return super().tearDown()
+
+    def test_same_host_shares_client(self):
+        first = CompanyDbInterface("mongodb://localhost:27017", "tesla_db")
+        second = CompanyDbInterface("mongodb://localhost:27017", "tesla_db")
+        self.assertIs(first._host, second._host)
+
+    def test_different_hosts_get_different_clients(self):
+        first = MongoClientRegistry.get_client("mongodb://localhost:27017")
+        second = MongoClientRegistry.get_client("mongodb://localhost:27018")
+        self.assertIsNot(first, second)
+
+    def test_pool_size_applies_on_creation(self):
+        client = MongoClientRegistry.get_client("mongodb://localhost:27019", max_pool_size= 3)
+        self.assertEqual(client.options.pool_options.max_pool_size, 3)
+
+    def test_names_of_parent_process_are_dropped(self):
+        MongoClientRegistry._clients[(0, 'mongodb://parent')] = MongoClientRegistry.get_client('mongodb://parent')
+        MongoClientRegistry._database_names[(0, 'mongodb://parent')] = ['tesla_db']
+        MongoClientRegistry._collection_names[(0, 'mongodb://parent', 'tesla_db')] = ['balance_sheet']
+        MongoClientRegistry.get_client('mongodb://child')
+        for cache in [MongoClientRegistry._clients, MongoClientRegistry._database_names, MongoClientRegistry._collection_names]:
+            self.assertEqual([k for k in cache if k[0] == 0], [])
+
+    def test_new_collection_is_found(self):
+        # Collection created after the names were cached, e.g. by db.ingest on an empty database.
+        client = NamesClient({'tesla_db': ['balance_sheet']})
+        with mock.patch.object(MongoClientRegistry, 'get_client', return_value= client):
+            interface = CompanyDbInterface('mongodb://names', 'tesla_db')
+            self.assertEqual(interface.collections, ['balance_sheet'])
+            client.names['tesla_db'].append('cash_flow')
+            self.assertEqual(interface._get_single_collection('cash_flow'), 'tesla_db.cash_flow')
+            self.assertEqual(MongoClientRegistry.get_collection_names('mongodb://names', 'tesla_db'), ['balance_sheet', 'cash_flow'])
+            with self.assertRaises(Exception):
+                interface._get_single_collection('income_statement')
+
+class NamesClient:
+    # Stand in for a MongoClient: database -> collection names. Collections are their full names.
+    def __init__(self, names: dict) -> None:
+        self.names = names
+
+    def list_database_names(self) -> list:
+        return list(self.names)
+
+    def __getitem__(self, database_name: str) -> object:
+        return NamesDatabase(database_name, self.names)
+
+class NamesDatabase:
+    def __init__(self, name: str, names: dict) -> None:
+        self.name = name
+        self._names = names
+
+    def list_collection_names(self) -> list:
+        return list(self._names[self.name])
+
+    def __getitem__(self, collection_name: str) -> str:
+        return '{}.{}'.format(self.name, collection_name)
+
+class TestSnapshotCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.documents = [{'_id': 1, 'date': '3Q22', 'TotalRevenues': 21454, 'EPS': 0.95},
+                          {'_id': 2, 'date': '2Q22', 'TotalRevenues': 16934}]
+        return super().setUp()
+
+    def test_snapshot_unpacks_like_cursor(self):
+        snapshot = CollectionSnapshot.from_documents(self.documents)
+        unpacked = unpack_cursor_object_multiple(snapshot.find(['TotalRevenues', 'date']), ['TotalRevenues', 'date'])
+        self.assertDictEqual(unpacked, {'TotalRevenues': [21454, 16934], 'date': ['3Q22', '2Q22']})
+        self.assertNotIn('_id', snapshot.columns)
+        self.assertEqual(snapshot.columns['EPS'].tolist(), [0.95, None])
+
+    def test_cache_reloads_only_on_version_change(self):
+        cache = SnapshotCache(refresh_interval= 0)
+        version = [1]
+        loads = []
+        def load():
+            loads.append(1)
+            return self.documents
+        cache.get('key', lambda: version[0], load)
+        cache.get('key', lambda: version[0], load)
+        self.assertEqual(len(loads), 1)
+        version[0] = 2
+        cache.get('key', lambda: version[0], load)
+        self.assertEqual(len(loads), 2)
+
+    def test_compacted_snapshot_unpacks_the_same(self):
+        snapshot = CollectionSnapshot.from_documents(self.documents).sorted_by_quarter()
+        compacted = snapshot.compacted(DtypePolicy())
+        self.assertEqual(compacted.columns['TotalRevenues'].dtype, np.int32)
+        keys = ['TotalRevenues', 'EPS', 'date']
+        self.assertDictEqual(unpack_cursor_object_multiple(compacted.find(keys), keys), unpack_cursor_object_multiple(snapshot.find(keys), keys))
+        self.assertEqual(compacted.find_quarter_range(['date'], start= quarter_label_to_ordinal('3Q22')).columns['date'].tolist(), ['3Q22'])
+
+    def test_snapshot_sorted_by_quarter(self):
+        snapshot = CollectionSnapshot.from_documents(list(reversed(self.documents))).sorted_by_quarter()
+        self.assertEqual(snapshot.columns['date'].tolist(), ['3Q22', '2Q22'])
+
+    def test_cache_skips_version_check_within_interval(self):
+        cache = SnapshotCache(refresh_interval= 3600)
+        checks = []
+        def read_version():
+            checks.append(1)
+            return 1
+        cache.get('key', read_version, lambda: self.documents)
+        cache.get('key', read_version, lambda: self.documents)
+        self.assertEqual(len(checks), 1)
+
+class TestCompanyFileInterface(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.interface = get_company_interface('file://db/tesla', 'tesla_db')
+        return super().setUp()
+
+    def test_factory_and_contract(self):
+        self.assertIsInstance(self.interface, CompanyFileInterface)
+        self.assertTrue(issubclass(CompanyDbInterface, CompanyDataInterface))
+        self.assertCountEqual(self.interface.collections, ['statement_operations', 'balance_sheet', 'cash_flow', 'gaap_non_gaap'])
+
+    def test_find_values_for_multiple_keys(self):
+        unpacked = unpack_cursor_object_multiple(self.interface._find_values_for_multiple_keys('statement_operations', ['TotalRevenues', 'date']), ['TotalRevenues', 'date'])
+        self.assertEqual(unpacked['TotalRevenues'][:3], [21454, 16934, 18756])
+        self.assertEqual(unpacked['date'][:3], ['3Q22', '2Q22', '1Q22'])
+
+    def test_find_values_for_quarter_range(self):
+        last_quarters = unpack_cursor_object_multiple(self.interface.find_values_for_quarter_range('balance_sheet', ['date'], last_n= 8), ['date'])
+        self.assertEqual(last_quarters['date'], ['3Q22', '2Q22', '1Q22', '4Q21', '3Q21', '2Q21', '1Q21', '4Q20'])
+        year_2021 = unpack_cursor_object_multiple(self.interface.find_values_for_quarter_range('balance_sheet', ['date'], start= '1Q21', end= '4Q21'), ['date'])
+        self.assertEqual(year_2021['date'], ['4Q21', '3Q21', '2Q21', '1Q21'])
+        with self.assertRaises(Exception):
+            self.interface.find_values_for_quarter_range('balance_sheet', ['date'], last_n= 0)
+
+    def test_unknown_collection(self):
+        with self.assertRaises(Exception):
+            self.interface._find_values_for_multiple_keys('income_statement', ['date'])
+
+class TestColumnarDecoding(unittest.TestCase):
+
+    def setUp(self) -> None:
+        with open('db/tesla/statement_ops.json', 'r', encoding='utf-8') as f:
+            self.documents = json.load(f)
+        # Two raw batches, as returned by find_raw_batches.
+        self.batches = [b''.join(bson.encode(d) for d in self.documents[:5]), b''.join(bson.encode(d) for d in self.documents[5:])]
+        return super().setUp()
+
+    def test_decoded_columns_match_unpacked_documents(self):
+        keys = ['TotalRevenues', 'date']
+        cursor = decode_raw_batches(self.batches, keys)
+        self.assertEqual(cursor.columns['TotalRevenues'].dtype, 'int64')
+        self.assertEqual(unpack_cursor_object_multiple(cursor, keys), unpack_cursor_object_multiple(self.documents, keys))
+
+    def test_missing_fields_are_masked(self):
+        batches = [bson.encode({'_id': bson.ObjectId(), 'date': '3Q22', 'Capex': 1.5}) + bson.encode({'date': '2Q22', 'Other': None})]
+        columns = decode_raw_batches(batches).columns
+        self.assertNotIn('_id', columns)
+        self.assertEqual(columns['Capex'].tolist(), [1.5, None])
+        self.assertEqual(columns['Other'].tolist(), [None, None])
+
+    def test_cache_accepts_columnar_loader(self):
+        snapshot = SnapshotCache().get('key', lambda: 1, lambda: decode_raw_batches(self.batches))
+        self.assertEqual(snapshot.columns['date'][0], '3Q22')
+
+    def test_mongo_iter_batches(self):
+        collection = RawBatchCollection(self.documents)
+        interface = object.__new__(CompanyDbInterface)
+        interface._instrument, interface.query_stats = True, QueryStats()
+        interface._get_single_collection = lambda name: collection
+        keys = ['TotalRevenues', 'date']
+        batches = list(interface.iter_batches('statement_operations', keys, batch_size= 4))
+        self.assertEqual([len(b) for b in batches], [4, 4, 4, 3])
+        self.assertEqual(collection.calls, [('find_raw_batches', {'TotalRevenues': 1, 'date': 1, '_id': 0}),
+                                            ('sort', (CompanyDbInterface.ORDINAL_FIELD, -1)), ('batch_size', 4)])
+        self.assertEqual(unpack_cursor_object_multiple(decode_raw_batches(self.batches, keys), keys),
+                         {k: sum((b.columns[k].tolist() for b in batches), []) for k in keys})
+        query = interface.query_stats.snapshot()['queries'][0]
+        self.assertEqual((query['operation'], query['documents'], query['bytes']), ('iter_batches', 15, sum(len(b) for b in self.batches)))
+
+    def test_mongo_find_without_ordinals(self):
+        # Documents loaded without db.ingest have no ordinal to sort on: rows come back sorted by the quarter of 'date'.
+        collection = RawBatchCollection(self.documents[::2] + self.documents[1::2])
+        interface = object.__new__(CompanyDbInterface)
+        interface._use_snapshots, interface._instrument, interface._columnar = False, False, True
+        interface._get_single_collection = lambda name: collection
+        keys = ['TotalRevenues', 'date']
+        expected = unpack_cursor_object_multiple(self.documents, keys)
+        self.assertEqual(unpack_cursor_object_multiple(interface._find_values_for_multiple_keys('statement_operations', keys), keys), expected)
+        year_2021 = unpack_cursor_object_multiple(interface.find_values_for_quarter_range('statement_operations', keys, start= '1Q21', end= '4Q21', last_n= 3), keys)
+        self.assertEqual(year_2021['date'], ['4Q21', '3Q21', '2Q21'])
+        self.assertNotIn(('sort', (CompanyDbInterface.ORDINAL_FIELD, -1)), collection.calls)
+
+    def test_version_follows_content_without_counter(self):
+        # No data_versions document: an in place restatement changes the version although the count does not.
+        documents = [dict(d) for d in self.documents]
+        interface = object.__new__(CompanyDbInterface)
+        interface._db = VersionDatabase({CompanyDbInterface.VERSIONS_COLLECTION: RawBatchCollection([]), 'statement_operations': RawBatchCollection(documents)})
+        interface._get_single_collection = lambda name: interface._db[name]
+        version = interface._read_collection_version('statement_operations')
+        self.assertEqual(version[0], 'hash')
+        self.assertEqual(interface._read_collection_version('statement_operations'), version)
+        documents[3]['TotalRevenues'] += 1
+        self.assertNotEqual(interface._read_collection_version('statement_operations'), version)
+        # Hash computed by the server when dbHash is allowed.
+        interface._db.db_hash = {'statement_operations': 'c0ffee'}
+        self.assertEqual(interface._read_collection_version('statement_operations'), ('hash', 'c0ffee'))
+
+class VersionDatabase(dict):
+    # Stand in for a pymongo database. dbHash is refused, as for read only users, unless db_hash is set.
+    db_hash = None
+
+    def command(self, name: str, collections: list = []) -> dict:
+        if self.db_hash is None:
+            raise pymongo.errors.OperationFailure('not authorized to execute command {}'.format(name))
+        return {'collections': self.db_hash}
+
+class RawBatchCollection:
+    # Stand in for a pymongo collection: find_raw_batches returns a cursor of BSON batches of batch_size documents.
+    def __init__(self, documents: list) -> None:
+        self.documents = documents
+        self.calls = []
+        self._batch_size = 101
+
+    def find_raw_batches(self, query: dict, projection: dict) -> object:
+        self.calls.append(('find_raw_batches', projection))
+        return self
+
+    def find_one(self, query: dict, projection: dict = None) -> dict:
+        # Only used with {field: {'$exists': False}} queries, and on empty collections.
+        field = list(query)[0]
+        return next((d for d in self.documents if field not in d), None)
+
+    def sort(self, key: str, direction: int) -> object:
+        self.calls.append(('sort', (key, direction)))
+        return self
+
+    def batch_size(self, batch_size: int) -> object:
+        self.calls.append(('batch_size', batch_size))
+        self._batch_size = batch_size
+        return self
+
+    def __iter__(self):
+        for start in range(0, len(self.documents), self._batch_size):
+            yield b''.join(bson.encode(d) for d in self.documents[start:start + self._batch_size])
+
+class TestAggregation(unittest.TestCase):
+
+    def test_yoy_pipeline_stages(self):
+        pipeline = yoy_pipeline(['TotalRevenues', 'date', 'NetIncome'])
+        self.assertEqual([list(stage)[0] for stage in pipeline], ['$group', '$sort', '$project'])
+        self.assertEqual({k: v for k, v in pipeline[0]['$group'].items() if k != '_id'}, {'TotalRevenues': {'$sum': '$TotalRevenues'}, 'NetIncome': {'$sum': '$NetIncome'}})
+        self.assertEqual(pipeline[1]['$sort'], {'_id': -1})
+        self.assertEqual(pipeline[2]['$project'], {'_id': 0, 'Year': '$_id', 'TotalRevenues': 1, 'NetIncome': 1})
+        self.assertEqual(yoy_output_keys(['TotalRevenues', 'date', 'NetIncome']), ['Year', 'TotalRevenues', 'NetIncome'])
+
+    def test_ttm_pipeline_stages(self):
+        pipeline = ttm_pipeline(['TotalRevenues', 'date'], n_periods= 4)
+        self.assertEqual([list(stage)[0] for stage in pipeline], ['$project', '$setWindowFields', '$sort', '$project'])
+        self.assertEqual(sorted(pipeline[0]['$project']), sorted(['_id', ORDINAL_KEY, 'TotalRevenues', 'date']))
+        self.assertEqual(pipeline[1]['$setWindowFields'], {'sortBy': {ORDINAL_KEY: 1},
+                                                           'output': {'TTMTotalRevenues': {'$avg': '$TotalRevenues', 'window': {'documents': [-3, 0]}}}})
+        self.assertEqual(pipeline[2]['$sort'], {ORDINAL_KEY: -1})
+        self.assertEqual(pipeline[3]['$project'], {ORDINAL_KEY: 0})
+        self.assertEqual(ttm_output_keys(['TotalRevenues', 'date']), ['TTMTotalRevenues', 'TotalRevenues', 'date'])
+
+    def test_server_side_matches_in_process(self):
+        # Float keys (earnings per share) are not rolled into TTM fields by either path.
+        interface = AggregatingFileInterface('db/tesla')
+        in_process = TeslaFinancials(data_interface= interface, memoize= False)
+        server_side = TeslaFinancials(data_interface= interface, server_side_aggregation= True, memoize= False)
+        keys = ['TotalRevenues', 'NetIncomePerShareDiluted', 'date']
+        for timescale in ['YoY', 'TTM']:
+            expected = in_process._parse_to_timescaled_dict('statement_operations', keys, timescale)
+            result = server_side._parse_to_timescaled_dict('statement_operations', keys, timescale)
+            self.assertEqual(list(result), list(expected))
+            for k in result:
+                if k == 'date':
+                    self.assertEqual(result[k], expected[k])
+                else:
+                    np.testing.assert_allclose(result[k], expected[k])
+        self.assertEqual(interface.pipelines, ['$group', '$setWindowFields'])
+
+class AggregatingFileInterface(CompanyFileInterface):
+    # File interface answering the pipelines of db.aggregation as MongoDb does: a trailing window for every value key.
+    def __init__(self, folder: str) -> None:
+        super().__init__(folder)
+        self.pipelines = []
+
+    def aggregate(self, collection: str, pipeline: list) -> list:
+        with open(os.path.join(self._folder, self.COLLECTION_FILES[collection]), 'r', encoding='utf-8') as f:
+            documents = json.load(f) # newest first
+        stages = {list(stage)[0]: list(stage.values())[0] for stage in pipeline}
+        if '$group' in stages:
+            self.pipelines.append('$group')
+            keys = [k for k in stages['$group'] if k != '_id']
+            years = {}
+            for doc in documents:
+                row = years.setdefault(2000 + int(doc['date'][2:]), {k: 0 for k in keys})
+                for k in keys:
+                    row[k] += doc[k]
+            return [dict({'Year': year}, **years[year]) for year in sorted(years, reverse= True)]
+        self.pipelines.append('$setWindowFields')
+        keys = [k for k in pipeline[0]['$project'] if k not in ['_id', ORDINAL_KEY]]
+        rows = [{k: doc[k] for k in keys} for doc in documents]
+        for i, row in enumerate(rows):
+            for field, spec in stages['$setWindowFields']['output'].items():
+                values = [r[spec['$avg'][1:]] for r in rows[i:i + 1 - spec['window']['documents'][0]]]
+                row[field] = sum(values) / len(values)
+        return rows
+
+class TestQueryStats(unittest.TestCase):
+
+    def test_cursor_recorded_on_exhaustion(self):
+        stats = QueryStats(slow_query_ms= 1000)
+        cursor = InstrumentedCursor(iter([{'date': '3Q22'}, {'date': '2Q22'}]), stats, 'find', 'balance_sheet', ['date'], 0.0)
+        self.assertEqual(stats.snapshot()['queries'], [])
+        self.assertEqual(len(list(cursor)), 2)
+        query = stats.snapshot()['queries'][0]
+        self.assertEqual((query['calls'], query['documents'], query['sources']), (1, 2, {'mongo': 1}))
+        self.assertGreater(query['bytes'], 0)
+
+    def test_slow_queries_are_tagged(self):
+        stats = QueryStats(slow_query_ms= 0)
+        with stats.tag('update_graph'):
+            stats.record('find', 'cash_flow', ['date'], 0.5, 10, 100)
+        self.assertEqual(stats.snapshot()['slow_queries'][0]['tag'], 'update_graph')
+
+    def test_tagged_callback(self):
+        interface = get_company_interface('file://db/tesla', 'tesla_db')
+        interface.query_stats.reset()
+        @tagged()
+        def update_ratio_graph(collection):
+            return unpack_cursor_object_multiple(interface._find_values_for_multiple_keys(collection, ['date']), ['date'])
+        self.assertEqual(update_ratio_graph('balance_sheet')['date'][0], '3Q22')
+        self.assertEqual(interface.query_stats.snapshot()['queries'][0]['tag'], 'update_ratio_graph')
+
+    def test_file_interface_reports_queries(self):
+        interface = get_company_interface('file://db/tesla', 'tesla_db')
+        interface.query_stats.reset()
+        unpack_cursor_object_multiple(interface._find_values_for_multiple_keys('cash_flow', ['date']), ['date'])
+        query = interface.query_stats.snapshot()['queries'][0]
+        self.assertEqual((query['operation'], query['collection'], query['sources']), ('_find_values_for_multiple_keys', 'cash_flow', {'file': 1}))
+
+class TestAsyncCompanyDbInterface(unittest.TestCase):
+
+    def test_executor_per_max_workers(self):
+        interface = get_company_interface('file://db/tesla', 'tesla_db')
+        small, large = AsyncCompanyDbInterface(interface, max_workers= 2), AsyncCompanyDbInterface(interface, max_workers= 7)
+        self.assertEqual(small._get_executor()._max_workers, 2)
+        self.assertEqual(large._get_executor()._max_workers, 7)
+        self.assertIs(AsyncCompanyDbInterface(interface, max_workers= 2)._get_executor(), small._get_executor())
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        with open('db/tesla/balance_sheet.json', 'r', encoding='utf-8') as f:
+            self.documents = json.load(f)
+        return super().setUp()
+
+    def test_iter_json_documents_streams_whole_array(self):
+        self.assertEqual(list(iter_json_documents('db/tesla/balance_sheet.json', chunk_size= 50)), self.documents)
+
+    def test_bulk_upserts_keyed_on_date(self):
+        collection = BulkWriteCollection('balance_sheet')
+        counters = ingest_collection(collection, [dict(d) for d in self.documents], batch_size= 4)
+        self.assertEqual(counters, {'matched': 0, 'modified': 0, 'upserted': 15})
+        self.assertEqual(collection.writes, [(4, False), (4, False), (4, False), (3, False)])
+        self.assertEqual(collection.documents['3Q22'][CompanyDbInterface.ORDINAL_FIELD], quarter_label_to_ordinal('3Q22'))
+        # Second run: every quarter matches and none is modified. A restated quarter is the only one written.
+        self.assertEqual(ingest_collection(collection, [dict(d) for d in self.documents]), {'matched': 15, 'modified': 0, 'upserted': 0})
+        restated = [dict(d, TotalAssets= 1) if d['date'] == '2Q22' else dict(d) for d in self.documents]
+        self.assertEqual(ingest_collection(collection, restated), {'matched': 15, 'modified': 1, 'upserted': 0})
+        with self.assertRaises(ValueError):
+            ingest_collection(collection, [{'TotalAssets': 1}])
+
+    def test_ingest_folder_is_idempotent(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        shutil.copy('db/tesla/balance_sheet.json', folder)
+        db = BulkWriteDatabase()
+        with mock.patch.object(MongoClientRegistry, 'get_client', return_value= {'tesla_db': db}):
+            first = ingest_company_folder(folder, 'mongodb://test', 'tesla_db')
+            second = ingest_company_folder(folder, 'mongodb://test', 'tesla_db')
+        self.assertEqual(list(first), ['balance_sheet'])
+        self.assertEqual(first['balance_sheet']['upserted'], 15)
+        self.assertEqual(second['balance_sheet'], {'matched': 15, 'modified': 0, 'upserted': 0})
+        # Version bumped by the first run only.
+        self.assertEqual(db[CompanyDbInterface.VERSIONS_COLLECTION].updates, [('balance_sheet', 1)])
+        # Indexes are created once every document holds its ordinal.
+        collection = db['balance_sheet']
+        self.assertEqual(collection.indexes['date_unique'], ([('date', 1)], True))
+        self.assertEqual(collection.indexes['quarter_ordinal'], ([(CompanyDbInterface.ORDINAL_FIELD, -1)], True))
+        self.assertTrue(all(CompanyDbInterface.ORDINAL_FIELD in d for d in collection.indexed_documents))
+
+class BulkWriteCollection:
+    # Stand in for a pymongo collection: applies UpdateOne upserts, and records bulk writes and created indexes.
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.documents = {}
+        self.writes = []
+        self.indexes = {}
+        self.indexed_documents = []
+        self.updates = []
+
+    def bulk_write(self, operations: list, ordered: bool = True) -> object:
+        self.writes.append((len(operations), ordered))
+        result = mock.Mock(matched_count= 0, modified_count= 0, upserted_count= 0)
+        for operation in operations:
+            (field, value), = operation._filter.items()
+            if value in self.documents:
+                result.matched_count += 1
+                updated = dict(self.documents[value], **operation._doc['$set'])
+                result.modified_count += updated != self.documents[value]
+                self.documents[value] = updated
+            elif operation._upsert:
+                result.upserted_count += 1
+                self.documents[value] = dict(operation._doc['$set'])
+        return result
+
+    def create_index(self, keys: list, unique: bool = False, name: str = None) -> str:
+        self.indexes[name] = (keys, unique)
+        self.indexed_documents = list(self.documents.values())
+        return name
+
+    def update_one(self, query: dict, update: dict, upsert: bool = False) -> None:
+        self.updates.append((query['_id'], update['$inc']['version']))
+
+class BulkWriteDatabase(dict):
+    # Stand in for a pymongo database: collections are created on first access.
+    def __missing__(self, name: str) -> BulkWriteCollection:
+        self[name] = BulkWriteCollection(name)
+        return self[name]
+
+if __name__ == '__main__':
+    unittest.main()
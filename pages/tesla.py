@@ -1,3 +1,4 @@
+import json
 from enum import Enum
 from textwrap import fill
 from turtle import bgcolor, fillcolor, width
@@ -7,12 +8,16 @@ import plotly.express as px
 import plotly.graph_objects as go
 
 import dash
-from dash import dcc, html, callback, Input, Output
+from dash import dcc, html, callback, clientside_callback, ClientsideFunction, Input, Output, State
 import dash_bootstrap_components as dbc
 from dash import dash_table
 from dash.exceptions import PreventUpdate
 from pages.tabs import layout_tabs as lt
-from pipeline.data_processing import TeslaFinancials
+from pipeline.companies import registry
+from pipeline.materialize import MaterializedFinancials, metric_key
+from db.instrumentation import tagged
+from pipeline.sensitivity import MULTIPLES, INVESTED_CAPITAL_RATES
+from utils.utils import ColumnarFrame
 
 from alpha_vantage.timeseries import TimeSeries  
 
@@ -44,9 +49,17 @@ class figure_settings(Enum):
     LINE_WIDTH = 0.5
     TYPES_SH = ['institutional', 'insider', 'retail']
     PERCENTAGE_SH = [43.00, 14.39, 42.61] # Institutional, insiders and retail.
+# Price target card scenario (invested capital growth in % per quarter and FcF ROIC cap), one cell of the sensitivity heatmap.
+PRICE_TARGET_SCENARIO = {'InvestedCapitalRate': 6, 'FcFRoicCap': 0.4}
 # -----------------------------------------------------------------------------------
 # GENERAL METHODS
 # -----------------------------------------------------------------------------------
+def get_chronological_df(data: dict) -> ColumnarFrame:
+    """ Columnar frame with rows sorted from oldest to newest period, for quarterly ('date' or 'Quarter') or yearly ('Year') data.
+    Plots read its column arrays directly.
+    """
+    return ColumnarFrame.from_dict(data).chronological()
+
 def get_layout(func):
     layout = dbc.Row([
         dbc.Col(width=1),
@@ -188,6 +201,69 @@ def get_scatter_plot(df, x, y, yaxis_title, xaxis_title, plot_title, hover_label
         )
         return fig
 
+def get_band_plot(df, x, y_low, y_mid, y_high, yaxis_title, xaxis_title, plot_title, hover_label_text):
+        """ Scatter plot of y_mid with a filled band between y_low and y_high (e.g. percentiles of a Monte Carlo projection).
+
+        Returns:
+            _type_: _description_
+        """
+        fig = get_scatter_plot(df, x, y_low, yaxis_title, xaxis_title, plot_title, hover_label_text, True, 'Percentile')
+        fig.update_traces(fill= 'none')
+        for y, fill in [(y_high, 'tonexty'), (y_mid, 'none')]:
+            fig.add_trace(go.Scatter(
+                    x= df[x],
+                    y= df[y],
+                    name= y,
+                    mode= 'lines',
+                    line= dict(width= figure_settings.LINE_WIDTH.value if fill == 'tonexty' else 2),
+                    line_color= figure_settings.MARKER_COLOR.value if fill == 'tonexty' else figure_settings.HOVER_LABEL_BG_COLOR.value,
+                    fill= fill,
+                    opacity= figure_settings.OPACITY.value,
+                    text = hover_label_text,
+                    hoveron= 'points',
+                    hoverinfo= 'text+x+y'
+            ))
+        return fig
+
+def get_heatmap_plot(z, x, y, yaxis_title, xaxis_title, plot_title, colorbar_title):
+        """ Heatmap of a 2D surface, e.g. a slice of a sensitivity grid.
+
+        Args:
+            z (_type_): values, one row per y value.
+            x (_type_): column labels.
+            y (_type_): row labels.
+
+        Returns:
+            _type_: _description_
+        """
+        fig = go.Figure(go.Heatmap(z= z, x= x, y= y, colorscale= 'Greys', colorbar= dict(title= colorbar_title), hoverongaps= False,
+                                   hovertemplate= xaxis_title + ': %{x}<br>' + yaxis_title + ': %{y}<br>' + colorbar_title + ': %{z:.0f}<extra></extra>'))
+        fig.update_layout(paper_bgcolor= figure_settings.BACKGROUND.value,
+                        plot_bgcolor= figure_settings.BACKGROUND.value,
+                        xaxis_title= xaxis_title,
+                        yaxis_title= yaxis_title,
+                        font={
+                            'color': figure_settings.TEXT_COLOR.value,
+                            'family':figure_settings.TEXT_FONT.value,
+                            'size': figure_settings.TEXT_SIZE.value
+                        },
+                        title= {
+                            'text': plot_title,
+                            'x': figure_settings.TITLE_POSITION.value
+                            },
+                        title_font= {
+                            'size': figure_settings.TITLE_TEXT_SIZE.value,
+                            'color': figure_settings.TEXT_COLOR.value,
+                            'family': figure_settings.TEXT_FONT.value
+                        },
+                        title_pad= {
+                            't': 10
+                        }
+                        )
+        fig.update_xaxes(type= 'category')
+        fig.update_yaxes(type= 'category')
+        return fig
+
 def get_pie_plot(labels, values, plot_title):
         # Instantiate figure object
         fig = go.Figure()
@@ -295,6 +371,116 @@ def get_line_plot(df, x, y, yaxis_title, xaxis_title, plot_title, hover_label_te
         )
         return fig
 # -----------------------------------------------------------------------------------
+# FINANCIALS STORE
+# -----------------------------------------------------------------------------------
+# Metric charts are drawn client-side from the financials store, which holds the /api/tesla/financials.json document: every metric
+# of the company in one payload, refreshed with a conditional request (see assets/financials_store.js). Every chart has a table of
+# figure specs, dropdown values joined by '|' -> metric key of the document, x and y columns and the figure without data.
+def get_store_figure(method, timescale, x, y, plot, *plot_args) -> dict:
+    """ Figure spec of a chart drawn from the financials store.
+
+    Args:
+        method (str): getter name.
+        timescale (str): getter timescale, None for getters without timescale.
+        x (str): x column.
+        y (str): y column.
+        plot (callable): plot function called as plot(df, x, y, *plot_args).
+
+    Returns:
+        dict: 'metric', 'x', 'y' and 'figure' (plotly figure as JSON without its template, see FIGURE_TEMPLATE).
+    """
+    figure = json.loads(plot({x: [], y: []}, x, y, *plot_args).to_json())
+    figure['layout'].pop('template', None)
+    return {'metric': metric_key(method, timescale), 'x': x, 'y': y, 'figure': figure}
+
+# Plotly template shared by every figure spec.
+FIGURE_TEMPLATE = json.loads(go.Figure().to_json())['layout']['template']
+
+FUND_BAR_FIGURES = {
+    'QoQ|Revenue': get_store_figure('get_revenue', 'QoQ', 'date', 'TotalRevenues', get_bar_plot, 'Revenue (m$)', 'Quarter', '<b>Tesla · Revenue<b>'),
+    'QoQ|Gross Profit': get_store_figure('get_gross_profit', 'QoQ', 'date', 'GrossProfit', get_bar_plot, 'Gross Profit (m$)', 'Quarter', '<b>Tesla · Gross Profit<b>'),
+    'QoQ|Income from Operations': get_store_figure('get_income_ops', 'QoQ', 'date', 'IncomeFromOperations', get_bar_plot, 'Income Ops (m$)', 'Quarter', '<b>Tesla · Income Operations<b>'),
+    'QoQ|Net Income': get_store_figure('get_net_income', 'QoQ', 'date', 'NetIncome', get_bar_plot, 'Net Income (m$)', 'Quarter', '<b>Tesla · Net Income<b>'),
+    'QoQ|Adj EBITDA': get_store_figure('get_adj_ebitda', 'QoQ', 'date', 'AdjustedEBITDA', get_bar_plot, 'Adj EBITDA (m$)', 'Quarter', '<b>Tesla · Adj EBITDA<b>'),
+    'QoQ|FcF': get_store_figure('get_fcf', 'QoQ', 'date', 'FcF', get_bar_plot, 'FCF (m$)', 'Quarter', '<b>Tesla · FCF<b>'),
+    'TTM|Revenue': get_store_figure('get_revenue', 'TTM', 'date', 'TTMTotalRevenues', get_bar_plot, 'TTM Revenue (m$)', 'Quarter', '<b>Tesla · TTM Revenue<b>'),
+    'TTM|Gross Profit': get_store_figure('get_gross_profit', 'TTM', 'date', 'TTMGrossProfit', get_bar_plot, 'TTM Gross Profit (m$)', 'Quarter', '<b>Tesla · TTM Gross Profit<b>'),
+    'TTM|Income from Operations': get_store_figure('get_income_ops', 'TTM', 'date', 'TTMIncomeFromOperations', get_bar_plot, 'TTM Income Ops (m$)', 'Quarter', '<b>Tesla · TTM Income Operations<b>'),
+    'TTM|Net Income': get_store_figure('get_net_income', 'TTM', 'date', 'TTMNetIncome', get_bar_plot, 'TTMNetIncome (m$)', 'Quarter', '<b>Tesla · TTM Net Income<b>'),
+    'TTM|Adj EBITDA': get_store_figure('get_adj_ebitda', 'TTM', 'date', 'TTMAdjustedEBITDA', get_bar_plot, 'TTMAdjEBITDA (m$)', 'Quarter', '<b>Tesla · TTM Adjusted EBITDA<b>'),
+    'TTM|FcF': get_store_figure('get_fcf', 'TTM', 'date', 'TTMFcF', get_bar_plot, 'TTM FCF (m$)', 'Quarter', '<b>Tesla · TTM FCF<b>'),
+}
+
+MARGIN_LINE_FIGURES = {
+    'QoQ|Gross Profit Margin': get_store_figure('get_gross_profit_margin', 'QoQ', 'date', 'RatioGrossProfit/TotalRevenues', get_scatter_plot, 'Gross profit margin (%)', 'Quarter', '<b>Tesla · Gross Profit Margin<b>', '%GM'),
+    'QoQ|Operating Income Margin': get_store_figure('get_income_ops_margin', 'QoQ', 'date', 'RatioIncomeFromOperations/TotalRevenues', get_scatter_plot, 'Income ops margin (%)', 'Quarter', '<b>Tesla · Income Operations Margin<b>', '%IOps'),
+    'QoQ|Net Income Margin': get_store_figure('get_net_income_margin', 'QoQ', 'date', 'RatioNetIncome/TotalRevenues', get_scatter_plot, 'Net Income margin (%)', 'Quarter', '<b>Tesla · Net Income Margin<b>', '%NI'),
+    'QoQ|Adj EBITDA Margin': get_store_figure('get_adj_ebitda_margin', 'QoQ', 'date', 'RatioAdjustedEBITDA/TotalRevenues', get_scatter_plot, 'Adj EBITDA margin (%)', 'Quarter', '<b>Tesla · Adjusted EBITDA Margin<b>', '%AEBITDA'),
+    'TTM|Gross Profit Margin': get_store_figure('get_gross_profit_margin', 'TTM', 'date', 'RatioTTMGrossProfit/TTMTotalRevenues', get_scatter_plot, 'TTM Gross profit margin (%)', 'Quarter', '<b>Tesla · TTM Gross Profit Margin<b>', '%TTMGM'),
+    'TTM|Operating Income Margin': get_store_figure('get_income_ops_margin', 'TTM', 'date', 'RatioTTMIncomeFromOperations/TTMTotalRevenues', get_scatter_plot, 'TTM Income ops margin (%)', 'Quarter', '<b>Tesla · TTM Income Operations Margin<b>', '%TTMIOps'),
+    'TTM|Net Income Margin': get_store_figure('get_net_income_margin', 'TTM', 'date', 'RatioTTMNetIncome/TTMTotalRevenues', get_scatter_plot, 'TTM Net Income margin (%)', 'Quarter', '<b>Tesla · TTM Net Income Margin<b>', '%TTMNI'),
+    'TTM|Adj EBITDA Margin': get_store_figure('get_adj_ebitda_margin', 'TTM', 'date', 'RatioTTMAdjustedEBITDA/TTMTotalRevenues', get_scatter_plot, 'TTM Adj EBITDA margin (%)', 'Quarter', '<b>Tesla · TTM Adjusted EBITDA Margin<b>', '%TTMAEBITDA'),
+}
+
+# Debt to equity and debt to assets ratios have no spec yet: their chart is empty.
+RATIO_GRAPH_FIGURES = {
+    'Current Ratio': get_store_figure('get_current_ratio', None, 'date', 'RatioTotalCurrentAssets/TotalCurrentLiabilities', get_scatter_plot, 'Current Ratio', 'Quarter', '<b>Tesla · Current Ratio<b>', 'CR'),
+    'Quick Ratio': get_store_figure('get_quick_ratio', None, 'date', 'QuickRatio', get_scatter_plot, 'Quick Ratio', 'Quarter', '<b>Tesla · Quick Ratio<b>', 'QR'),
+    'Equity Ratio': get_store_figure('get_equity_ratio', None, 'date', 'RatioTotalStockholdersEquity/TotalAssets', get_scatter_plot, 'Equity Ratio', 'Quarter', '<b>Tesla · Equity Ratio<b>', 'ER'),
+}
+
+GROWTH_GRAPH_FIGURES = {
+    'QoQ|Revenue Growth': get_store_figure('get_revenue_growth', 'QoQ', 'date', 'GrowthRatio', get_scatter_plot, 'Revenue Growth (%)', 'Quarter', '<b>Tesla · QoQ Revenue Growth<b>', '%RG'),
+    'QoQ|Gross Profit Growth': get_store_figure('get_gross_profit_growth', 'QoQ', 'date', 'GrowthRatio', get_scatter_plot, 'Gross Profit Growth (%)', 'Quarter', '<b>Tesla · QoQ Gross Profit Growth<b>', '%GPG'),
+    'QoQ|Income from Operations Growth': get_store_figure('get_income_ops_growth', 'QoQ', 'date', 'GrowthRatio', get_scatter_plot, 'Income Ops Growth (%)', 'Quarter', '<b>Tesla · QoQ Income Operations Growth<b>', '%IOG'),
+    'QoQ|Net Income Growth': get_store_figure('get_net_income_growth', 'QoQ', 'date', 'GrowthRatio', get_scatter_plot, 'Net Income Growth', 'Quarter', '<b>Tesla · QoQ Net Income Growth<b>', '%NIG'),
+    'QoQ|Adj EBITDA Growth': get_store_figure('get_adj_ebitda_growth', 'QoQ', 'date', 'GrowthRatio', get_scatter_plot, 'Adj EBITDA Growth', 'Quarter', '<b>Tesla · QoQ Adjusted EBITDA Growth<b>', '%AEG'),
+    'QoQ|FcF Growth': get_store_figure('get_fcf_growth', 'QoQ', 'date', 'GrowthRatio', get_scatter_plot, 'FCF Growth', 'Quarter', '<b>Tesla · QoQ FCF Growth<b>', '%FCFG'),
+    'YoY|Revenue Growth': get_store_figure('get_revenue_growth', 'YoY', 'Year', 'GrowthRatio', get_scatter_plot, 'Revenue Growth', 'Quarter', '<b>Tesla · YoY Revenue Growth<b>', '%RG'),
+    'YoY|Gross Profit Growth': get_store_figure('get_gross_profit_growth', 'YoY', 'Year', 'GrowthRatio', get_scatter_plot, 'Gross Profit Growth (%)', 'Quarter', '<b>Tesla · YoY Gross Profit Growth<b>', '%GPG'),
+    'YoY|Income from Operations Growth': get_store_figure('get_income_ops_growth', 'YoY', 'Year', 'GrowthRatio', get_scatter_plot, 'Income Ops Growth (%)', 'Quarter', '<b>Tesla · YoY Income Operations Growth<b>', '%IOG'),
+    'YoY|Net Income Growth': get_store_figure('get_net_income_growth', 'YoY', 'Year', 'GrowthRatio', get_scatter_plot, 'Net Income Growth', 'Quarter', '<b>Tesla · YoY Net Income Growth<b>', '%NIG'),
+    'YoY|Adj EBITDA Growth': get_store_figure('get_adj_ebitda_growth', 'YoY', 'Year', 'GrowthRatio', get_scatter_plot, 'Adj EBITDA Growth', 'Quarter', '<b>Tesla · YoY Adjusted EBITDA Growth<b>', '%AEG'),
+    'YoY|FcF Growth': get_store_figure('get_fcf_growth', 'YoY', 'Year', 'GrowthRatio', get_scatter_plot, 'FCF Growth', 'Quarter', '<b>Tesla · YoY FCF Growth<b>', '%FCFG'),
+}
+
+# WACC has no spec yet: its chart is empty.
+PERF_GRAPH_FIGURES = {
+    'QoQ|Invested Capital': get_store_figure('get_invested_capital', 'QoQ', 'date', 'InvestedCapital', get_bar_plot, 'Invested Capital (m$)', 'Quarter', '<b>Tesla · Invested Capital<b>'),
+    'QoQ|Total Assets': get_store_figure('get_total_assets', 'QoQ', 'date', 'TotalAssets', get_bar_plot, 'Total Assets (m$)', 'Quarter', '<b>Tesla · Total Assets<b>'),
+    'QoQ|ROE': get_store_figure('get_return_on_equity', 'QoQ', 'date', 'RatioNetIncome/TotalStockholdersEquity', get_bar_plot, 'ROE (%)', 'Quarter', '<b>Tesla · ROE<b>'),
+    'QoQ|ROA': get_store_figure('get_return_on_assets', 'QoQ', 'date', 'RatioNetIncome/TotalAssets', get_bar_plot, 'ROA (%)', 'Quarter', '<b>Tesla · ROA<b>'),
+    'QoQ|Operating ROIC': get_store_figure('get_nopat_roic', 'QoQ', 'date', 'RatioNOPAT/InvestedCapital', get_bar_plot, 'NOPAT ROIC (%)', 'Quarter', '<b>Tesla · Quarter NOPAT ROIC<b>'),
+    'QoQ|FcF ROIC': get_store_figure('get_fcf_roic', 'QoQ', 'date', 'RatioFcF/InvestedCapital', get_bar_plot, 'FcF ROIC (%)', 'Quarter', '<b>Tesla · Quarter FcF ROIC<b>'),
+    'TTM|Invested Capital': get_store_figure('get_invested_capital', 'TTM', 'date', 'InvestedCapital', get_bar_plot, 'TTM Invested Capital (m$)', 'Quarter', '<b>Tesla · TTM Invested Capital<b>'),
+    'TTM|Total Assets': get_store_figure('get_total_assets', 'TTM', 'date', 'TTMTotalAssets', get_bar_plot, 'TTM Total Assets (m$)', 'Quarter', '<b>Tesla · TTM Total Assets<b>'),
+    'TTM|ROE': get_store_figure('get_return_on_equity', 'TTM', 'date', 'RatioTTMNetIncome/TTMTotalStockholdersEquity', get_bar_plot, 'TTM ROE (%)', 'Quarter', '<b>Tesla · TTM ROE<b>'),
+    'TTM|ROA': get_store_figure('get_return_on_assets', 'TTM', 'date', 'RatioTTMNetIncome/TTMTotalAssets', get_bar_plot, 'TTM ROA (%)', 'Quarter', '<b>Tesla · TTM ROA<b>'),
+    'TTM|Operating ROIC': get_store_figure('get_nopat_roic', 'TTM', 'date', 'RatioNOPAT/InvestedCapital', get_bar_plot, 'TTM NOPAT ROIC (%)', 'Quarter', '<b>Tesla · TTM NOPAT ROIC<b>'),
+    'TTM|FcF ROIC': get_store_figure('get_fcf_roic', 'TTM', 'date', 'RatioFcF/InvestedCapital', get_bar_plot, 'TTM FcF ROIC (%)', 'Quarter', '<b>Tesla · TTM FcF ROIC<b>'),
+}
+
+FORECAST_GRAPH_FIGURES = {
+    '4 qtr rate FcF ROIC': get_store_figure('_get_rate_fcf_roic', 'QoQ', 'date', 'RateTTM', get_scatter_plot, 'TTM Rate (%)', 'Quarter', '<b>Tesla · TTM Rate of change of FcF ROIC<b>', '%TTMRateFcF'),
+    '4qtr rate Invested Capital': get_store_figure('_get_rate_invested_capital', 'QoQ', 'date', 'RateTTM', get_scatter_plot, 'TTM Rate (%)', 'Quarter', '<b>Tesla · TTM Rate of change of Invested Capital<b>', '%TTMRateFcF'),
+}
+
+def get_store_body() -> list:
+    body = [
+        dcc.Interval(id='financials-interval', n_intervals=0, interval=120*1000),
+        dcc.Store(id='financials-store'),
+        dcc.Store(id='financials-url', data= dash.get_relative_path('/api/tesla/financials.json')),
+        dcc.Store(id='figure-template', data= FIGURE_TEMPLATE),
+        dcc.Store(id='fund-bar-figures', data= FUND_BAR_FIGURES),
+        dcc.Store(id='margin-line-figures', data= MARGIN_LINE_FIGURES),
+        dcc.Store(id='ratio-graph-figures', data= RATIO_GRAPH_FIGURES),
+        dcc.Store(id='growth-graph-figures', data= GROWTH_GRAPH_FIGURES),
+        dcc.Store(id='perf-graph-figures', data= PERF_GRAPH_FIGURES),
+        dcc.Store(id='forecast-graph-figures', data= FORECAST_GRAPH_FIGURES)
+    ]
+    return body
+
+# -----------------------------------------------------------------------------------
 # SUMMARY LAYOUT
 # -----------------------------------------------------------------------------------
 # Set up initial key from Alpha Vantage
@@ -481,11 +667,11 @@ performance_metrics_layout = get_layout(get_performance_body())
 # EQUITY LAYOUT
 # -----------------------------------------------------------------------------------
 # Instantiate locally tesla class
-tesla = TeslaFinancials()
+tesla = MaterializedFinancials.from_env(registry.instance('tesla'))
 
 # Get outstanding shares dict
 data = tesla.get_outstanding_shares()
-df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
+df = get_chronological_df(data)
 
 # Create scatter charts
 fig = go.Figure()
@@ -572,7 +758,7 @@ def price_forecast_body() -> list:
         dbc.Row([
             dbc.Col([], width=10),
             dbc.Col([
-                dcc.Dropdown(id='forecast-timescale', options=['QoQ', 'YoY'], value='QoQ', placeholder='Select timescale...', className= 'button-dropdown mt-2 mb-2')
+                dcc.Dropdown(id='forecast-timescale', options=['QoQ', 'QoQ Monte Carlo', 'YoY'], value='QoQ', placeholder='Select timescale...', className= 'button-dropdown mt-2 mb-2')
             ], width=2)
         ], justify='end'),
         dbc.Row([
@@ -580,6 +766,29 @@ def price_forecast_body() -> list:
                 dcc.Graph(id='forecast-bargraph')
             ], width= 10)
         ], justify= 'center'),
+        dbc.Row([
+            dbc.Col([], width=10),
+            dbc.Col([
+                dcc.Dropdown(id='forecast-multiple', options=[{'label': '{}x FcF'.format(m), 'value': m} for m in MULTIPLES], value=35, placeholder='Select multiple...', className= 'button-dropdown mt-2 mb-2')
+            ], width=2)
+        ], justify='end'),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='forecast-heatmap')
+            ], width= 10)
+        ], justify= 'center'),
+        dbc.Row([
+            dbc.Col([], width=10),
+            dbc.Col([
+                dcc.Dropdown(id='forecast-ic-rate', options=[{'label': 'IC growth {}%/qtr'.format(r), 'value': r} for r in INVESTED_CAPITAL_RATES], value=PRICE_TARGET_SCENARIO['InvestedCapitalRate'],
+                             placeholder='Select invested capital growth...', className= 'button-dropdown mt-2 mb-2')
+            ], width=2)
+        ], justify='end'),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='dcf-heatmap')
+            ], width= 10)
+        ], justify= 'center'),
         dbc.Row([
             dbc.Col([
                 dbc.Card([
@@ -595,10 +804,10 @@ def price_forecast_body() -> list:
                     ),
                     html.Hr(),
                     dbc.CardBody([
-                        html.P('{} $/share'.format('1820'), id='target-id', style={'color': 'white', 'fontSize': 20}, className='mt-1')
+                        html.P(id='target-id', style={'color': 'white', 'fontSize': 20}, className='mt-1'),
+                        html.P(id='dcf-id', style={'color': 'white', 'fontSize': 14}, className='mt-1')
                     ]),
-                    dbc.CardFooter(html.P(['* Number of weighted diluted outstanding shares: {}. Price multiple: {}.'.format('3.460.000.000', '35')], 
-                                    style={'color': 'white', 'fontSize': 10}, className='text-center mt-1 mb-0'))
+                    dbc.CardFooter(html.P(id='target-footer', style={'color': 'white', 'fontSize': 10}, className='text-center mt-1 mb-0'))
                 ], class_name='mt-2 bg-secondary', color= 'dark', outline=True)
             ], width= 3)
         ], justify= 'center')
@@ -613,7 +822,7 @@ price_forecast_layout = get_layout(price_forecast_body())
 # -----------------------------------------------------------------------------------
 # TABS LAYOUT FOR TESLA
 # -----------------------------------------------------------------------------------
-layout = dbc.Tabs(
+layout = html.Div(get_store_body() + [dbc.Tabs(
     [
         dbc.Tab(summary_layout, label="Summary"),
         dbc.Tab(fundamentals_layout, label="Fundamentals"),
@@ -624,7 +833,7 @@ layout = dbc.Tabs(
         dbc.Tab(price_forecast_layout, label="Price Forecast"),
     ],
     class_name='ms-5 me-5 center-screen-tabs'
-)
+)])
 
 
 # -----------------------------------------------------------------------------------
@@ -633,7 +842,18 @@ layout = dbc.Tabs(
 # -----------------------------------------------------------------------------------
 # Instantiate data class
 # -----------------------------------------------------------------------------------
-tesla = TeslaFinancials()
+tesla = MaterializedFinancials.from_env(registry.instance('tesla'))
+
+#-----------------------------------------------------------------------------
+# FINANCIALS STORE CALLBACKS
+# -----------------------------------------------------------------------------------
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'fetch'),
+    Output('financials-store', 'data'),
+    Input('financials-interval', 'n_intervals'),
+    [State('financials-url', 'data'),
+    State('financials-store', 'data')]
+)
 
 #-----------------------------------------------------------------------------
 # SUMMARY CALLBACKS
@@ -642,6 +862,7 @@ tesla = TeslaFinancials()
     Output(component_id='tesla-stock', component_property='figure'),
     [Input(component_id='my_interval', component_property='n_intervals')]
 )
+@tagged()
 def update_graph(n):
     """ Pull financial data from Alpha Vantage and update graph every 2 minutes
 
@@ -670,6 +891,7 @@ def update_graph(n):
     Output(component_id='stock-movement', component_property='children')],
     [Input(component_id='my_interval', component_property='n_intervals')]
 )
+@tagged('update_summary_footer')
 def update_footer(n):
     """Pull financial data from Alpha Vantage and update graph every 2 minutes"""
     ttm_data, ttm_meta_data = ts.get_intraday(symbol='TSLA',interval='1min',outputsize='compact')
@@ -684,154 +906,38 @@ def update_footer(n):
 #-----------------------------------------------------------------------------
 # FUNDAMENTALS CALLBACKS
 # -----------------------------------------------------------------------------------
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'figure'),
     Output('fund-bar', 'figure'),
     [Input('freq-dropdown', 'value'),
-    Input('fund-metric', 'value')]
+    Input('fund-metric', 'value'),
+    Input('financials-store', 'data')],
+    [State('fund-bar-figures', 'data'),
+    State('figure-template', 'data')]
 )
-def update_fund_graph(input_1, input_2):
-
-    if input_1 == 'QoQ' and input_2 == 'Revenue':
-        data = tesla.get_revenue(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TotalRevenues', 'Revenue (m$)', 'Quarter', '<b>Tesla · Revenue<b>')
-
-    elif input_1 == 'QoQ' and input_2 == 'Gross Profit':
-        data = tesla.get_gross_profit(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'GrossProfit', 'Gross Profit (m$)', 'Quarter', '<b>Tesla · Gross Profit<b>')
-
-    elif input_1 == 'QoQ' and input_2 == 'Income from Operations':
-        data = tesla.get_income_ops(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'IncomeFromOperations', 'Income Ops (m$)', 'Quarter', '<b>Tesla · Income Operations<b>')
-
-    elif input_1 == 'QoQ' and input_2 == 'Net Income':
-        data = tesla.get_net_income(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'NetIncome', 'Net Income (m$)', 'Quarter', '<b>Tesla · Net Income<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Adj EBITDA':
-        data = tesla.get_adj_ebitda(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'AdjustedEBITDA', 'Adj EBITDA (m$)', 'Quarter', '<b>Tesla · Adj EBITDA<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'FcF':
-        data = tesla.get_fcf(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'FcF', 'FCF (m$)', 'Quarter', '<b>Tesla · FCF<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'Revenue':
-        data = tesla.get_revenue(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMTotalRevenues', 'TTM Revenue (m$)', 'Quarter', '<b>Tesla · TTM Revenue<b>')
-
-    elif input_1 == 'TTM' and input_2 == 'Gross Profit':
-        data = tesla.get_gross_profit(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMGrossProfit', 'TTM Gross Profit (m$)', 'Quarter', '<b>Tesla · TTM Gross Profit<b>')
-
-    elif input_1 == 'TTM' and input_2 == 'Income from Operations':
-        data = tesla.get_income_ops(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMIncomeFromOperations', 'TTM Income Ops (m$)', 'Quarter', '<b>Tesla · TTM Income Operations<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'Net Income':
-        data = tesla.get_net_income(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMNetIncome', 'TTMNetIncome (m$)', 'Quarter', '<b>Tesla · TTM Net Income<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'Adj EBITDA':
-        data = tesla.get_adj_ebitda(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMAdjustedEBITDA', 'TTMAdjEBITDA (m$)', 'Quarter', '<b>Tesla · TTM Adjusted EBITDA<b>')
-        
-    else:
-        data = tesla.get_fcf(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMFcF', 'TTM FCF (m$)', 'Quarter', '<b>Tesla · TTM FCF<b>')
-    return fig
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'figure'),
     Output('margin-line', 'figure'),
     [Input('freq-dropdown', 'value'),
-    Input('margin-metric', 'value')]
+    Input('margin-metric', 'value'),
+    Input('financials-store', 'data')],
+    [State('margin-line-figures', 'data'),
+    State('figure-template', 'data')]
 )
-def update_fund_margin_graph(input_1, input_2):
-
-    if input_1 == 'QoQ' and input_2 == 'Gross Profit Margin':
-        data = tesla.get_gross_profit_margin(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioGrossProfit/TotalRevenues', 'Gross profit margin (%)', 'Quarter', '<b>Tesla · Gross Profit Margin<b>', '%GM')
-
-    elif input_1 == 'QoQ' and input_2 == 'Operating Income Margin':
-        data = tesla.get_income_ops_margin(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioIncomeFromOperations/TotalRevenues', 'Income ops margin (%)', 'Quarter', '<b>Tesla · Income Operations Margin<b>', '%IOps')
-
-    elif input_1 == 'QoQ' and input_2 == 'Net Income Margin':
-        data = tesla.get_net_income_margin(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioNetIncome/TotalRevenues', 'Net Income margin (%)', 'Quarter', '<b>Tesla · Net Income Margin<b>', '%NI')
-
-    elif input_1 == 'QoQ' and input_2 == 'Adj EBITDA Margin':
-        data = tesla.get_adj_ebitda_margin(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioAdjustedEBITDA/TotalRevenues', 'Adj EBITDA margin (%)', 'Quarter', '<b>Tesla · Adjusted EBITDA Margin<b>', '%AEBITDA')
-
-    elif input_1 == 'TTM' and input_2 == 'Gross Profit Margin':
-        data = tesla.get_gross_profit_margin(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioTTMGrossProfit/TTMTotalRevenues', 'TTM Gross profit margin (%)', 'Quarter', '<b>Tesla · TTM Gross Profit Margin<b>', '%TTMGM')
-
-    elif input_1 == 'TTM' and input_2 == 'Operating Income Margin':
-        data = tesla.get_income_ops_margin(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioTTMIncomeFromOperations/TTMTotalRevenues', 'TTM Income ops margin (%)', 'Quarter', '<b>Tesla · TTM Income Operations Margin<b>', '%TTMIOps')
-
-    elif input_1 == 'TTM' and input_2 == 'Net Income Margin':
-        data = tesla.get_net_income_margin(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioTTMNetIncome/TTMTotalRevenues', 'TTM Net Income margin (%)', 'Quarter', '<b>Tesla · TTM Net Income Margin<b>', '%TTMNI')
-
-    else:
-        data = tesla.get_adj_ebitda_margin(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioTTMAdjustedEBITDA/TTMTotalRevenues', 'TTM Adj EBITDA margin (%)', 'Quarter', '<b>Tesla · TTM Adjusted EBITDA Margin<b>', '%TTMAEBITDA')
-
-    return fig
 
 
 #-----------------------------------------------------------------------------
 # LIQUIDITY&SOLVENCY CALLBACKS
 # -----------------------------------------------------------------------------------
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'figure'),
     Output('ratio-graph', 'figure'),
-    Input('liq-ratio', 'value')
+    [Input('liq-ratio', 'value'),
+    Input('financials-store', 'data')],
+    [State('ratio-graph-figures', 'data'),
+    State('figure-template', 'data')]
 )
-def update_ratio_graph(input):
-
-    if input == 'Current Ratio':
-        data = tesla.get_current_ratio()
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioTotalCurrentAssets/TotalCurrentLiabilities', 'Current Ratio', 'Quarter', '<b>Tesla · Current Ratio<b>', 'CR')
-
-    elif input == 'Quick Ratio':
-        data = tesla.get_quick_ratio()
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'QuickRatio', 'Quick Ratio', 'Quarter', '<b>Tesla · Quick Ratio<b>', 'QR')
-
-    elif input == 'Debt to Equity Ratio':
-        fig = ''
-
-    elif input == 'Debt to Assets Ratio':
-        fig = ''
-    else:
-        data = tesla.get_equity_ratio()
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RatioTotalStockholdersEquity/TotalAssets', 'Equity Ratio', 'Quarter', '<b>Tesla · Equity Ratio<b>', 'ER')
-
-    return fig
 
 @callback(
     [Output('ref-link', 'children'),
@@ -839,6 +945,7 @@ def update_ratio_graph(input):
     Output('ratio-definition', 'children')],
     Input('liq-ratio', 'value')
 )
+@tagged('update_ratio_footer')
 def update_footer(input):
     if input == 'Current Ratio':
         children = ['The current ratio is a liquidity ratio that measures a company’s ability to pay short-term obligations or those due within one year.'
@@ -872,152 +979,28 @@ def update_footer(input):
 #-----------------------------------------------------------------------------
 # GROWTH METRICS CALLBACKS
 # -----------------------------------------------------------------------------------
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'figure'),
     Output('growth-graph', 'figure'),
     [Input('freq-dropdown-2', 'value'),
-    Input('growth-metric', 'value')]
+    Input('growth-metric', 'value'),
+    Input('financials-store', 'data')],
+    [State('growth-graph-figures', 'data'),
+    State('figure-template', 'data')]
 )
-def update_growth_chart(input_1, input_2):
-
-    # 'Revenue Growth', 'Gross Profit Growth', 'Income from Operations Growth', 'Net Income Growth', 'Adj EBITDA Growth', 'EPS Growth', 'FcF Growth'
-    if input_1 == 'QoQ' and input_2 == 'Revenue Growth':
-        data = tesla.get_revenue_growth(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'GrowthRatio', 'Revenue Growth (%)', 'Quarter', '<b>Tesla · QoQ Revenue Growth<b>', '%RG')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Gross Profit Growth':
-        data = tesla.get_gross_profit_growth(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'GrowthRatio', 'Gross Profit Growth (%)', 'Quarter', '<b>Tesla · QoQ Gross Profit Growth<b>', '%GPG')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Income from Operations Growth':
-        data = tesla.get_income_ops_growth(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'GrowthRatio', 'Income Ops Growth (%)', 'Quarter', '<b>Tesla · QoQ Income Operations Growth<b>', '%IOG')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Net Income Growth':
-        data = tesla.get_net_income_growth(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'GrowthRatio', 'Net Income Growth', 'Quarter', '<b>Tesla · QoQ Net Income Growth<b>', '%NIG')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Adj EBITDA Growth':
-        data = tesla.get_adj_ebitda_growth(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'GrowthRatio', 'Adj EBITDA Growth', 'Quarter', '<b>Tesla · QoQ Adjusted EBITDA Growth<b>', '%AEG')
-        
-    elif input_1 == 'QoQ' and input_2 == 'FcF Growth':
-        data = tesla.get_fcf_growth(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'GrowthRatio', 'FCF Growth', 'Quarter', '<b>Tesla · QoQ FCF Growth<b>', '%FCFG')
-        
-    elif input_1 == 'YoY' and input_2 == 'Revenue Growth':
-        data = tesla.get_revenue_growth(timescale= 'YoY')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'Year', 'GrowthRatio', 'Revenue Growth', 'Quarter', '<b>Tesla · YoY Revenue Growth<b>', '%RG')
-        
-    elif input_1 == 'YoY' and input_2 == 'Gross Profit Growth':
-        data = tesla.get_gross_profit_growth(timescale= 'YoY')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'Year', 'GrowthRatio', 'Gross Profit Growth (%)', 'Quarter', '<b>Tesla · YoY Gross Profit Growth<b>', '%GPG')
-        
-    elif input_1 == 'YoY' and input_2 == 'Income from Operations Growth':
-        data = tesla.get_income_ops_growth(timescale= 'YoY')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'Year', 'GrowthRatio', 'Income Ops Growth (%)', 'Quarter', '<b>Tesla · YoY Income Operations Growth<b>', '%IOG')
-        
-    elif input_1 == 'YoY' and input_2 == 'Net Income Growth':
-        data = tesla.get_net_income_growth(timescale= 'YoY')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'Year', 'GrowthRatio', 'Net Income Growth', 'Quarter', '<b>Tesla · YoY Net Income Growth<b>', '%NIG')
-        
-    elif input_1 == 'YoY' and input_2 == 'Adj EBITDA Growth':
-        data = tesla.get_adj_ebitda_growth(timescale= 'YoY')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'Year', 'GrowthRatio', 'Adj EBITDA Growth', 'Quarter', '<b>Tesla · YoY Adjusted EBITDA Growth<b>', '%AEG')
-        
-    else:
-        data = tesla.get_fcf_growth(timescale= 'YoY')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'Year', 'GrowthRatio', 'FCF Growth', 'Quarter', '<b>Tesla · YoY FCF Growth<b>', '%FCFG')
-        
-    return fig
-
 
 #------------------------------------------------------------------------------------
 # PERFORMANCE METRICS CALLBACKS
 # -----------------------------------------------------------------------------------
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'figure'),
     Output('perf-graph', 'figure'),
     [Input('freq-dropdown-3', 'value'),
-    Input('perf-metric', 'value')]
+    Input('perf-metric', 'value'),
+    Input('financials-store', 'data')],
+    [State('perf-graph-figures', 'data'),
+    State('figure-template', 'data')]
 )
-def update_perf_graph(input_1, input_2):
-    if input_1 == 'QoQ' and input_2 == 'Invested Capital':
-        data = tesla.get_invested_capital(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'InvestedCapital', 'Invested Capital (m$)', 'Quarter', '<b>Tesla · Invested Capital<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Total Assets':
-        data = tesla.get_total_assets(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TotalAssets', 'Total Assets (m$)', 'Quarter', '<b>Tesla · Total Assets<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'ROE':
-        data = tesla.get_return_on_equity(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioNetIncome/TotalStockholdersEquity', 'ROE (%)', 'Quarter', '<b>Tesla · ROE<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'ROA':
-        data = tesla.get_return_on_assets(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioNetIncome/TotalAssets', 'ROA (%)', 'Quarter', '<b>Tesla · ROA<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'Operating ROIC':
-        data = tesla.get_nopat_roic(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioNOPAT/InvestedCapital', 'NOPAT ROIC (%)', 'Quarter', '<b>Tesla · Quarter NOPAT ROIC<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'FcF ROIC':
-        data = tesla.get_fcf_roic(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioFcF/InvestedCapital', 'FcF ROIC (%)', 'Quarter', '<b>Tesla · Quarter FcF ROIC<b>')
-        
-    elif input_1 == 'QoQ' and input_2 == 'WACC':
-        fig = ''
-        
-    elif input_1 == 'TTM' and input_2 == 'Invested Capital':
-        data = tesla.get_invested_capital(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'InvestedCapital', 'TTM Invested Capital (m$)', 'Quarter', '<b>Tesla · TTM Invested Capital<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'Total Assets':
-        data = tesla.get_total_assets(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'TTMTotalAssets', 'TTM Total Assets (m$)', 'Quarter', '<b>Tesla · TTM Total Assets<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'ROE':
-        data = tesla.get_return_on_equity(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioTTMNetIncome/TTMTotalStockholdersEquity', 'TTM ROE (%)', 'Quarter', '<b>Tesla · TTM ROE<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'ROA':
-        data = tesla.get_return_on_assets(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioTTMNetIncome/TTMTotalAssets', 'TTM ROA (%)', 'Quarter', '<b>Tesla · TTM ROA<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'Operating ROIC':
-        data = tesla.get_nopat_roic(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioNOPAT/InvestedCapital', 'TTM NOPAT ROIC (%)', 'Quarter', '<b>Tesla · TTM NOPAT ROIC<b>')
-        
-    elif input_1 == 'TTM' and input_2 == 'FcF ROIC':
-        data = tesla.get_fcf_roic(timescale= 'TTM')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_bar_plot(df, 'date', 'RatioFcF/InvestedCapital', 'TTM FcF ROIC (%)', 'Quarter', '<b>Tesla · TTM FcF ROIC<b>')
-        
-    else:
-        fig = ''
-    return fig
 
 @callback(
     [Output('perf-definition', 'children'),
@@ -1026,6 +1009,7 @@ def update_perf_graph(input_1, input_2):
     Output('link-def', 'children')],
     Input('perf-metric', 'value')
 )
+@tagged()
 def update_footer_perf(input):
     children_link = 'See more about {} here'.format(input)
     if input == 'Invested Capital':
@@ -1074,33 +1058,66 @@ def update_footer_perf(input):
 #------------------------------------------------------------------------------------
 # PRICE FORECAST CALLBACKS
 # -----------------------------------------------------------------------------------
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace= 'financials', function_name= 'figure'),
     Output('forecast-graph', 'figure'),
-    Input('forecast-metric', 'value')
+    [Input('forecast-metric', 'value'),
+    Input('financials-store', 'data')],
+    [State('forecast-graph-figures', 'data'),
+    State('figure-template', 'data')]
 )
-def update_forecast_upper_graph(input):
-    if input == '4 qtr rate FcF ROIC':
-        data = tesla._get_rate_fcf_roic(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RateTTM', 'TTM Rate (%)', 'Quarter', '<b>Tesla · TTM Rate of change of FcF ROIC<b>', '%TTMRateFcF')
-        
-    else:
-        data = tesla._get_rate_invested_capital(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=False)
-        fig = get_scatter_plot(df, 'date', 'RateTTM', 'TTM Rate (%)', 'Quarter', '<b>Tesla · TTM Rate of change of Invested Capital<b>', '%TTMRateFcF')
-        
-    return fig
 
 @callback(
     Output('forecast-bargraph', 'figure'),
     Input('forecast-timescale', 'value')
 )
+@tagged()
 def update_forecast_bottom_graph(input):
     if input == 'QoQ':
         data = tesla.projected_fcf(timescale= 'QoQ')
-        df = pd.DataFrame.from_dict(data).sort_index(ascending=True)
+        df = get_chronological_df(data)
         fig = get_bar_plot(df, 'Quarter', 'FcFProjected', 'FCF (m$)', 'Quarter', '<b>Tesla · Projected Quarterly FcF (Non Adj.)<b>')
 
+    elif input == 'QoQ Monte Carlo':
+        # 10k paths of quarterly growth rates drawn from the recent TTM rates of change.
+        data = tesla.projected_fcf(timescale= 'QoQ', n_paths= 10000)
+        df = get_chronological_df(data)
+        fig = get_band_plot(df, 'Quarter', 'FcFP5', 'FcFP50', 'FcFP95', 'FCF (m$)', 'Quarter', '<b>Tesla · Projected Quarterly FcF, P5-P50-P95 (Non Adj.)<b>', 'FcF')
+
     else:
         fig = ''
-    return fig
\ No newline at end of file
+    return fig
+
+@callback(
+    [Output('forecast-heatmap', 'figure'),
+    Output('target-id', 'children'),
+    Output('target-footer', 'children')],
+    Input('forecast-multiple', 'value')
+)
+@tagged()
+def update_price_target(multiple):
+    # Whole sensitivity grid in one call, the dropdown selects the multiple slice.
+    grid = tesla.price_target_grid()
+    multiple = multiple if multiple in grid['Multiple'] else 35
+    surface = [[row[grid['Multiple'].index(multiple)][0] for row in rate_row] for rate_row in grid['PriceTarget']]
+    fig = get_heatmap_plot(surface, ['{:.0%}'.format(cap) for cap in grid['FcFRoicCap']], ['{}%'.format(rate) for rate in grid['InvestedCapitalRate']],
+                           'Invested capital growth per quarter', 'FcF ROIC cap', '<b>Tesla · {} price target sensitivity ({}x FcF)<b>'.format(grid['Year'], multiple), '$/share')
+    target = surface[grid['InvestedCapitalRate'].index(PRICE_TARGET_SCENARIO['InvestedCapitalRate'])][grid['FcFRoicCap'].index(PRICE_TARGET_SCENARIO['FcFRoicCap'])]
+    footer = ['* Number of weighted diluted outstanding shares: {:,.0f}. Price multiple: {}. Invested capital growth: {}% per quarter. FcF ROIC cap: {:.0%}.'.format(
+              grid['Shares'][0] * 1e6, multiple, PRICE_TARGET_SCENARIO['InvestedCapitalRate'], PRICE_TARGET_SCENARIO['FcFRoicCap']).replace(',', '.')]
+    return fig, '{:.0f} $/share'.format(target), footer
+
+@callback(
+    [Output('dcf-heatmap', 'figure'),
+    Output('dcf-id', 'children')],
+    Input('forecast-ic-rate', 'value')
+)
+@tagged()
+def update_dcf_value(invested_capital_rate):
+    # Discount rates around WACC x terminal growth rates, valued in one array operation.
+    dcf = tesla.get_dcf_value(invested_capital_rate= invested_capital_rate if invested_capital_rate is not None else PRICE_TARGET_SCENARIO['InvestedCapitalRate'],
+                              fcf_roic_cap= PRICE_TARGET_SCENARIO['FcFRoicCap'])
+    fig = get_heatmap_plot(dcf['ValuePerShare'], ['{:.1%}'.format(g) for g in dcf['TerminalGrowthRate']], ['{:.1%}'.format(r) for r in dcf['DiscountRate']],
+                           'Discount rate', 'Terminal growth', '<b>Tesla · DCF value per share (WACC {:.1%})<b>'.format(dcf['WACC']), '$/share')
+    at_wacc = dcf['ValuePerShare'][dcf['DiscountRate'].index(dcf['WACC'])][dcf['TerminalGrowthRate'].index(0.025)] if dcf['WACC'] in dcf['DiscountRate'] else float('nan')
+    return fig, 'DCF at WACC {:.1%}, 2.5% terminal growth: {:.0f} $/share'.format(dcf['WACC'], at_wacc)
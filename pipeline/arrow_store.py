@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+
+# Arrow IPC and Parquet storage of materialized metric bundles (see pipeline.materialize). A bundle is one table with a row per
+# series (metric key and column name) whose values sit in the list column of their type, so reading a series is a slice of the
+# file buffers. Arrow IPC files are read through a memory map: worker processes share the page cache copy of the file and start
+# with an mmap instead of recomputing or parsing the bundle. Company, creation time and collection versions go to the schema
+# metadata. pyarrow is an optional dependency, imported on first use. Usage:
+#   python -m pipeline.materialize tesla --output metrics/ --format arrow
+
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+# Series kinds and the list column holding their values. Series mixing types (or holding None, bools, nested lists) are stored
+# as JSON text so that they read back unchanged.
+VALUE_COLUMNS = {'int': 'int_values', 'float': 'float_values', 'str': 'str_values', 'json': 'json_values'}
+
+
+def _pyarrow() -> object:
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise Exception('Arrow and Parquet metric files need pyarrow, please install it (pip install pyarrow)') from e
+    return pyarrow
+
+
+def series_kind(values: object) -> str:
+    """ Storage kind of a series: 'int', 'float' or 'str' when all values have that Python type, 'json' otherwise.
+
+    Returns:
+        str: key of VALUE_COLUMNS.
+    """
+    if not isinstance(values, list) or len(values) == 0:
+        return 'json'
+    types = set(type(v) for v in values)
+    if len(types) == 1 and types.pop() in (int, float, str):
+        return type(values[0]).__name__
+    return 'json'
+
+
+def bundle_to_columns(result: dict) -> tuple:
+    """ Table columns (one row per series) and schema metadata of a bundle.
+
+    Args:
+        result (dict): output of materialize_company.
+
+    Returns:
+        tuple: (dict of column lists, dict of metadata strings).
+    """
+    columns = {'metric': [], 'column': [], 'kind': []}
+    columns.update({name: [] for name in VALUE_COLUMNS.values()})
+    for key, entry in result['metrics'].items():
+        for name, values in entry['data'].items():
+            kind = series_kind(values)
+            columns['metric'].append(key)
+            columns['column'].append(name)
+            columns['kind'].append(kind)
+            for value_kind, value_column in VALUE_COLUMNS.items():
+                if value_kind != kind:
+                    columns[value_column].append(None)
+                else:
+                    columns[value_column].append(json.dumps(values) if kind == 'json' else values)
+    metadata = {'company': result['company'], 'created': json.dumps(result.get('created')),
+                'versions': json.dumps({key: entry['versions'] for key, entry in result['metrics'].items()})}
+    return columns, metadata
+
+
+def bundle_to_table(result: dict) -> object:
+    """ Arrow table of a bundle (see bundle_to_columns).
+
+    Returns:
+        object: pyarrow.Table.
+    """
+    pa = _pyarrow()
+    columns, metadata = bundle_to_columns(result)
+    types = {'metric': pa.string(), 'column': pa.string(), 'kind': pa.string(), 'int_values': pa.list_(pa.int64()),
+             'float_values': pa.list_(pa.float64()), 'str_values': pa.list_(pa.string()), 'json_values': pa.string()}
+    return pa.table({name: pa.array(values, type= types[name]) for name, values in columns.items()}, metadata= metadata)
+
+
+def table_to_bundle(table: object) -> dict:
+    """ Bundle of an Arrow table written by bundle_to_table. Int and float series are NumPy arrays backed by the table buffers
+    (no copy for memory mapped files); string and JSON series are lists.
+
+    Args:
+        table (object): pyarrow.Table.
+
+    Returns:
+        dict: same layout as materialize_company output.
+    """
+    metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+    versions = json.loads(metadata.get('versions', '{}'))
+    table = table.combine_chunks()
+    metrics = {}
+    if table.num_rows > 0:
+        # Series are slices of the flattened values of each list column, delimited by the list offsets.
+        flat, offsets = {}, {}
+        for kind in ['int', 'float', 'str']:
+            list_array = table.column(VALUE_COLUMNS[kind]).chunk(0)
+            offsets[kind] = list_array.offsets.to_numpy()
+            flat[kind] = list_array.values.to_pylist() if kind == 'str' else list_array.values.to_numpy(zero_copy_only= False)
+        json_values = table.column(VALUE_COLUMNS['json']).to_pylist()
+        for i, (key, name, kind) in enumerate(zip(table.column('metric').to_pylist(), table.column('column').to_pylist(), table.column('kind').to_pylist())):
+            if kind == 'json':
+                values = json.loads(json_values[i])
+            else:
+                values = flat[kind][offsets[kind][i]:offsets[kind][i + 1]]
+            metrics.setdefault(key, {'versions': versions.get(key, {}), 'data': {}})['data'][name] = values
+    return {'company': metadata.get('company'), 'created': json.loads(metadata.get('created', 'null')), 'metrics': metrics}
+
+
+def write_metrics_arrow(result: dict, path: str, format: str = 'arrow') -> str:
+    """ Write a bundle as an Arrow IPC or Parquet file. The file is replaced atomically.
+
+    Args:
+        result (dict): output of materialize_company.
+        path (str): target file.
+        format (str, optional): 'arrow' or 'parquet'. Defaults to 'arrow'.
+
+    Returns:
+        str: path of written file.
+    """
+    if format not in FORMATS:
+        raise TypeError('Format specified is not contemplated. Please enter one of: {}'.format(', '.join(FORMATS)))
+    pa = _pyarrow()
+    table = bundle_to_table(result)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    if format == 'arrow':
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        pa.parquet.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_metrics_arrow(path: str) -> dict:
+    """ Read a bundle written by write_metrics_arrow. Arrow IPC files are memory mapped, Parquet files are read through a memory
+    map and decoded.
+
+    Args:
+        path (str): Arrow IPC (.arrow) or Parquet (.parquet) file.
+
+    Returns:
+        dict: same layout as materialize_company output.
+    """
+    pa = _pyarrow()
+    if path.endswith(FORMATS['parquet']):
+        return table_to_bundle(pa.parquet.read_table(path, memory_map= True))
+    # Arrays keep a reference to the mapped file, which stays mapped while they are alive.
+    return table_to_bundle(pa.ipc.open_file(pa.memory_map(path, 'r')).read_all())
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import math
+import time
+import importlib
+import threading
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.db_interface import MappedDataInterface, get_company_interface
+from pipeline.data_processing import CompanyFinancials, TeslaFinancials
+
+# Registry of covered companies and a process pool runner computing metric bundles for many of them. Every company is described by
+# a CompanyDefinition: where its data lives and how its collection and field names map to the ones used by the pipeline (the
+# layout of db/tesla). Definitions can be loaded from a JSON file (list of objects with the CompanyDefinition fields), by default
+# from the COMPANY_DEFINITIONS env variable.
+
+TIMESCALES = ['QoQ', 'TTM', 'YoY']
+
+
+class StandardFinancials(TeslaFinancials):
+    """ Company whose data follows the pipeline layout once translated by its definition (see MappedDataInterface). The formulas
+    are the ones implemented for Tesla, which defines the standard collection and field names.
+    """
+
+
+@dataclasses.dataclass
+class CompanyDefinition:
+    """ Description of a covered company.
+
+    Args:
+        ticker (str): registry key, e.g. 'tsla'.
+        name (str): company name.
+        host (str): data host url, 'mongodb://...' or 'file://<folder>'.
+        database (str): database name.
+        collections (dict, optional): pipeline collection name -> company collection name. Defaults to {}.
+        fields (dict, optional): pipeline field name -> company field name. Defaults to {}.
+        financials_class (str, optional): CompanyFinancials subclass path. Defaults to StandardFinancials.
+    """
+    ticker: str
+    name: str
+    host: str
+    database: str
+    collections: dict = dataclasses.field(default_factory= dict)
+    fields: dict = dataclasses.field(default_factory= dict)
+    financials_class: str = 'pipeline.companies.StandardFinancials'
+
+    def create(self, host: str = None, database: str = None, **kwargs) -> CompanyFinancials:
+        """ Instantiate the company.
+
+        Args:
+            host (str, optional): overrides definition host. Defaults to None.
+            database (str, optional): overrides definition database. Defaults to None.
+
+        Returns:
+            CompanyFinancials: _description_
+        """
+        host, database = host or self.host, database or self.database
+        interface = get_company_interface(host, database)
+        if len(self.collections) > 0 or len(self.fields) > 0:
+            interface = MappedDataInterface(interface, self.collections, self.fields)
+        module_name, class_name = self.financials_class.rsplit('.', 1)
+        company_class = getattr(importlib.import_module(module_name), class_name)
+        return company_class(name= self.name, host= host, database= database, data_interface= interface, **kwargs)
+
+
+class CompanyRegistry:
+    """ Company definitions by ticker (case insensitive), and the instance of every company shared within the process.
+    """
+    def __init__(self, definitions: list = []) -> None:
+        self._definitions = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+        for definition in definitions:
+            self.register(definition)
+
+    def register(self, definition: CompanyDefinition) -> None:
+        with self._lock:
+            self._definitions[definition.ticker.lower()] = definition
+            # A new definition gets a new instance.
+            self._instances.pop(definition.ticker.lower(), None)
+
+    def get(self, ticker: str) -> CompanyDefinition:
+        if ticker.lower() not in self._definitions:
+            raise Exception('Company {} is not registered. Please enter one of: {}'.format(ticker, self.tickers))
+        return self._definitions[ticker.lower()]
+
+    def instance(self, ticker: str) -> CompanyFinancials:
+        """ Instance of a company created from its definition on first use and reused afterwards, so that servers keep one data
+        interface and one set of memoized results per company instead of building them on every request.
+
+        Args:
+            ticker (str): registered ticker.
+
+        Returns:
+            CompanyFinancials: _description_
+        """
+        definition = self.get(ticker)
+        with self._lock:
+            if ticker.lower() not in self._instances:
+                self._instances[ticker.lower()] = definition.create()
+            return self._instances[ticker.lower()]
+
+    def load_file(self, path: str) -> None:
+        """ Register every definition of a JSON file.
+
+        Args:
+            path (str): JSON file with a list of objects with CompanyDefinition fields.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                self.register(CompanyDefinition(**item))
+
+    @property
+    def tickers(self) -> list:
+        return list(self._definitions.keys())
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker.lower() in self._definitions
+
+    def __iter__(self):
+        return iter(self._definitions.values())
+
+    def __len__(self) -> int:
+        return len(self._definitions)
+
+
+# Process-wide registry. Tesla is always covered.
+registry = CompanyRegistry([CompanyDefinition('tesla', 'Tesla', os.environ.get('TESLA_DB_HOST', "mongodb://localhost:27017"), 'tesla_db',
+                                              financials_class= 'pipeline.data_processing.TeslaFinancials')])
+if os.environ.get('COMPANY_DEFINITIONS'):
+    registry.load_file(os.environ['COMPANY_DEFINITIONS'])
+
+
+def default_bundle(financials: CompanyFinancials, timescales: list = None) -> list:
+    """ Every derived metric of the company metric graph for every timescale.
+
+    Returns:
+        list: (metric name, timescale) requests.
+    """
+    graph = financials.metric_graph
+    return [(name, timescale) for name in graph.metrics if not graph.node(name).is_source for timescale in (timescales or TIMESCALES)]
+
+
+def compute_bundle(ticker: str, bundle: list = None, host: str = None, database: str = None) -> dict:
+    """ Evaluate a bundle of metrics for one company in a single pass over its metric graph.
+
+    Args:
+        ticker (str): registered ticker.
+        bundle (list, optional): (metric name, timescale) requests. Defaults to default_bundle.
+
+    Returns:
+        dict: metric dict per 'metric:timescale' key.
+    """
+    financials = registry.get(ticker).create(host, database)
+    bundle = bundle or default_bundle(financials)
+    return {'{}:{}'.format(*request): result for request, result in zip(bundle, financials.evaluate_metrics(bundle))}
+
+
+def run_universe(tickers: list, job = compute_bundle, workers: int = None, chunk_size: int = None, progress = None, **kwargs) -> dict:
+    """ Run a job for many companies across a process pool. Tickers are sent in chunks to amortize process round trips; a failing
+    company does not stop the others.
+
+    Args:
+        tickers (list): registered tickers.
+        job (callable, optional): top level function called as job(ticker, **kwargs) in worker processes. Defaults to compute_bundle.
+        workers (int, optional): processes. Defaults to number of cpus.
+        chunk_size (int, optional): tickers per task. Defaults to about four tasks per worker.
+        progress (callable, optional): called as progress(done, total, chunk_results) after every finished chunk.
+
+    Returns:
+        dict: per ticker, job result or {'ticker', 'error': message, 'seconds'}.
+    """
+    definitions = [registry.get(t) for t in tickers]
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, math.ceil(len(definitions) / (workers * 4)))
+    chunks = [definitions[i:i + chunk_size] for i in range(0, len(definitions), chunk_size)]
+    results = {}
+    def collect(chunk_results):
+        results.update(chunk_results)
+        if progress is not None:
+            progress(len(results), len(definitions), chunk_results)
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            collect(_run_chunk(job, chunk, kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers= min(workers, len(chunks))) as executor:
+            for future in as_completed([executor.submit(_run_chunk, job, chunk, kwargs) for chunk in chunks]):
+                collect(future.result())
+    return {d.ticker: results[d.ticker] for d in definitions}
+
+
+def _run_chunk(job, definitions: list, kwargs: dict) -> dict:
+    # Worker side: definitions are registered first, so companies registered at runtime in the parent are known here as well.
+    results = {}
+    for definition in definitions:
+        registry.register(definition)
+        started = time.perf_counter()
+        try:
+            results[definition.ticker] = job(definition.ticker, **kwargs)
+        except Exception as e:
+            results[definition.ticker] = {'ticker': definition.ticker, 'error': repr(e), 'seconds': time.perf_counter() - started}
+    return results
+
+
+def print_progress(done: int, total: int, chunk_results: dict) -> None:
+    """ Progress callback for command line jobs.
+    """
+    failed = [t for t, r in chunk_results.items() if isinstance(r, dict) and 'error' in r]
+    print('[{}/{}] {}{}'.format(done, total, ', '.join(chunk_results), ' (failed: {})'.format(', '.join(failed)) if failed else ''))
@@ -1,19 +1,29 @@
 # -*- coding: utf-8 -*-
 
 # GLOBAL IMPORTS
+import os
 from os import times
 import sys
 import abc
+import asyncio
+import hashlib
 from time import time
 from xml.dom.minidom import Element
-import pandas as pd
 import numpy as np
 
 # LOCAL IMPORTS
 sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
 from dataclasses import make_dataclass
 import json
-from db.db_interface import CompanyDbInterface
+from db.db_interface import CompanyDbInterface, get_company_interface
+from db.async_db_interface import AsyncCompanyDbInterface
+from db.aggregation import yoy_pipeline, ttm_pipeline, yoy_output_keys, ttm_output_keys
+from pipeline.metric_graph import MetricGraph
+from pipeline.memo import metric_cache, memoize_method, record_source
+from pipeline.simulation import simulate_fcf_percentiles
+from pipeline.sensitivity import project_fcf_grid, price_target_surface, FCF_ROIC_CAP, FCF_ROIC_CAPS, INVESTED_CAPITAL_RATES, MULTIPLES
+from pipeline.valuation import (cost_of_equity, wacc, discounted_value, value_per_share, RISK_FREE_RATE, EQUITY_RISK_PREMIUM, DISCOUNT_RATE_SPREADS,
+                                TERMINAL_GROWTH_RATES)
 from utils.utils import *
 
 
@@ -70,9 +80,76 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
                 callable(subclass.get_wacc) or 
                 NotImplemented)
 
-    def __init__(self, company_name: str, host: str, database: str):
+    # Methods whose results are memoized (see pipeline.memo). Entries are reused while the source collections keep their version.
+    MEMOIZED_METHODS = ['get_revenue', 'get_gross_profit', 'get_income_ops', 'get_net_income', 'get_adj_ebitda', 'get_fcf',
+                        'get_gross_profit_margin', 'get_income_ops_margin', 'get_net_income_margin', 'get_adj_ebitda_margin',
+                        'get_current_ratio', 'get_quick_ratio', 'get_debt_to_equity_ratio', 'get_debt_to_assets_ratio', 'get_equity_ratio',
+                        'get_revenue_growth', 'get_gross_profit_growth', 'get_income_ops_growth', 'get_net_income_growth',
+                        'get_adj_ebitda_growth', 'get_fcf_growth', 'get_invested_capital', 'get_total_assets', 'get_return_on_assets',
+                        'get_return_on_equity', 'get_fcf_roic', 'get_nopat_roic', 'get_outstanding_shares', '_get_rate_fcf_roic',
+                        '_get_rate_invested_capital', 'projected_fcf', 'get_wacc', 'evaluate_metrics', 'encoded_financials']
+
+    def __init__(self, company_name: str, host: str, database: str, server_side_aggregation: bool = False, data_interface: object = None, memoize: bool = True):
         self.company_name = company_name
-        self._db_interface= CompanyDbInterface(host, database)
+        # Data source is pluggable: any CompanyDataInterface can be passed, otherwise it is built from the host url scheme.
+        self._db_interface= data_interface if data_interface is not None else get_company_interface(host, database)
+        # When True, YoY and TTM timescales are computed by MongoDb aggregation pipelines instead of in process.
+        self._server_side_aggregation = server_side_aggregation
+        self._async_interface = None
+        self._metric_graph = None
+        # Interfaces without version tokens are never memoized.
+        self._memoize = memoize and hasattr(self._db_interface, 'get_collection_version')
+        if self._memoize:
+            for name in self.MEMOIZED_METHODS:
+                method = getattr(self, name, None)
+                if method is not None:
+                    setattr(self, name, memoize_method(method, self._memo_owner, self._db_interface))
+
+    @property
+    def _memo_owner(self) -> tuple:
+        """ Key shared by every instance reading the same company data, so that pages instantiating their own object reuse results.
+
+        Returns:
+            tuple: class name, company name, host, database and aggregation mode.
+        """
+        host = getattr(self._db_interface, '_host_url', getattr(self._db_interface, '_host', None))
+        database = getattr(self._db_interface, '_db', None)
+        return (type(self).__name__, self.company_name, str(host), str(getattr(database, 'name', database)), self._server_side_aggregation)
+
+    def with_data_interface(self, data_interface: object, memoize: bool = False) -> 'CompanyFinancials':
+        """ Instance of the same company reading from another data interface, e.g. a restricted view of the same data. It is not
+        memoized by default since its results would share cache keys with this instance.
+
+        Args:
+            data_interface (object): CompanyDataInterface instance.
+            memoize (bool, optional): Defaults to False.
+
+        Returns:
+            CompanyFinancials: _description_
+        """
+        financials = object.__new__(type(self))
+        CompanyFinancials.__init__(financials, self.company_name, None, None, self._server_side_aggregation, data_interface, memoize)
+        return financials
+
+    def invalidate_cache(self, collection: str = None) -> None:
+        """ Drop memoized results of the company (only those computed from collection if given) and reload the data interface
+        snapshots. Needed when data changes without a new version token, e.g. a collection edited in place with the same count.
+
+        Args:
+            collection (str, optional): Collection name. Defaults to None (every collection).
+        """
+        metric_cache.invalidate(owner= self._memo_owner, collection= collection)
+        if hasattr(self._db_interface, 'invalidate_snapshots'):
+            self._db_interface.invalidate_snapshots(collection)
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """ Hit/miss counters and size of the process-wide metric cache.
+
+        Returns:
+            dict: _description_
+        """
+        return metric_cache.stats()
 
     @property
     def hostname(self) -> str:
@@ -102,10 +179,73 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         return self._db_interface._db_collections
 
     @property
-    def financials_in_json(self) -> json:
-        pass
+    def async_interface(self) -> AsyncCompanyDbInterface:
+        """ asyncio wrapper around the data interface, created on first use.
 
-    def _parse_to_timescaled_dict(self, collection: str, keys: list = [], timescale: str = 'QoQ') -> dict:
+        Returns:
+            AsyncCompanyDbInterface: _description_
+        """
+        if self._async_interface is None:
+            self._async_interface = AsyncCompanyDbInterface(self._db_interface)
+        return self._async_interface
+
+    @property
+    def metric_graph(self) -> MetricGraph:
+        """ Dependency graph of the company metrics, built on first use.
+
+        Returns:
+            MetricGraph: _description_
+        """
+        if self._metric_graph is None:
+            self._metric_graph = self._build_metric_graph()
+        return self._metric_graph
+
+    def _build_metric_graph(self) -> MetricGraph:
+        """ Declare source fields and derived metrics of the company. Subclasses add their nodes.
+
+        Returns:
+            MetricGraph: _description_
+        """
+        return MetricGraph()
+
+    def evaluate_metrics(self, requests: list) -> list:
+        """ Compute several metrics in one pass over the metric graph: every collection is fetched once and shared intermediates
+        (e.g. invested capital for FcF ROIC and NOPAT ROIC) are computed once.
+
+        Args:
+            requests (list): list of (metric name, timescale) tuples, e.g. [('fcf_roic', 'TTM'), ('nopat_roic', 'TTM')].
+
+        Returns:
+            list: metric dicts in the same order as requests.
+        """
+        results = self.metric_graph.evaluate(self, requests)
+        return [results[tuple(request)] for request in requests]
+
+    @property
+    def financials_in_json(self) -> bytes:
+        """ Every metric of the company for every timescale as one JSON document (see encoded_financials).
+
+        Returns:
+            bytes: UTF-8 encoded JSON document.
+        """
+        return self.encoded_financials()[0]
+
+    def encoded_financials(self) -> tuple:
+        """ Every getter result for every timescale encoded as one JSON document, the payload consumed by downstream services and the
+        dashboard client-side store instead of separate getter calls. Layout is that of pipeline.materialize bundles without the
+        creation time: 'company' and 'metrics' (metric key -> {'versions', 'data'}), so that identical data gives identical bytes.
+        The method is memoized: the encoded document and its ETag are reused until a source collection changes version.
+
+        Returns:
+            tuple: (bytes, str) JSON document and its ETag, a digest of the document.
+        """
+        # Imported here since pipeline.materialize imports this module.
+        from pipeline.materialize import materialize_company
+        bundle = materialize_company(self)
+        body = encode_json({'company': bundle['company'], 'metrics': bundle['metrics']})
+        return body, hashlib.blake2b(body, digest_size= 16).hexdigest()
+
+    def _parse_to_timescaled_dict(self, collection: str, keys: list = [], timescale: str = 'QoQ', last_n: int = None) -> dict:
         """ A method that parses input data from database into a dictionary with keys and values. Values are returned in different timescales
         depending of the timescale flag argument value.
 
@@ -113,34 +253,105 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
             collection (str): database collection target.
             key (list): List of keys to be searched in collection. Defaults to ['TotalRevenues', 'date'].
             timescale (str): Frequency of returned data. Defaults to 'QoQ. Any of three values: QoQ, YoY or TTM.
+            last_n (int, optional): return only the most recent last_n quarters, fetched through the quarter range query. QoQ only.
+                Defaults to None.
 
         Returns:
             _type_: dictionary with keys equal to input key names and values equal to lists.
         """
-        packed_data = self._db_interface._find_values_for_multiple_keys(collection, keys)
+        if last_n is not None and timescale != 'QoQ':
+            raise TypeError('last_n is only contemplated for QoQ timescale')
+        if self._server_side_aggregation and timescale in ['YoY', 'TTM'] and hasattr(self._db_interface, 'aggregate'):
+            return self._parse_aggregated_dict(collection, keys, timescale)
+        record_source(collection)
+        if last_n is not None:
+            packed_data = self._db_interface.find_values_for_quarter_range(collection, keys, last_n= last_n)
+        else:
+            packed_data = self._db_interface._find_values_for_multiple_keys(collection, keys)
         unpacked_data = unpack_cursor_object_multiple(packed_data, keys)
+        return self._to_timescaled_dict(unpacked_data, collection, keys, timescale)
+
+    async def _aparse_to_timescaled_dict(self, collection: str, keys: list = [], timescale: str = 'QoQ') -> dict:
+        """ Coroutine version of _parse_to_timescaled_dict. The fetch runs in the async interface thread pool so that several
+        collections can be awaited concurrently.
+
+        Args:
+            collection (str): database collection target.
+            key (list): List of keys to be searched in collection. Defaults to [].
+            timescale (str): Frequency of returned data. Defaults to 'QoQ. Any of three values: QoQ, YoY or TTM.
+
+        Returns:
+            _type_: dictionary with keys equal to input key names and values equal to lists.
+        """
+        if self._server_side_aggregation and timescale in ['YoY', 'TTM'] and hasattr(self._db_interface, 'aggregate'):
+            return await self.async_interface.run(self._parse_aggregated_dict, collection, keys, timescale)
+        unpacked_data = await self.async_interface.find_values_for_multiple_keys(collection, keys)
+        return self._to_timescaled_dict(unpacked_data, collection, keys, timescale)
+
+    def _to_timescaled_dict(self, unpacked_data: dict, collection: str, keys: list = [], timescale: str = 'QoQ') -> dict:
+        """ Convert unpacked quarterly data into the requested timescale.
+
+        Args:
+            unpacked_data (dict): dictionary with one list per key, as returned by unpack_cursor_object_multiple.
+            collection (str): database collection the data comes from.
+            key (list): List of keys in unpacked_data. Defaults to [].
+            timescale (str): Frequency of returned data. Defaults to 'QoQ. Any of three values: QoQ, YoY or TTM.
+
+        Returns:
+            _type_: dictionary with keys equal to input key names and values equal to lists.
+        """
         if timescale == 'QoQ':            
             return unpacked_data
         elif timescale == 'YoY':
             # TODO: Add Year column directly to database
-            df_data = pd.DataFrame.from_dict(unpacked_data)
+            frame = ColumnarFrame.from_dict(unpacked_data)
             try:
-                df_data['Year'] = df_data['date'].apply(lambda x: int('20' + x[2:]))
+                frame['Year'] = frame.index.years
             except ValueError as e:
                 print(['Wrong date value format in database collection {}'.format(collection)], e)
-            df_data.drop('date', axis = 1, inplace= True)
-            df_data = df_data.groupby('Year').sum().reset_index().sort_index(ascending=False)
-            dict_data = df_data.to_dict()
-            return dict_values_to_list_values_in_dict(dict_data)
+            return frame.drop(['date']).group_sum('Year').to_dict()
         elif timescale == 'TTM':
-            df_data = pd.DataFrame.from_dict(unpacked_data)
-            i = 0
-            for k in keys:
-                if [type(element) for element in unpacked_data[k]] == [type(element) for element in range(len(unpacked_data[k]))]:
-                    df_data.insert(loc = i, column= 'TTM' + k, value = compute_rolling_window(df_data[k].to_list(), 4))                   
-                    df_data.drop(k, axis = 1)
-                    i+=1
-            return dict_values_to_list_values_in_dict(df_data.to_dict()) 
+            frame = ColumnarFrame.from_dict(unpacked_data)
+            ttm_keys = self._ttm_keys(unpacked_data, keys)
+            if len(ttm_keys) > 0:
+                # Every integer column rolls in a single call.
+                ttm_values = rolling_window(np.column_stack([unpacked_data[k] for k in ttm_keys]), 4, min_periods= 1)
+                for i, k in enumerate(ttm_keys):
+                    frame.insert(i, 'TTM' + k, ttm_values[:, i])
+            return frame.to_dict()
+
+    @staticmethod
+    def _ttm_keys(unpacked_data: dict, keys: list = []) -> list:
+        # Keys rolled into a 'TTM' + key field: the ones holding integer values only.
+        return [k for k in keys if [type(element) for element in unpacked_data[k]] == [type(element) for element in range(len(unpacked_data[k]))]]
+
+    def _parse_aggregated_dict(self, collection: str, keys: list = [], timescale: str = 'YoY') -> dict:
+        """ Server side counterpart of _parse_to_timescaled_dict for YoY and TTM timescales. Data arrives already aggregated from
+        database and keeps the same layout as the in process implementation ('Year' + keys for YoY, 'TTM' + key fields followed by the
+        original keys for TTM). The database computes a trailing window for every key other than 'date'; as in process, only the ones
+        of integer keys are returned.
+
+        Args:
+            collection (str): database collection target.
+            keys (list): List of keys to be searched in collection. Defaults to [].
+            timescale (str): Frequency of returned data. Defaults to 'YoY'. Any of two values: YoY or TTM.
+
+        Returns:
+            dict: dictionary with keys equal to output key names and values equal to lists.
+        """
+        if timescale == 'YoY':
+            pipeline, output_keys = yoy_pipeline(keys), yoy_output_keys(keys)
+        elif timescale == 'TTM':
+            pipeline, output_keys = ttm_pipeline(keys), ttm_output_keys(keys)
+        else:
+            raise TypeError('Timescale specified is not contemplated. Please enter "YoY" or "TTM"')
+        record_source(collection)
+        packed_data = self._db_interface.aggregate(collection, pipeline)
+        unpacked_data = unpack_cursor_object_multiple(packed_data, output_keys)
+        if timescale == 'TTM':
+            ttm_keys = ['TTM' + k for k in self._ttm_keys(unpacked_data, keys)]
+            unpacked_data = {k: v for k, v in unpacked_data.items() if k in keys or k in ttm_keys}
+        return unpacked_data
 
     def _add_ratio_metric_to_dict(self, keys: list = [], input_dict: dict = {}) -> dict:
         """ A method that divides a list over another list and append the results in a newly created key to the input dict.
@@ -291,6 +502,26 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         """
         adj_ebitda_dict = self._parse_to_timescaled_dict(collection[0], [keys[0], keys[2]], timescale)
         total_revenues_dict = self.get_total_assets(collection[1], [keys[1], keys[2]], timescale)
+        return self._combine_adj_ebitda_margin(adj_ebitda_dict, total_revenues_dict, keys, timescale)
+
+    async def aget_adj_ebitda_margin(self, collection: str, keys: list = [], timescale: str = 'QoQ') -> dict:
+        """ Coroutine version of get_adj_ebitda_margin. Both collections are fetched concurrently.
+
+        Args:
+            collection (str): database collection target.
+            keys (list): A list of keys to be searched in database in order to retrieve adjusted EBITDA margin margin. Defaults to [].
+            timescale (str): flag determining timescale frequency. Defaults to 'QoQ'.
+
+        Returns:
+            dict: dict containing input keys with corresponding values for adjusted EBITDA margin margin.
+        """
+        adj_ebitda_dict, total_revenues_dict = await asyncio.gather(
+            self._aparse_to_timescaled_dict(collection[0], [keys[0], keys[2]], timescale),
+            self._aparse_to_timescaled_dict(collection[1], [keys[1], keys[2]], timescale))
+        total_revenues_dict = self._scale_total_assets(total_revenues_dict, timescale)
+        return self._combine_adj_ebitda_margin(adj_ebitda_dict, total_revenues_dict, keys, timescale)
+
+    def _combine_adj_ebitda_margin(self, adj_ebitda_dict: dict, total_revenues_dict: dict, keys: list = [], timescale: str = 'QoQ') -> dict:
         if timescale == 'YoY':
             adj_ebitda_dict.pop('Year')
             adj_ebitda_margin_dict = adj_ebitda_dict | total_revenues_dict
@@ -399,9 +630,11 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         """
         #growth_ratio_dict = self._parse_to_timescaled_dict(collection, keys, timescale)
         growth_ratio_dict = data
-        growth_ratio_df = pd.DataFrame.from_dict(growth_ratio_dict)
-        growth_ratio_df['GrowthRatio'] = (growth_ratio_df[keys[0]] - growth_ratio_df[keys[0]].shift(-1)) / np.abs(growth_ratio_df[keys[0]].shift(-1)) * 100
-        return dict_values_to_list_values_in_dict(growth_ratio_df.to_dict()) 
+        growth_ratio_frame = ColumnarFrame.from_dict(growth_ratio_dict)
+        previous = growth_ratio_frame.shift(keys[0])
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            growth_ratio_frame['GrowthRatio'] = (growth_ratio_frame[keys[0]] - previous) / np.abs(previous) * 100
+        return growth_ratio_frame.to_dict()
 
     def get_revenue_growth(self, collection: str, keys: list = [], timescale: str = 'QoQ') -> dict:
         """ Wrapper method for getting revenue growth QoQ or YoY.
@@ -512,6 +745,10 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
             dict: dict containing input keys with corresponding values for total assets.
         """
         total_assets_dict = self._parse_to_timescaled_dict(collection, keys, timescale)
+        return self._scale_total_assets(total_assets_dict, timescale)
+
+    def _scale_total_assets(self, total_assets_dict: dict, timescale: str = 'YoY') -> dict:
+        # Balance sheet values are stocks, not flows: the yearly sum is averaged over its 4 quarters.
         keys = get_list(total_assets_dict)
         if timescale == 'YoY':
             total_assets_dict[keys[0]] = [value / 4 for value in total_assets_dict[keys[0]]]
@@ -529,6 +766,25 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         """
         net_income_dict = self._parse_to_timescaled_dict(collection[0], [keys[0], keys[2]], timescale)
         total_assets_dict = self.get_total_assets(collection[1], [keys[1], keys[2]], timescale)
+        return self._combine_return_on_assets(net_income_dict, total_assets_dict, keys, timescale)
+
+    async def aget_return_on_assets(self, collection: list = [], keys: list = [], timescale: str = 'YoY') -> dict:
+        """ Coroutine version of get_return_on_assets. Both collections are fetched concurrently.
+
+        Args:
+            collection (_type_): database collection target.
+            keys (list): A list of keys to be searched in database to calculate return on assets ratio. Defaults to [].
+
+        Returns:
+            dict: dict containing input keys with corresponding values and extended key relating to return on assets ratio values over time.
+        """
+        net_income_dict, total_assets_dict = await asyncio.gather(
+            self._aparse_to_timescaled_dict(collection[0], [keys[0], keys[2]], timescale),
+            self._aparse_to_timescaled_dict(collection[1], [keys[1], keys[2]], timescale))
+        total_assets_dict = self._scale_total_assets(total_assets_dict, timescale)
+        return self._combine_return_on_assets(net_income_dict, total_assets_dict, keys, timescale)
+
+    def _combine_return_on_assets(self, net_income_dict: dict, total_assets_dict: dict, keys: list = [], timescale: str = 'YoY') -> dict:
         if timescale == 'YoY':
             net_income_dict.pop('Year')
             return_on_assets_dict = net_income_dict | total_assets_dict
@@ -556,6 +812,24 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         """
         net_income_dict = self._parse_to_timescaled_dict(collection[0], [keys[0], keys[2]], timescale)
         total_stockholders_dict = self._parse_to_timescaled_dict(collection[1], [keys[1], keys[2]], timescale)
+        return self._combine_return_on_equity(net_income_dict, total_stockholders_dict, keys, timescale)
+
+    async def aget_return_on_equity(self, collection: list = [], keys: list = [], timescale: str = 'YoY') -> dict:
+        """ Coroutine version of get_return_on_equity. Both collections are fetched concurrently.
+
+        Args:
+            collection (_type_): database collection target.
+            keys (list): A list of keys to be searched in database to calculate return on equity ratio. Defaults to [].
+
+        Returns:
+            dict: dict containing input keys with corresponding values and extended key relating to return on equity ratio values over time.
+        """
+        net_income_dict, total_stockholders_dict = await asyncio.gather(
+            self._aparse_to_timescaled_dict(collection[0], [keys[0], keys[2]], timescale),
+            self._aparse_to_timescaled_dict(collection[1], [keys[1], keys[2]], timescale))
+        return self._combine_return_on_equity(net_income_dict, total_stockholders_dict, keys, timescale)
+
+    def _combine_return_on_equity(self, net_income_dict: dict, total_stockholders_dict: dict, keys: list = [], timescale: str = 'YoY') -> dict:
         if timescale == 'YoY':
             net_income_dict.pop('Year')
             total_stockholders_dict[keys[1]] = [value / 4 for value in total_stockholders_dict[keys[1]]]
@@ -620,6 +894,78 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def _compute_wacc(self, balance_dict: dict, operations_dict: dict, keys: list = [], timescale: str = 'YoY', share_price: float = None,
+                      risk_free_rate: float = RISK_FREE_RATE, beta: float = 1.0, equity_risk_premium: float = EQUITY_RISK_PREMIUM) -> dict:
+        """ WACC per period from quarterly balance sheet and statement of operations data (see pipeline.valuation).
+
+        Args:
+            balance_dict (dict): current debt, non current debt, book equity, cash and date (keys[:4] + ['date']).
+            operations_dict (dict): interest expense, income before taxes, tax provision, diluted shares and date (keys[4:]).
+            keys (list): field names in the order above. Defaults to [].
+            timescale (str, optional): 'QoQ' (quarter end balances), 'TTM' (4 quarter average balances) or 'YoY'. Interest and taxes
+                are annualized from the trailing 4 quarters (QoQ, TTM) or summed per year (YoY). Defaults to 'YoY'.
+            share_price (float, optional): market price per share. Defaults to None (book value of equity).
+            risk_free_rate (float, optional): Defaults to RISK_FREE_RATE.
+            beta (float, optional): Defaults to 1.0.
+            equity_risk_premium (float, optional): Defaults to EQUITY_RISK_PREMIUM.
+
+        Returns:
+            dict: WACC, CostOfEquity, CostOfDebt, TaxRate, Equity, Debt, NetDebt, InterestExpense, IncomeBeforeIncomeTaxes,
+                ProvisionForIncomeTaxes and date or Year.
+        """
+        balance, operations = ColumnarFrame.from_dict(balance_dict), ColumnarFrame.from_dict(operations_dict)
+        positions = operations.index.align(balance.index)
+        def aligned(key):
+            return np.where(positions >= 0, np.asarray(operations[key], dtype= float)[positions], np.nan)
+        # Stocks (balance sheet and share count) and flows (statement of operations) per quarter.
+        debt = balance[keys[0]] + balance[keys[1]]
+        stocks = {'Equity': balance[keys[2]] if share_price is None else share_price * aligned(keys[7]), 'Debt': debt, 'NetDebt': debt - balance[keys[3]]}
+        flows = {'InterestExpense': aligned(keys[4]), 'IncomeBeforeIncomeTaxes': aligned(keys[5]), 'ProvisionForIncomeTaxes': aligned(keys[6])}
+        if timescale == 'YoY':
+            wacc_frame = ColumnarFrame({**stocks, **flows, 'Year': balance.index.years}).group_sum('Year')
+            for k in stocks:
+                wacc_frame[k] = wacc_frame[k] / 4
+            wacc_frame = ColumnarFrame({k: wacc_frame[k] for k in list(stocks) + list(flows) + ['Year']})
+        elif timescale in ['QoQ', 'TTM']:
+            wacc_frame = ColumnarFrame({k: rolling_window(v, 4, min_periods= 1) if timescale == 'TTM' else v for k, v in stocks.items()})
+            for k, v in flows.items():
+                wacc_frame[k] = rolling_window(v, 4, min_periods= 1) * 4
+            wacc_frame['date'] = balance['date']
+        else:
+            raise TypeError('Timescale specified is not contemplated. Please enter "QoQ", "TTM" or "YoY"')
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            # Interest expense is reported as a negative value.
+            debt_cost = np.maximum(-wacc_frame['InterestExpense'] / wacc_frame['Debt'], 0)
+            tax_rate = np.clip(wacc_frame['ProvisionForIncomeTaxes'] / wacc_frame['IncomeBeforeIncomeTaxes'], 0, 1)
+        equity_cost = np.broadcast_to(cost_of_equity(risk_free_rate, beta, equity_risk_premium), debt_cost.shape)
+        wacc_frame.insert(0, 'WACC', wacc(wacc_frame['Equity'], wacc_frame['Debt'], equity_cost, debt_cost, tax_rate))
+        wacc_frame.insert(1, 'CostOfEquity', equity_cost)
+        wacc_frame.insert(2, 'CostOfDebt', debt_cost)
+        wacc_frame.insert(3, 'TaxRate', tax_rate)
+        return wacc_frame.to_dict()
+
+
+    async def aget_metric(self, getter: str, *args, **kwargs) -> dict:
+        """ Coroutine that runs any synchronous getter (e.g. 'get_revenue') in the async interface thread pool.
+
+        Args:
+            getter (str): name of getter method.
+
+        Returns:
+            dict: value returned by getter.
+        """
+        return await self.async_interface.run(getattr(self, getter), *args, **kwargs)
+
+    async def aget_metrics(self, requests: list) -> list:
+        """ Coroutine that evaluates several getters concurrently.
+
+        Args:
+            requests (list): list of (getter name, kwargs dict) tuples, e.g. [('get_revenue', {'timescale': 'TTM'})].
+
+        Returns:
+            list: getter results in the same order as requests.
+        """
+        return list(await asyncio.gather(*[self.aget_metric(getter, **kwargs) for getter, kwargs in requests]))
 
     # EQUITY STRUCTURE: investors, outstanding shares
     def get_investor_table(self, collection: str, keys: list = []) -> dict:
@@ -628,12 +974,13 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
     def get_investor_classification(self, list_investors: list = []) -> dict:
         pass
 
-    def get_outstanding_shares(self, collection: str, keys: list = []) -> dict:
+    def get_outstanding_shares(self, collection: str, keys: list = [], last_n: int = None) -> dict:
         """ Get basic or diluted outstanding shares.
 
         Args:
             collection (_type_): database collection target.
             keys (list): A list of keys to be searched in database to retrieve outstanding shares. Defaults to [].
+            last_n (int, optional): most recent quarters only, e.g. 1 for the latest share count. Defaults to None (every quarter).
 
         Raises:
             NotImplementedError
@@ -641,7 +988,7 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         Returns:
             dict: dict containing input keys with corresponding share values.
         """
-        return self._parse_to_timescaled_dict(collection, keys)
+        return self._parse_to_timescaled_dict(collection, keys, last_n= last_n)
 
     # PRICE FORECAST: 4qtr fcf roic rate, 4qtr invested capital rate, project fcf
     # TODO: abstract method to compute derivative: _get_rate_of_change(self, input_dict (two columns: metric and date), keys:list = ['Rate', 'TTMRate'])
@@ -654,12 +1001,16 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         Returns:
             dict: dictionary with keys equal: RateTTM, FcFRoic, Date, Rate
         """
-        fcf_roic_dict = self.get_fcf_roic(timescale = timescale) # fcf roic QoQ and date
-        fcf_roic_df = pd.DataFrame.from_dict(fcf_roic_dict) # dataframe columns: fcfroic, date
-        keys = get_list(fcf_roic_dict)
-        fcf_roic_df['Rate'] = (fcf_roic_df[keys[1]] - fcf_roic_df[keys[1]].shift(-1)) / fcf_roic_df[keys[1]].shift(-1) * 100 # df columns: fcfroic, date, rate
-        fcf_roic_df.insert(loc = 0, column= 'RateTTM', value = compute_rolling_window(fcf_roic_df['Rate'].to_list(), 4)) # df columns: ratettm, fcfroic, date, rate
-        return dict_values_to_list_values_in_dict(fcf_roic_df.to_dict())
+        return self._compute_rate_fcf_roic(self.get_fcf_roic(timescale = timescale)) # fcf roic QoQ and date
+
+    def _compute_rate_fcf_roic(self, fcf_roic_dict: dict) -> dict:
+        fcf_roic_frame = ColumnarFrame.from_dict(fcf_roic_dict) # frame columns: fcfroic, date
+        # Rate of change of the FcF / invested capital ratio itself, whatever the position of its column.
+        key = 'RatioFcF/InvestedCapital'
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            fcf_roic_frame['Rate'] = (fcf_roic_frame[key] - fcf_roic_frame.shift(key)) / fcf_roic_frame.shift(key) * 100 # frame columns: fcfroic, date, rate
+        fcf_roic_frame.insert(0, 'RateTTM', rolling_window(fcf_roic_frame['Rate'], 4, min_periods= 1)) # frame columns: ratettm, fcfroic, date, rate
+        return fcf_roic_frame.to_dict()
     
     def _get_rate_invested_capital(self, timescale: str = 'QoQ') -> dict:
         """ Calculate invested capital rate of change in a trailing twelve month basis.
@@ -670,55 +1021,116 @@ class CompanyFinancials(metaclass=abc.ABCMeta):
         Returns:
             dict: dictionary with keys equal: RateTTM, CapitalInvested, Date, Rate
         """
-        invested_capital_dict = self.get_invested_capital(timescale = timescale) # investedCapital QoQ and date
-        invested_capital_df = pd.DataFrame.from_dict(invested_capital_dict) # dataframe columns: investedCapital, date
+        return self._compute_rate_invested_capital(self.get_invested_capital(timescale = timescale)) # investedCapital QoQ and date
+
+    def _compute_rate_invested_capital(self, invested_capital_dict: dict) -> dict:
+        invested_capital_frame = ColumnarFrame.from_dict(invested_capital_dict) # frame columns: investedCapital, date
         keys = get_list(invested_capital_dict)
-        invested_capital_df['Rate'] = (invested_capital_df[keys[0]] - invested_capital_df[keys[0]].shift(-1)) / invested_capital_df[keys[0]].shift(-1) * 100 # df columns: investedCapital, date, rate
-        invested_capital_df.insert(loc = 0, column= 'RateTTM', value = compute_rolling_window(invested_capital_df['Rate'].to_list(), 4)) # df columns: ratettm, investedCapital, date, rate
-        return dict_values_to_list_values_in_dict(invested_capital_df.to_dict())
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            invested_capital_frame['Rate'] = (invested_capital_frame[keys[0]] - invested_capital_frame.shift(keys[0])) / invested_capital_frame.shift(keys[0]) * 100 # frame columns: investedCapital, date, rate
+        invested_capital_frame.insert(0, 'RateTTM', rolling_window(invested_capital_frame['Rate'], 4, min_periods= 1)) # frame columns: ratettm, investedCapital, date, rate
+        return invested_capital_frame.to_dict()
     
-    def projected_fcf(self, timescale: str = 'QoQ') -> dict:
-        # TODO: Create method that automates creation of sequence of quarters: get_sequence_of_quarter(start_quarter, start_year, number_of_years)
+    def projected_fcf(self, timescale: str = 'QoQ', n_paths: int = 0, seed: int = 0, workers: int = 1) -> dict:
         """_summary_
 
         Args:
-            keys (list, optional): _description_. Defaults to [].
+            timescale (str, optional): Frequency of rates of change. Defaults to 'QoQ'.
+            n_paths (int, optional): Monte Carlo paths. 0 returns the deterministic projection only. Defaults to 0.
+            seed (int, optional): random seed of Monte Carlo paths. Defaults to 0.
+            workers (int, optional): processes for Monte Carlo paths, 0 for one per cpu. Defaults to 1.
 
         Returns:
-            dict: _description_
+            dict: FcFProjected and Quarter, plus FcFP5, FcFP50 and FcFP95 bands for Monte Carlo projections.
         """
-        # Local variables
-        # Create vector of future/projected quarters. Next 40 quarters (10 yrs of projected cash flows).
-        array_proj_qoq = ['4Q22', '1Q23', '2Q23', '3Q23', '4Q23', '1Q24', '2Q24', '3Q24', '4Q24', '1Q25', '2Q25', '3Q25', '4Q25', '1Q26', '2Q26', '3Q26', 
-                            '4Q26', '1Q27', '2Q27', '3Q27', '4Q27', '1Q28','2Q28', '3Q28', '4Q28', '1Q29', '2Q29', '3Q29', '4Q29', '1Q30', '2Q30',
-                            '3Q30', '4Q30', '1Q31', '2Q31', '3Q31', '4Q31', '1Q32', '2Q32', '3Q32', '4Q32']
-
         # Get FcF ROIC rate of change in a TTM basis and starting 4qtr average FcF ROIC (last 4 quarters of public financial data)
         fcf_dict = self._get_rate_fcf_roic(timescale = timescale) 
-        keys = get_list(fcf_dict)
-        fcf_roic_rate_ttm, fcf_roic_start = average_of_dict_keys_n_values(fcf_dict, [keys[0], keys[2]], [1, 4]) 
+        published_quarters = fcf_dict['date'] if 'date' in fcf_dict else self.get_fcf(timescale = 'QoQ')['date']
         # Get Invested capital rate of change in a TTM basis and starting 4qtr average Invested Capital (last 4 quarters of public financial data)
         invested_capital_dict = self._get_rate_invested_capital(timescale = timescale)
-        keys = get_list(invested_capital_dict)
-        invested_capital_rate_ttm, invested_capital_start = average_of_dict_keys_n_values(invested_capital_dict, [keys[0], keys[1]], [1, 4])
-        # Calculate projected FcF per quarter
-        fcf_projected_qoq = []
-        for i in range(len(array_proj_qoq)):
-            fcf_i = (invested_capital_start * (1 + invested_capital_rate_ttm/100)**i) * min((fcf_roic_start * (1 + fcf_roic_rate_ttm/100)**i), 0.4)
-            fcf_projected_qoq.append(fcf_i)
+        if n_paths > 0:
+            return self._compute_projected_fcf_bands(fcf_dict, invested_capital_dict, published_quarters, n_paths, seed, workers)
+        return self._compute_projected_fcf(fcf_dict, invested_capital_dict, published_quarters)
+
+    def _compute_projected_fcf(self, fcf_dict: dict, invested_capital_dict: dict, published_quarters: list) -> dict:
+        # Create vector of future/projected quarters: quarter after last published one plus next 40 quarters (10 yrs of projected cash flows).
+        array_proj_qoq = QuarterIndex.from_labels(published_quarters).next(41).labels()
+        fcf_roic_rate_ttm, fcf_roic_start, invested_capital_rate_ttm, invested_capital_start = self._projection_seeds(fcf_dict, invested_capital_dict)
+        # Calculate projected FcF per quarter: single scenario of the sensitivity grid.
+        fcf_projected_qoq = project_fcf_grid(invested_capital_start, [invested_capital_rate_ttm], fcf_roic_start, fcf_roic_rate_ttm, [FCF_ROIC_CAP], len(array_proj_qoq))[0, 0].tolist()
         
         # Cast list of projected cash flow to dict and return
         dict_fcf_project = {'FcFProjected': fcf_projected_qoq, 'Quarter': array_proj_qoq}
         return dict_fcf_project
 
+    def _projection_seeds(self, fcf_dict: dict, invested_capital_dict: dict) -> tuple:
+        # Latest TTM rate and 4qtr starting average of FcF ROIC (the FcF / invested capital ratio) and invested capital.
+        fcf_roic_rate_ttm, fcf_roic_start = average_of_dict_keys_n_values(fcf_dict, ['RateTTM', 'RatioFcF/InvestedCapital'], [1, 4])
+        keys = get_list(invested_capital_dict)
+        invested_capital_rate_ttm, invested_capital_start = average_of_dict_keys_n_values(invested_capital_dict, [keys[0], keys[1]], [1, 4])
+        return fcf_roic_rate_ttm, fcf_roic_start, invested_capital_rate_ttm, invested_capital_start
+
+    def price_target_grid(self, shares: list, fcf_roic_caps: list = FCF_ROIC_CAPS, invested_capital_rates: list = INVESTED_CAPITAL_RATES,
+                          multiples: list = MULTIPLES, year: int = 2030, timescale: str = 'QoQ') -> dict:
+        """ Price target of every scenario of a sensitivity grid, computed in one broadcast (see pipeline.sensitivity). Scenarios
+        replace the latest invested capital rate and the FcF ROIC cap of projected_fcf; yearly projected FcF times a multiple,
+        divided by a share count, gives the price per share.
+
+        Args:
+            shares (list): share counts (millions).
+            fcf_roic_caps (list, optional): Defaults to FCF_ROIC_CAPS.
+            invested_capital_rates (list, optional): invested capital growth in % per period. Defaults to INVESTED_CAPITAL_RATES.
+            multiples (list, optional): price to FcF multiples. Defaults to MULTIPLES.
+            year (int, optional): target year. Defaults to 2030.
+            timescale (str, optional): Frequency of rates of change. Defaults to 'QoQ'.
+
+        Returns:
+            dict: scenario axes (InvestedCapitalRate, FcFRoicCap, Multiple, Shares), Year and PriceTarget, a nested list indexed in the
+                same axis order.
+        """
+        fcf_dict = self._get_rate_fcf_roic(timescale = timescale)
+        published_quarters = fcf_dict['date'] if 'date' in fcf_dict else self.get_fcf(timescale = 'QoQ')['date']
+        invested_capital_dict = self._get_rate_invested_capital(timescale = timescale)
+        return self._compute_price_target_grid(fcf_dict, invested_capital_dict, published_quarters, shares, fcf_roic_caps, invested_capital_rates, multiples, year)
+
+    def _compute_price_target_grid(self, fcf_dict: dict, invested_capital_dict: dict, published_quarters: list, shares: list, fcf_roic_caps: list,
+                                   invested_capital_rates: list, multiples: list, year: int) -> dict:
+        array_proj_qoq = QuarterIndex.from_labels(published_quarters).next(41).labels()
+        fcf_roic_rate_ttm, fcf_roic_start, _, invested_capital_start = self._projection_seeds(fcf_dict, invested_capital_dict)
+        fcf_grid = project_fcf_grid(invested_capital_start, invested_capital_rates, fcf_roic_start, fcf_roic_rate_ttm, fcf_roic_caps, len(array_proj_qoq))
+        price_target = price_target_surface(fcf_grid, array_proj_qoq, year, multiples, shares)
+        return {'InvestedCapitalRate': list(invested_capital_rates), 'FcFRoicCap': list(fcf_roic_caps), 'Multiple': list(multiples), 'Shares': list(shares),
+                'Year': year, 'PriceTarget': price_target.tolist()}
+
+    def _compute_dcf_value(self, fcf: list, wacc_rate: float, net_debt: float, shares: float, discount_rates: list = None,
+                           terminal_growth_rates: list = TERMINAL_GROWTH_RATES) -> dict:
+        # Discounted projected FcF for every discount rate and terminal growth rate at once (see pipeline.valuation). Discount rates
+        # default to WACC plus DISCOUNT_RATE_SPREADS.
+        if discount_rates is None:
+            discount_rates = [wacc_rate + spread for spread in DISCOUNT_RATE_SPREADS]
+        enterprise_value = discounted_value(fcf, discount_rates, terminal_growth_rates)
+        return {'DiscountRate': list(discount_rates), 'TerminalGrowthRate': list(terminal_growth_rates), 'EnterpriseValue': enterprise_value.tolist(),
+                'ValuePerShare': value_per_share(enterprise_value, net_debt, shares).tolist(), 'WACC': wacc_rate, 'NetDebt': net_debt, 'Shares': shares}
+
+    def _compute_projected_fcf_bands(self, fcf_dict: dict, invested_capital_dict: dict, published_quarters: list, n_paths: int = 10000, seed: int = 0,
+                                     workers: int = 1, history: int = 8) -> dict:
+        # Monte Carlo counterpart of _compute_projected_fcf: quarterly growth rates are drawn from the last history TTM rates of
+        # change. Paths start from the same seeds as the deterministic projection.
+        dict_fcf_project = self._compute_projected_fcf(fcf_dict, invested_capital_dict, published_quarters)
+        _, fcf_roic_start, _, invested_capital_start = self._projection_seeds(fcf_dict, invested_capital_dict)
+        bands = simulate_fcf_percentiles(invested_capital_start, invested_capital_dict['RateTTM'][:history], fcf_roic_start, fcf_dict['RateTTM'][:history],
+                                         n_quarters= len(dict_fcf_project['Quarter']), n_paths= n_paths, seed= seed, percentiles= [5, 50, 95], workers= workers)
+        return {'FcFProjected': dict_fcf_project['FcFProjected'], 'FcFP5': bands[0].tolist(), 'FcFP50': bands[1].tolist(), 'FcFP95': bands[2].tolist(),
+                'Quarter': dict_fcf_project['Quarter']}
+
 
 
 
 class TeslaFinancials(CompanyFinancials):
     
 
-    def __init__(self, name = 'Tesla', host = "mongodb://localhost:27017", database = "tesla_db"):     
-        return super().__init__(name, host, database)
+    def __init__(self, name = 'Tesla', host = os.environ.get('TESLA_DB_HOST', "mongodb://localhost:27017"), database = "tesla_db", server_side_aggregation = False, data_interface = None, memoize = True):     
+        return super().__init__(name, host, database, server_side_aggregation, data_interface, memoize)
 
     # TODO: implement abstract methods:
     # Debt to assets ratio (ST debt & LT debt), debt to equity ratio (ST debt & LT debt), WACC
@@ -742,13 +1154,19 @@ class TeslaFinancials(CompanyFinancials):
     
     def get_fcf(self, collection = 'cash_flow', keys: list = ['NetCashOperatingActivities', 'Capex', 'date'], timescale: str = 'QoQ') -> dict:
         fcf_dict= self._parse_to_timescaled_dict(collection, keys, timescale)
+        return self._compute_fcf(fcf_dict, timescale)
+
+    async def aget_fcf(self, collection = 'cash_flow', keys: list = ['NetCashOperatingActivities', 'Capex', 'date'], timescale: str = 'QoQ') -> dict:
+        return self._compute_fcf(await self._aparse_to_timescaled_dict(collection, keys, timescale), timescale)
+
+    def _compute_fcf(self, fcf_dict: dict, timescale: str = 'QoQ') -> dict:
         keys = get_list(fcf_dict)
-        fcf_df = pd.DataFrame.from_dict(fcf_dict)
+        fcf_frame = ColumnarFrame.from_dict(fcf_dict)
         if timescale == 'QoQ' or 'YoY':
-            fcf_df.insert(loc = 0, column= 'FcF', value = fcf_df[keys[0]] + fcf_df[keys[1]])
+            fcf_frame.insert(0, 'FcF', fcf_frame[keys[0]] + fcf_frame[keys[1]])
         if timescale == 'TTM':
-            fcf_df.insert(loc = 0, column= 'TTMFcF', value = fcf_df[keys[0]] + fcf_df[keys[1]])        
-        return dict_values_to_list_values_in_dict(fcf_df.to_dict())
+            fcf_frame.insert(0, 'TTMFcF', fcf_frame[keys[0]] + fcf_frame[keys[1]])
+        return fcf_frame.to_dict()
     
     def get_gross_profit_margin(self, collection = 'statement_operations', keys: list = ['GrossProfit', 'TotalRevenues', 'date'], timescale: str = 'QoQ') -> dict:
         return super().get_gross_profit_margin(collection, keys, timescale)
@@ -761,6 +1179,9 @@ class TeslaFinancials(CompanyFinancials):
     
     def get_adj_ebitda_margin(self, collection = ['gaap_non_gaap', 'statement_operations'], keys: list = ['AdjustedEBITDA', 'TotalRevenues', 'date'], timescale: str = 'QoQ') -> dict:
         return super().get_adj_ebitda_margin(collection, keys, timescale)
+
+    async def aget_adj_ebitda_margin(self, collection = ['gaap_non_gaap', 'statement_operations'], keys: list = ['AdjustedEBITDA', 'TotalRevenues', 'date'], timescale: str = 'QoQ') -> dict:
+        return await super().aget_adj_ebitda_margin(collection, keys, timescale)
         
 
     # LIQUIDITY & SOLVENCY
@@ -770,13 +1191,12 @@ class TeslaFinancials(CompanyFinancials):
     def get_quick_ratio(self, collection = 'balance_sheet', keys: list = ['TotalCurrentAssets', 'Inventory', 'TotalCurrentLiabilities', 'date']) -> dict:
         # Get dictionary with key-pair values from database
         quick_ratio_dict= self._parse_to_timescaled_dict(collection, keys)
-        # Cast dict to dataframe and compute quick ratio in new column
-        quick_ratio_df = pd.DataFrame.from_dict(quick_ratio_dict)
-        quick_ratio_df.insert(loc = 0, column= 'QuickRatio', value= (quick_ratio_df[keys[0]] - quick_ratio_df[keys[1]]) / quick_ratio_df[keys[2]])
-        # Drop TotalCurrentAssets, Inventory and TotalCurrentLiabiliites from dataframe
-        quick_ratio_df.drop([keys[0], keys[1], keys[2]], axis = 1)
-        # Convert back to dictionary and return.        
-        return dict_values_to_list_values_in_dict(quick_ratio_df.to_dict())
+        # Cast dict to columnar frame and compute quick ratio in new column
+        quick_ratio_frame = ColumnarFrame.from_dict(quick_ratio_dict)
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            quick_ratio_frame.insert(0, 'QuickRatio', (quick_ratio_frame[keys[0]] - quick_ratio_frame[keys[1]]) / quick_ratio_frame[keys[2]])
+        # Convert back to dictionary and return. TotalCurrentAssets, Inventory and TotalCurrentLiabiliites are kept.
+        return quick_ratio_frame.to_dict()
     
     # TODO: override method.
     def get_debt_to_assets_ratio(self, collection = 'balance_sheet', keys: list = []) -> dict:
@@ -813,6 +1233,12 @@ class TeslaFinancials(CompanyFinancials):
     # PERFORMANCE METRICS
     def get_invested_capital(self, collection = 'balance_sheet', keys: list = ['TotalAssets', 'AccountsPayable', 'AccruedLiabilitiesAndOther', 'CashAndCashEquivalents', 'TotalCurrentAssets', 'TotalCurrentLiabilities', 'date'], timescale: str = 'YoY') -> dict:
         invested_capital_dict = self._parse_to_timescaled_dict(collection, keys, timescale)
+        return self._compute_invested_capital(invested_capital_dict, timescale)
+
+    async def aget_invested_capital(self, collection = 'balance_sheet', keys: list = ['TotalAssets', 'AccountsPayable', 'AccruedLiabilitiesAndOther', 'CashAndCashEquivalents', 'TotalCurrentAssets', 'TotalCurrentLiabilities', 'date'], timescale: str = 'YoY') -> dict:
+        return self._compute_invested_capital(await self._aparse_to_timescaled_dict(collection, keys, timescale), timescale)
+
+    def _compute_invested_capital(self, invested_capital_dict: dict, timescale: str = 'YoY') -> dict:
         keys = get_list(invested_capital_dict)
         if timescale == 'YoY':
             invested_capital_dict['TotalAssets'] = [value / 4 for value in invested_capital_dict['TotalAssets']]
@@ -821,34 +1247,48 @@ class TeslaFinancials(CompanyFinancials):
             invested_capital_dict['CashAndCashEquivalents'] = [value / 4 for value in invested_capital_dict['CashAndCashEquivalents']]
             invested_capital_dict['TotalCurrentAssets'] = [value / 4 for value in invested_capital_dict['TotalCurrentAssets']]
             invested_capital_dict['TotalCurrentLiabilities'] = [value / 4 for value in invested_capital_dict['TotalCurrentLiabilities']]
-        invested_capital_df = pd.DataFrame.from_dict(invested_capital_dict)
-        invested_capital_df.insert(loc= 0, column= 'InvestedCapital', value= invested_capital_df[keys[0]] - invested_capital_df[keys[1]] - invested_capital_df[keys[2]] - invested_capital_df[keys[3]] - [np.max([0, i]) for i in invested_capital_df[keys[5]] - invested_capital_df[keys[4]] + invested_capital_df[keys[3]]])
-        return dict_values_to_list_values_in_dict(invested_capital_df.to_dict())
+        invested_capital_frame = ColumnarFrame.from_dict(invested_capital_dict)
+        total_assets, payable, accrued, cash, current_assets, current_liabilities = [invested_capital_frame[k] for k in keys[:6]]
+        invested_capital_frame.insert(0, 'InvestedCapital', total_assets - payable - accrued - cash - np.maximum(0, current_liabilities - current_assets + cash))
+        return invested_capital_frame.to_dict()
     
     def get_total_assets(self, collection = 'balance_sheet', keys: list = ['TotalAssets', 'date'], timescale: str = 'YoY') -> dict:
         return super().get_total_assets(collection, keys, timescale)
     
     def get_return_on_assets(self, collection: list = ['statement_operations', 'balance_sheet'], keys: list = ['NetIncome', 'TotalAssets', 'date'], timescale: str = 'YoY') -> dict:
         return super().get_return_on_assets(collection, keys, timescale)
+
+    async def aget_return_on_assets(self, collection: list = ['statement_operations', 'balance_sheet'], keys: list = ['NetIncome', 'TotalAssets', 'date'], timescale: str = 'YoY') -> dict:
+        return await super().aget_return_on_assets(collection, keys, timescale)
     
     def get_return_on_equity(self, collection: list = ['statement_operations', 'balance_sheet'], keys: list = ['NetIncome', 'TotalStockholdersEquity', 'date'], timescale: str = 'YoY') -> dict:
         return super().get_return_on_equity(collection, keys, timescale)
+
+    async def aget_return_on_equity(self, collection: list = ['statement_operations', 'balance_sheet'], keys: list = ['NetIncome', 'TotalStockholdersEquity', 'date'], timescale: str = 'YoY') -> dict:
+        return await super().aget_return_on_equity(collection, keys, timescale)
     
     def get_fcf_roic(self, timescale = 'YoY') -> dict:
         # Get FcF and Invested capital dictionaries.
         fcf_dict = self.get_fcf(timescale = timescale)
         invested_capital_dict = self.get_invested_capital(timescale = timescale)
+        return self._combine_roic('FcF', fcf_dict, invested_capital_dict, timescale)
+
+    async def aget_fcf_roic(self, timescale = 'YoY') -> dict:
+        # Cash flow and balance sheet are fetched concurrently.
+        fcf_dict, invested_capital_dict = await asyncio.gather(self.aget_fcf(timescale = timescale), self.aget_invested_capital(timescale = timescale))
+        return self._combine_roic('FcF', fcf_dict, invested_capital_dict, timescale)
+
+    def _combine_roic(self, numerator: str, numerator_dict: dict, invested_capital_dict: dict, timescale: str = 'YoY') -> dict:
         #Join into single ROIC dict.
         if timescale == 'YoY':
-            fcf_dict.pop('Year')
+            numerator_dict.pop('Year')
         elif timescale == 'TTM' or 'QoQ':
-            fcf_dict.pop('date')
+            numerator_dict.pop('date')
         else:
             raise TypeError('Timescale specified is not contemplated. Please enter "YoY" or "TTM"')
-        fcf_invested_capital_dict = fcf_dict | invested_capital_dict
-        # Create Ratio (FcF/InvestedCapital) key and return.
-        roic_dict = self._add_ratio_metric_to_dict(['FcF', 'InvestedCapital'], fcf_invested_capital_dict)
-        return roic_dict
+        roic_dict = numerator_dict | invested_capital_dict
+        # Create Ratio (numerator/InvestedCapital) key and return.
+        return self._add_ratio_metric_to_dict([numerator, 'InvestedCapital'], roic_dict)
     
     def _get_nopat(self, collection = 'statement_operations', keys: list = ['IncomeFromOperations', 'IncomeBeforeIncomeTaxes', 'ProvisionForIncomeTaxes', 'date'], timescale: str = 'YoY') -> dict:
         """ Private getter method for NOPAT dictionary.
@@ -862,37 +1302,129 @@ class TeslaFinancials(CompanyFinancials):
             dict: _description_
         """
         nopact_dict = self._parse_to_timescaled_dict(collection, keys, timescale)
-        nopat_df = pd.DataFrame.from_dict(nopact_dict)
-        nopat_df.insert(loc = 0, column= 'NOPAT', value= nopat_df[keys[0]] * (1 - (nopat_df[keys[2]] / nopat_df[keys[1]])))
-        nopat_df.drop([keys[0], keys[1], keys[2]], axis= 1, inplace=True)
-        return dict_values_to_list_values_in_dict(nopat_df.to_dict())
+        return self._compute_nopat(nopact_dict, keys)
+
+    async def _aget_nopat(self, collection = 'statement_operations', keys: list = ['IncomeFromOperations', 'IncomeBeforeIncomeTaxes', 'ProvisionForIncomeTaxes', 'date'], timescale: str = 'YoY') -> dict:
+        return self._compute_nopat(await self._aparse_to_timescaled_dict(collection, keys, timescale), keys)
+
+    def _compute_nopat(self, nopact_dict: dict, keys: list = []) -> dict:
+        nopat_frame = ColumnarFrame.from_dict(nopact_dict)
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            nopat_frame.insert(0, 'NOPAT', nopat_frame[keys[0]] * (1 - (nopat_frame[keys[2]] / nopat_frame[keys[1]])))
+        return nopat_frame.drop([keys[0], keys[1], keys[2]]).to_dict()
 
     def get_nopat_roic(self, timescale: str = 'YoY') -> dict:
         nopat_dict = self._get_nopat(timescale = timescale) # NOPAT; date
         invested_capital_dict = self.get_invested_capital(timescale = timescale) # invested capital; date
-        #Join into single ROIC dict.
-        if timescale == 'YoY':
-            nopat_dict.pop('Year')
-        elif timescale == 'TTM' or 'QoQ':
-            nopat_dict.pop('date')
-        else:
-            raise TypeError('Timescale specified is not contemplated. Please enter "YoY" or "TTM"')
-        nopat_roic_dict = nopat_dict | invested_capital_dict
-        return self._add_ratio_metric_to_dict(['NOPAT', 'InvestedCapital'], nopat_roic_dict)
+        return self._combine_roic('NOPAT', nopat_dict, invested_capital_dict, timescale)
 
-    # TODO: override method.
-    def get_wacc(self, collection, keys: list = [], timescale: str = 'YoY') -> dict:
-        return super().get_wacc(collection, keys, timescale)
+    async def aget_nopat_roic(self, timescale: str = 'YoY') -> dict:
+        # Statement of operations and balance sheet are fetched concurrently.
+        nopat_dict, invested_capital_dict = await asyncio.gather(self._aget_nopat(timescale = timescale), self.aget_invested_capital(timescale = timescale))
+        return self._combine_roic('NOPAT', nopat_dict, invested_capital_dict, timescale)
+
+    def get_wacc(self, collection: list = ['balance_sheet', 'statement_operations'], keys: list = ['CurrentPortionOfDebtAndFinanceLeases', 'DebtAndFinanceLeasesNetOfCurrentPortion',
+                 'TotalStockholdersEquity', 'CashAndCashEquivalents', 'InterestExpense', 'IncomeBeforeIncomeTaxes', 'ProvisionForIncomeTaxes', 'WeightedAverageSharesDiluted', 'date'],
+                 timescale: str = 'YoY', share_price: float = None, risk_free_rate: float = RISK_FREE_RATE, beta: float = 2.0, equity_risk_premium: float = EQUITY_RISK_PREMIUM) -> dict:
+        balance_dict = self._parse_to_timescaled_dict(collection[0], keys[:4] + [keys[-1]])
+        operations_dict = self._parse_to_timescaled_dict(collection[1], keys[4:])
+        return self._compute_wacc(balance_dict, operations_dict, keys, timescale, share_price, risk_free_rate, beta, equity_risk_premium)
 
 
     # EQUITY STRUCTURE
-    def get_outstanding_shares(self, collection = 'statement_operations', keys: list = ['WeightedAverageSharesDiluted', 'WeightedAverageSharesBasic', 'date']) -> dict:
-        return super().get_outstanding_shares(collection, keys)
+    def get_outstanding_shares(self, collection = 'statement_operations', keys: list = ['WeightedAverageSharesDiluted', 'WeightedAverageSharesBasic', 'date'], last_n: int = None) -> dict:
+        return super().get_outstanding_shares(collection, keys, last_n)
 
     # PRICE FORECAST
-    def projected_fcf(self, timescale = 'QoQ') -> dict:
-        return super().projected_fcf(timescale)
+    def projected_fcf(self, timescale = 'QoQ', n_paths: int = 0, seed: int = 0, workers: int = 1) -> dict:
+        # Rates of FcF ROIC and invested capital share their cash flow and balance sheet fetches through the metric graph.
+        if n_paths == 0:
+            return self.evaluate_metrics([('projected_fcf', timescale)])[0]
+        fcf_dict, invested_capital_dict, published = self._projection_inputs(timescale)
+        return self._compute_projected_fcf_bands(fcf_dict, invested_capital_dict, published['date'], n_paths, seed, workers)
+
+    def price_target_grid(self, shares: list = None, fcf_roic_caps: list = FCF_ROIC_CAPS, invested_capital_rates: list = INVESTED_CAPITAL_RATES,
+                          multiples: list = MULTIPLES, year: int = 2030, timescale: str = 'QoQ') -> dict:
+        # Shares default to the latest weighted average diluted share count, the only quarter fetched.
+        shares = shares or [self.get_outstanding_shares(last_n= 1)['WeightedAverageSharesDiluted'][0]]
+        fcf_dict, invested_capital_dict, published = self._projection_inputs(timescale)
+        return self._compute_price_target_grid(fcf_dict, invested_capital_dict, published['date'], shares, fcf_roic_caps, invested_capital_rates, multiples, year)
+
+    def get_dcf_value(self, discount_rates: list = None, terminal_growth_rates: list = TERMINAL_GROWTH_RATES, invested_capital_rate: float = None,
+                      fcf_roic_cap: float = FCF_ROIC_CAP, timescale: str = 'QoQ', fcf_roic_rate: float = None, **market_inputs) -> dict:
+        """ DCF value per share of the projected FcF for a grid of discount rates and terminal growth rates.
+
+        Args:
+            discount_rates (list, optional): annual discount rates. Defaults to None (latest quarterly WACC plus DISCOUNT_RATE_SPREADS).
+            terminal_growth_rates (list, optional): annual growth after the projection. Defaults to TERMINAL_GROWTH_RATES.
+            invested_capital_rate (float, optional): invested capital growth in % per quarter. Defaults to None (latest TTM rate
+                bounded to the INVESTED_CAPITAL_RATES scenarios).
+            fcf_roic_cap (float, optional): Defaults to FCF_ROIC_CAP.
+            timescale (str, optional): Frequency of rates of change of the projection. Only 'QoQ' is contemplated: the projection is
+                discounted as 41 quarters. Defaults to 'QoQ'.
+            fcf_roic_rate (float, optional): FcF ROIC growth in % per quarter. Defaults to None (latest TTM rate, as projected_fcf).
+            market_inputs: share_price, risk_free_rate, beta and equity_risk_premium of get_wacc.
+
+        Raises:
+            TypeError: timescale other than 'QoQ'.
 
-tesla = TeslaFinancials()
-data = tesla._get_rate_invested_capital(timescale='QoQ')
-print(data)
\ No newline at end of file
+        Returns:
+            dict: DiscountRate, TerminalGrowthRate, EnterpriseValue and ValuePerShare (nested lists indexed by discount rate and
+                terminal growth rate), WACC, NetDebt and Shares.
+        """
+        if timescale != 'QoQ':
+            raise TypeError('Timescale specified is not contemplated. Please enter "QoQ"')
+        wacc_dict = self.get_wacc(timescale= 'QoQ', **market_inputs)
+        shares = self.get_outstanding_shares(last_n= 1)['WeightedAverageSharesDiluted'][0]
+        fcf_dict, invested_capital_dict, _ = self._projection_inputs(timescale)
+        fcf_roic_rate_ttm, fcf_roic_start, invested_capital_rate_ttm, invested_capital_start = self._projection_seeds(fcf_dict, invested_capital_dict)
+        if invested_capital_rate is None:
+            # The latest TTM rate compounded over 10 years is not a sensible scenario (e.g. 33% per quarter): keep it within the
+            # range of the sensitivity grid.
+            invested_capital_rate = float(np.clip(invested_capital_rate_ttm, min(INVESTED_CAPITAL_RATES), max(INVESTED_CAPITAL_RATES)))
+        fcf_roic_rate = fcf_roic_rate_ttm if fcf_roic_rate is None else fcf_roic_rate
+        # Same 41 quarter horizon as projected_fcf.
+        fcf = project_fcf_grid(invested_capital_start, [invested_capital_rate], fcf_roic_start, fcf_roic_rate, [fcf_roic_cap], 41)[0, 0]
+        return self._compute_dcf_value(fcf, wacc_dict['WACC'][0], wacc_dict['NetDebt'][0], shares, discount_rates, terminal_growth_rates)
+
+    def _projection_inputs(self, timescale: str = 'QoQ') -> list:
+        return self.evaluate_metrics([('rate_fcf_roic', timescale), ('rate_invested_capital', timescale), ('cash_flow', 'QoQ')])
+
+    # METRIC GRAPH
+    def _build_metric_graph(self) -> MetricGraph:
+        graph = super()._build_metric_graph()
+        # Sources: same fields (and order) as the default keys of the getters above.
+        graph.add_source('revenue', 'statement_operations', ['TotalRevenues', 'date'])
+        graph.add_source('gross_profit', 'statement_operations', ['GrossProfit', 'date'])
+        graph.add_source('income_ops', 'statement_operations', ['IncomeFromOperations', 'date'])
+        graph.add_source('net_income', 'statement_operations', ['NetIncome', 'date'])
+        graph.add_source('adj_ebitda', 'gaap_non_gaap', ['AdjustedEBITDA', 'date'])
+        graph.add_source('cash_flow', 'cash_flow', ['NetCashOperatingActivities', 'Capex', 'date'])
+        graph.add_source('nopat_items', 'statement_operations', ['IncomeFromOperations', 'IncomeBeforeIncomeTaxes', 'ProvisionForIncomeTaxes', 'date'])
+        graph.add_source('invested_capital_items', 'balance_sheet', ['TotalAssets', 'AccountsPayable', 'AccruedLiabilitiesAndOther', 'CashAndCashEquivalents', 'TotalCurrentAssets', 'TotalCurrentLiabilities', 'date'])
+        graph.add_source('total_assets_items', 'balance_sheet', ['TotalAssets', 'date'])
+        graph.add_source('stockholders_equity', 'balance_sheet', ['TotalStockholdersEquity', 'date'])
+        for margin in ['gross_profit', 'income_ops', 'net_income']:
+            metric_key = graph.node(margin).keys[0]
+            graph.add_source(margin + '_margin_items', 'statement_operations', [metric_key, 'TotalRevenues', 'date'])
+            graph.add_metric(margin + '_margin', lambda timescale, data: self._add_ratio_metric_to_dict(get_list(data), data), [margin + '_margin_items'])
+        for growth in ['revenue', 'gross_profit', 'income_ops', 'net_income', 'adj_ebitda']:
+            graph.add_metric(growth + '_growth', lambda timescale, data, keys= graph.node(growth).keys: self._get_growth_metric_dict(data, keys), [growth])
+        # Fundamentals and performance
+        graph.add_metric('fcf', lambda timescale, data: self._compute_fcf(data, timescale), ['cash_flow'])
+        graph.add_metric('fcf_growth', lambda timescale, data: self._get_growth_metric_dict(data, get_list(data)), ['fcf'])
+        graph.add_metric('scaled_revenue', lambda timescale, data: self._scale_total_assets(data, timescale), ['revenue'])
+        graph.add_metric('adj_ebitda_margin', lambda timescale, adj_ebitda, revenue: self._combine_adj_ebitda_margin(adj_ebitda, revenue, ['AdjustedEBITDA', 'TotalRevenues', 'date'], timescale), ['adj_ebitda', 'scaled_revenue'])
+        graph.add_metric('invested_capital', lambda timescale, data: self._compute_invested_capital(data, timescale), ['invested_capital_items'])
+        graph.add_metric('total_assets', lambda timescale, data: self._scale_total_assets(data, timescale), ['total_assets_items'])
+        graph.add_metric('return_on_assets', lambda timescale, net_income, total_assets: self._combine_return_on_assets(net_income, total_assets, ['NetIncome', 'TotalAssets', 'date'], timescale), ['net_income', 'total_assets'])
+        graph.add_metric('return_on_equity', lambda timescale, net_income, equity: self._combine_return_on_equity(net_income, equity, ['NetIncome', 'TotalStockholdersEquity', 'date'], timescale), ['net_income', 'stockholders_equity'])
+        graph.add_metric('nopat', lambda timescale, data: self._compute_nopat(data, graph.node('nopat_items').keys), ['nopat_items'])
+        graph.add_metric('fcf_roic', lambda timescale, fcf, invested_capital: self._combine_roic('FcF', fcf, invested_capital, timescale), ['fcf', 'invested_capital'])
+        graph.add_metric('nopat_roic', lambda timescale, nopat, invested_capital: self._combine_roic('NOPAT', nopat, invested_capital, timescale), ['nopat', 'invested_capital'])
+        # Price forecast
+        graph.add_metric('rate_fcf_roic', lambda timescale, data: self._compute_rate_fcf_roic(data), ['fcf_roic'])
+        graph.add_metric('rate_invested_capital', lambda timescale, data: self._compute_rate_invested_capital(data), ['invested_capital'])
+        graph.add_metric('projected_fcf', lambda timescale, fcf_rate, invested_capital_rate, published: self._compute_projected_fcf(fcf_rate, invested_capital_rate, published['date']),
+                         ['rate_fcf_roic', 'rate_invested_capital', ('cash_flow', 'QoQ')])
+        return graph
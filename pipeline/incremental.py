@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.db_interface import CompanyDbInterface
+from pipeline.data_processing import CompanyFinancials
+from pipeline.memo import track_sources
+from pipeline.companies import registry, run_universe
+from pipeline.materialize import (materialize_company, load_financials, metrics_file_path, find_metrics_file, read_metrics_file,
+                                  read_metrics_collection, write_metrics_file, write_metrics_collection, _to_builtin, METRICS_COLLECTION,
+                                  FILE_FORMATS)
+from utils.utils import QuarterIndex
+
+# Incremental refresh of materialized metrics (see pipeline.materialize) after new quarters are appended to the company collections.
+# A stale metric is recomputed only on the newest quarters of its collections and spliced on top of the stored history:
+# - date indexed results (QoQ, TTM, ratios): new quarters are prepended, older rows keep their values since every trailing window,
+#   growth shift and rate only looks at older quarters.
+# - Year indexed results (YoY): new years are prepended and the stored newest year bucket is replaced.
+# - other results (projection): replaced, their seeds only depend on the newest quarters.
+# Stored rows that the recomputation covers with full history are compared with their recomputed values; a mismatch (e.g. a
+# restated quarter) or anything other than appended quarters falls back to a full recompute of that metric. Usage:
+#   python -m pipeline.incremental tesla --output metrics/
+
+# Quarters read per timescale. They cover the deepest dependency chain (rate of change of a trailing window) for a few new
+# quarters, so refresh cost does not grow with history length.
+TAIL_QUARTERS = {'QoQ': 12, 'TTM': 12, 'YoY': 28, None: 12}
+# Older rows a result row depends on, per index column (rate of change of a 4 quarter window: 8 quarters, or 5 years).
+HISTORY_DEPTH = {'date': 8, 'Year': 5}
+
+
+class NotAppendOnly(Exception):
+    """ Raised when stored and recomputed results do not differ by appended quarters only.
+    """
+
+
+class TailInterface:
+    """ View of a data interface restricted to the newest n_quarters of every collection. Every other attribute is delegated.
+
+    Args:
+        interface (object): CompanyDataInterface instance.
+        n_quarters (int): number of quarters returned per collection.
+    """
+    def __init__(self, interface: object, n_quarters: int) -> None:
+        self._interface = interface
+        self._n_quarters = n_quarters
+
+    def find_values_for_one_key(self, collection: str, key: str) -> object:
+        return self._interface.find_values_for_quarter_range(collection, [key], last_n= self._n_quarters)
+
+    def _find_values_for_multiple_keys(self, collection: str, keys: list) -> object:
+        return self._interface.find_values_for_quarter_range(collection, keys, last_n= self._n_quarters)
+
+    def __getattr__(self, name: str):
+        return getattr(self._interface, name)
+
+
+def splice(stored: dict, recomputed: dict) -> dict:
+    """ Combine a stored result with the same metric recomputed on the newest quarters.
+
+    Args:
+        stored (dict): stored result (full history).
+        recomputed (dict): result computed on the newest quarters only.
+
+    Raises:
+        NotAppendOnly: results differ by more than appended quarters.
+
+    Returns:
+        dict: updated result.
+    """
+    if list(stored.keys()) != list(recomputed.keys()):
+        raise NotAppendOnly('Columns changed')
+    if 'date' in stored:
+        stored_index, recomputed_index = QuarterIndex.from_labels(stored['date']).ordinals, QuarterIndex.from_labels(recomputed['date']).ordinals
+        n_replace, depth = 0, HISTORY_DEPTH['date']
+    elif 'Year' in stored:
+        stored_index, recomputed_index = np.asarray(stored['Year']), np.asarray(recomputed['Year'])
+        # The newest year bucket gets the new quarters of its year.
+        n_replace, depth = 1, HISTORY_DEPTH['Year']
+    else:
+        return recomputed
+    if len(stored_index) == 0:
+        return recomputed
+    n_new = int(np.sum(recomputed_index > stored_index[0]))
+    if np.any(recomputed_index[:n_new] <= stored_index[0]) or n_new + n_replace == 0:
+        raise NotAppendOnly('No appended quarters')
+    # Stored rows also present in the recomputed result must be unchanged. The oldest recomputed rows lack part of their history
+    # (trailing windows, rates of change) and are not compared.
+    start = n_new + n_replace
+    end = min(len(recomputed_index), len(stored_index) + n_new, max(start + 1, len(recomputed_index) - depth))
+    for i in range(start, end):
+        if recomputed_index[i] != stored_index[i - n_new]:
+            raise NotAppendOnly('Quarters are not contiguous')
+        for k in stored:
+            if not _same_value(stored[k][i - n_new], recomputed[k][i]):
+                raise NotAppendOnly('Value of {} changed'.format(k))
+    return {k: list(recomputed[k][:n_new + n_replace]) + list(stored[k][n_replace:]) for k in stored}
+
+
+def update_company(financials: CompanyFinancials, result: dict, tail_quarters: dict = None) -> tuple:
+    """ Bring materialized results of a company up to date with its collections.
+
+    Args:
+        financials (CompanyFinancials): company instance.
+        result (dict): stored materialize_company output. Updated in place.
+        tail_quarters (dict, optional): quarters read per timescale. Defaults to TAIL_QUARTERS.
+
+    Returns:
+        tuple: (result, counters of 'unchanged', 'incremental' and 'full' metrics).
+    """
+    tail_quarters = tail_quarters or TAIL_QUARTERS
+    interface = financials._db_interface
+    versions = {}
+    def current_version(collection):
+        if collection not in versions:
+            versions[collection] = _to_builtin(interface.get_collection_version(collection))
+        return versions[collection]
+    tail_financials = {}
+    counters = {'unchanged': 0, 'incremental': 0, 'full': 0}
+    for key, entry in result['metrics'].items():
+        if all(current_version(c) == v for c, v in entry['versions'].items()):
+            counters['unchanged'] += 1
+            continue
+        method, _, timescale = key.partition(':')
+        timescale = timescale or None
+        kwargs = {} if timescale is None else {'timescale': timescale}
+        n_quarters = tail_quarters.get(timescale, tail_quarters[None])
+        if n_quarters not in tail_financials:
+            tail_financials[n_quarters] = financials.with_data_interface(TailInterface(interface, n_quarters))
+        with track_sources() as sources:
+            try:
+                data = splice(entry['data'], _to_builtin(getattr(tail_financials[n_quarters], method)(**kwargs)))
+                counters['incremental'] += 1
+            except NotAppendOnly:
+                data = _to_builtin(getattr(financials, method)(**kwargs))
+                counters['full'] += 1
+        result['metrics'][key] = {'versions': {c: current_version(c) for c in sorted(sources)}, 'data': data}
+    result['created'] = datetime.now(timezone.utc).isoformat()
+    return result, counters
+
+
+def run_job(company: str, host: str = None, database: str = None, output: str = None, mongo: bool = False, format: str = None) -> dict:
+    """ Incrementally refresh materialized metrics of one company. Companies without stored results are fully materialized. Metric
+    files are written back in their own format (see write_metrics_file) unless format is given.
+
+    Returns:
+        dict: summary with company, metric counters, target and elapsed seconds.
+    """
+    started = time.perf_counter()
+    financials = load_financials(company, host, database)
+    if mongo:
+        if not isinstance(financials._db_interface, CompanyDbInterface):
+            raise Exception('Company {} does not read from MongoDb, use --output instead'.format(company))
+        result = read_metrics_collection(financials._db_interface._db, financials.company_name)
+    else:
+        # The existing file (first format in FILE_FORMATS order in a folder, as readers pick) is refreshed in place, unless another
+        # format is requested.
+        path = find_metrics_file(output, financials.company_name)
+        if format is not None and os.path.isdir(output):
+            target_path = metrics_file_path(output, financials.company_name, format)
+        else:
+            target_path = path
+        # Arrow and Parquet series are read as NumPy arrays, spliced results are lists.
+        result = _to_builtin(read_metrics_file(path)) if os.path.isfile(path) else {'metrics': {}}
+    if len(result['metrics']) == 0:
+        result = materialize_company(financials)
+        counters = {'unchanged': 0, 'incremental': 0, 'full': len(result['metrics'])}
+    else:
+        result, counters = update_company(financials, result)
+    if mongo:
+        write_metrics_collection(result, financials._db_interface._db)
+        target = '{}.{}'.format(financials._db_interface._db.name, METRICS_COLLECTION)
+    else:
+        target = write_metrics_file(result, target_path, format)
+    return dict(counters, company= company, target= target, seconds= time.perf_counter() - started)
+
+
+def _same_value(a: object, b: object) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        return bool(np.isclose(a, b, rtol= 1e-9, atol= 0, equal_nan= True))
+    return a == b
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description= 'Refresh materialized company metrics after new quarters are ingested.')
+    parser.add_argument('companies', nargs= '*', help= 'tickers. Defaults to every registered company')
+    parser.add_argument('--host', default= None, help= 'data host url (mongodb://... or file://folder). Defaults to company default')
+    parser.add_argument('--database', default= None, help= 'database name. Defaults to company default')
+    parser.add_argument('--output', default= None, help= 'metrics file or folder of materialized metrics')
+    parser.add_argument('--format', default= None, choices= list(FILE_FORMATS), help= 'metrics file format. Defaults to the format of the existing file')
+    parser.add_argument('--mongo', action= 'store_true', help= 'refresh the {} collection of the company database'.format(METRICS_COLLECTION))
+    parser.add_argument('--workers', type= int, default= None, help= 'parallel processes. Defaults to number of cpus')
+    args = parser.parse_args(argv)
+    if (args.output is None) == (not args.mongo):
+        parser.error('Please enter either --output or --mongo')
+    results = run_universe(args.companies or registry.tickers, run_job, workers= args.workers, host= args.host, database= args.database,
+                           output= args.output, mongo= args.mongo, format= args.format)
+    for ticker, summary in results.items():
+        if 'error' in summary:
+            print('[{}] failed: {}'.format(ticker, summary['error']))
+        else:
+            print('[{company}] unchanged: {unchanged}, incremental: {incremental}, full: {full} -> {target} in {seconds:.2f}s'.format(**summary))
+
+if __name__ == '__main__':
+    main()
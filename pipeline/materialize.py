@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import time
+import argparse
+import inspect
+from datetime import datetime, timezone
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from db.db_interface import CompanyDbInterface
+from pipeline.data_processing import CompanyFinancials
+from pipeline.memo import track_sources
+from pipeline.companies import registry, run_universe, print_progress
+from utils.utils import encode_json
+
+# Offline precomputation of every CompanyFinancials getter for every timescale. Each result is stored with the version token of
+# the collections it was computed from, so readers (MaterializedFinancials) serve it only while the source data is unchanged and
+# fall back to live computation otherwise. Results go to a 'metrics' collection of the company database or to a JSON, Arrow IPC or
+# Parquet file (see pipeline.arrow_store). Usage:
+#   python -m pipeline.materialize tesla --output metrics/
+#   python -m pipeline.materialize tesla --output metrics/ --format arrow
+#   python -m pipeline.materialize tesla --host mongodb://localhost:27017 --database tesla_db --mongo
+
+TIMESCALES = ['QoQ', 'TTM', 'YoY']
+# Getters materialized by default: every memoized method except evaluate_metrics, whose arguments are open ended, and
+# encoded_financials, which is itself the encoding of every materialized getter.
+MATERIALIZED_METHODS = [m for m in CompanyFinancials.MEMOIZED_METHODS if m not in ['evaluate_metrics', 'encoded_financials']]
+METRICS_COLLECTION = 'metrics'
+# Metric file formats and their extensions. In a folder, readers pick the first existing file in this order.
+FILE_FORMATS = {'arrow': '.arrow', 'parquet': '.parquet', 'json': '.json'}
+
+
+def metric_key(method: str, timescale: str = None) -> str:
+    """ Key of a materialized result, e.g. 'get_revenue:TTM'. Methods without timescale argument use the method name only.
+
+    Args:
+        method (str): getter name.
+        timescale (str, optional): Defaults to None.
+
+    Returns:
+        str: _description_
+    """
+    return method if timescale is None else '{}:{}'.format(method, timescale)
+
+
+def materialize_company(financials: CompanyFinancials, methods: list = None, timescales: list = None) -> dict:
+    """ Run every getter for every timescale it accepts. Getters not implemented by the company are skipped.
+
+    Args:
+        financials (CompanyFinancials): company instance.
+        methods (list, optional): getter names. Defaults to MATERIALIZED_METHODS.
+        timescales (list, optional): Defaults to TIMESCALES.
+
+    Returns:
+        dict: 'company', 'created' and 'metrics' (metric key -> {'versions', 'data'}).
+    """
+    metrics = {}
+    for method in methods or MATERIALIZED_METHODS:
+        getter = getattr(financials, method)
+        method_timescales = (timescales or TIMESCALES) if 'timescale' in inspect.signature(getter).parameters else [None]
+        for timescale in method_timescales:
+            with track_sources() as sources:
+                try:
+                    data = getter() if timescale is None else getter(timescale= timescale)
+                except NotImplementedError:
+                    continue
+            versions = {c: _to_builtin(financials._db_interface.get_collection_version(c)) for c in sorted(sources)}
+            metrics[metric_key(method, timescale)] = {'versions': versions, 'data': _to_builtin(data)}
+    return {'company': financials.company_name, 'created': datetime.now(timezone.utc).isoformat(), 'metrics': metrics}
+
+
+def write_metrics_file(result: dict, path: str, format: str = None) -> str:
+    """ Write materialized metrics as a JSON file: one entry per metric, one list per column. Arrow and Parquet files are written
+    by pipeline.arrow_store.
+
+    Args:
+        result (dict): output of materialize_company.
+        path (str): target file or folder. In a folder the file is named <company>_metrics.<json|arrow|parquet>.
+        format (str, optional): 'json', 'arrow' or 'parquet'. Defaults to None (format of the file extension, 'json' for folders
+            and other extensions).
+
+    Raises:
+        TypeError: format does not match the file extension.
+
+    Returns:
+        str: path of written file.
+    """
+    extension_format = None if os.path.isdir(path) else file_format(path)
+    if format is not None and extension_format is not None and format != extension_format:
+        raise TypeError('Format {} does not match metrics file {}'.format(format, path))
+    format = format or extension_format or 'json'
+    path = metrics_file_path(path, result['company'], format)
+    if format != 'json':
+        from pipeline.arrow_store import write_metrics_arrow
+        return write_metrics_arrow(result, path, format)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    # Non finite values are written as null, as json.dump would write NaN tokens that other JSON readers reject.
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_json(result))
+    # Readers never see a half written file.
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_metrics_collection(result: dict, db: object) -> int:
+    """ Upsert materialized metrics into the METRICS_COLLECTION of a database, one document per metric and timescale.
+
+    Args:
+        result (dict): output of materialize_company.
+        db (object): Pymongo database class instance.
+
+    Returns:
+        int: number of documents written.
+    """
+    from pymongo import ReplaceOne
+    operations = [ReplaceOne({'_id': '{}|{}'.format(result['company'], key)},
+                             {'company': result['company'], 'metric': key, 'created': result['created'], **entry}, upsert= True)
+                  for key, entry in result['metrics'].items()]
+    if len(operations) > 0:
+        db[METRICS_COLLECTION].bulk_write(operations, ordered= False)
+    return len(operations)
+
+
+def metrics_file_path(path: str, company: str, format: str = 'json') -> str:
+    # A folder holds one <company>_metrics.<extension> file per company.
+    return os.path.join(path, '{}_metrics{}'.format(company.lower(), FILE_FORMATS[format])) if os.path.isdir(path) else path
+
+
+def file_format(path: str) -> str:
+    # Format of a metrics file from its extension, None for other extensions.
+    extension = os.path.splitext(path)[1]
+    return next((format for format, format_extension in FILE_FORMATS.items() if format_extension == extension), None)
+
+
+def find_metrics_file(path: str, company: str) -> str:
+    """ Metrics file of a company in a folder, the first existing one in FILE_FORMATS order. Files are returned unchanged.
+
+    Returns:
+        str: _description_
+    """
+    candidates = [metrics_file_path(path, company, format) for format in FILE_FORMATS]
+    return next((c for c in candidates if os.path.isfile(c)), candidates[-1])
+
+
+def read_metrics_file(path: str) -> dict:
+    """ Read materialized metrics written by write_metrics_file. Arrow files are memory mapped (see pipeline.arrow_store).
+
+    Returns:
+        dict: same layout as materialize_company output.
+    """
+    if file_format(path) in ['arrow', 'parquet']:
+        from pipeline.arrow_store import read_metrics_arrow
+        return read_metrics_arrow(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    # Nulls of float series were NaN (see write_metrics_file).
+    for entry in result['metrics'].values():
+        for name, values in entry['data'].items():
+            if isinstance(values, list) and None in values and all(isinstance(v, float) for v in values if v is not None):
+                entry['data'][name] = [float('nan') if v is None else v for v in values]
+    return result
+
+
+def read_metrics_collection(db: object, company: str) -> dict:
+    """ Read materialized metrics of a company from the METRICS_COLLECTION of a database.
+
+    Returns:
+        dict: same layout as materialize_company output.
+    """
+    documents = list(db[METRICS_COLLECTION].find({'company': company}))
+    return {'company': company, 'created': max([doc['created'] for doc in documents], default= None),
+            'metrics': {doc['metric']: {'versions': doc['versions'], 'data': doc['data']} for doc in documents}}
+
+
+def load_financials(company: str, host: str = None, database: str = None) -> CompanyFinancials:
+    """ Instantiate a registered company (see pipeline.companies).
+
+    Args:
+        company (str): ticker, e.g. 'tesla'.
+        host (str, optional): host url. Defaults to the company definition host.
+        database (str, optional): database name. Defaults to the company definition database.
+
+    Returns:
+        CompanyFinancials: _description_
+    """
+    return registry.get(company).create(host, database)
+
+
+def run_job(company: str, host: str = None, database: str = None, output: str = None, mongo: bool = False, format: str = None) -> dict:
+    """ Materialize one company and write the results. Runs in a worker process of materialize().
+
+    Returns:
+        dict: summary with company, number of metrics, target and elapsed seconds.
+    """
+    started = time.perf_counter()
+    financials = load_financials(company, host, database)
+    result = materialize_company(financials)
+    summary = {'company': company, 'metrics': len(result['metrics'])}
+    if mongo:
+        if not isinstance(financials._db_interface, CompanyDbInterface):
+            raise Exception('Company {} does not read from MongoDb, use --output instead'.format(company))
+        write_metrics_collection(result, financials._db_interface._db)
+        summary['target'] = '{}.{}'.format(financials._db_interface._db.name, METRICS_COLLECTION)
+    if output is not None:
+        summary['target'] = write_metrics_file(result, output, format)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def materialize(companies: list, host: str = None, database: str = None, output: str = None, mongo: bool = False, workers: int = None, progress = None,
+                format: str = None) -> list:
+    """ Materialize several companies in parallel worker processes (see pipeline.companies.run_universe).
+
+    Returns:
+        list: run_job summaries in the same order as companies.
+    """
+    results = run_universe(companies, run_job, workers= workers, progress= progress, host= host, database= database, output= output, mongo= mongo,
+                           format= format)
+    return [results[registry.get(c).ticker] for c in companies]
+
+
+class MaterializedFinancials:
+    """ Read-through wrapper around a CompanyFinancials instance. Getters called with their default collection and keys are served
+    from materialized results while the recorded collection versions still match the data interface; anything else (other
+    arguments, stale or missing results) is computed live by the wrapped instance.
+
+    Args:
+        financials (CompanyFinancials): company instance used for version checks and as fallback.
+        path (str, optional): materialized metrics file or folder. Defaults to None (METRICS_COLLECTION of the company database).
+    """
+    def __init__(self, financials: CompanyFinancials, path: str = None) -> None:
+        self._financials = financials
+        self._path = path
+        self._metrics = None
+        self.served = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls, financials: CompanyFinancials) -> object:
+        """ Wrap financials when METRICS_STORE is set ('mongo' or a metrics file or folder), otherwise return it unchanged.
+        """
+        store = os.environ.get('METRICS_STORE')
+        if not store:
+            return financials
+        return cls(financials, None if store == 'mongo' else store)
+
+    def reload(self) -> None:
+        """ Read materialized results again from the store.
+        """
+        if self._path is not None:
+            self._metrics = read_metrics_file(find_metrics_file(self._path, self._financials.company_name))['metrics']
+        else:
+            self._metrics = read_metrics_collection(self._financials._db_interface._db, self._financials.company_name)['metrics']
+
+    def _is_current(self, entry: dict) -> bool:
+        interface = self._financials._db_interface
+        return all(_to_builtin(interface.get_collection_version(c)) == v for c, v in entry['versions'].items())
+
+    def lookup(self, method: str, timescale: str = None) -> dict:
+        """ Materialized result of a getter if it is still current.
+
+        Returns:
+            dict: copy of the result or None.
+        """
+        if self._metrics is None:
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError):
+                self._metrics = {}
+        entry = self._metrics.get(metric_key(method, timescale))
+        if entry is None or not self._is_current(entry):
+            return None
+        # Arrow files give NumPy arrays, tolist() turns them into Python scalars.
+        return {k: v.tolist() if isinstance(v, np.ndarray) else list(v) for k, v in entry['data'].items()}
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._financials, name)
+        if name not in MATERIALIZED_METHODS:
+            return attribute
+        def getter(*args, **kwargs):
+            if len(args) == 0 and set(kwargs) <= {'timescale'}:
+                timescale = kwargs.get('timescale')
+                if timescale is None and 'timescale' in inspect.signature(attribute).parameters:
+                    timescale = inspect.signature(attribute).parameters['timescale'].default
+                data = self.lookup(name, timescale)
+                if data is not None:
+                    self.served += 1
+                    return data
+            self.fallbacks += 1
+            return attribute(*args, **kwargs)
+        return getter
+
+
+def _to_builtin(value: object) -> object:
+    # JSON/BSON friendly copy: tuples and NumPy arrays become lists and NumPy scalars become Python scalars.
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description= 'Precompute every company metric for every timescale.')
+    parser.add_argument('companies', nargs= '*', help= 'tickers: {}. Defaults to every registered company'.format(', '.join(registry.tickers)))
+    parser.add_argument('--host', default= None, help= 'data host url (mongodb://... or file://folder). Defaults to company default')
+    parser.add_argument('--database', default= None, help= 'database name. Defaults to company default')
+    parser.add_argument('--output', default= None, help= 'metrics file or folder for materialized metrics')
+    parser.add_argument('--format', default= None, choices= list(FILE_FORMATS),
+                        help= 'metrics file format. Defaults to the --output extension, json for folders. Arrow and Parquet need pyarrow')
+    parser.add_argument('--mongo', action= 'store_true', help= 'write to the {} collection of the company database'.format(METRICS_COLLECTION))
+    parser.add_argument('--workers', type= int, default= None, help= 'parallel processes. Defaults to one per company')
+    args = parser.parse_args(argv)
+    if args.output is None and not args.mongo:
+        parser.error('Please enter --output and/or --mongo')
+    for summary in materialize(args.companies or registry.tickers, args.host, args.database, args.output, args.mongo, args.workers, print_progress,
+                               args.format):
+        if 'error' in summary:
+            print('[{ticker}] failed: {error}'.format(**summary))
+        else:
+            print('[{company}] {metrics} metrics -> {target} in {seconds:.2f}s'.format(**summary))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import copy
+import inspect
+import threading
+import functools
+import contextlib
+import contextvars
+import collections
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from utils.utils import DtypePolicy, QuarterLabelArray
+
+# Memoization of CompanyFinancials results. An entry is stored under (company, method, arguments) together with the version
+# token of every collection the computation read (see record_source). A lookup is a hit only while all those versions are
+# unchanged, so new data is picked up without explicit invalidation. Callers always receive a private copy of the result. Stored
+# series are kept in the compact dtypes of a DtypePolicy and turned back into the same lists on reads.
+
+# Collections read by the computation currently running (None outside memoized calls).
+_current_sources = contextvars.ContextVar('metric_sources', default= None)
+
+
+def record_source(collection: str) -> None:
+    """ Register that the running memoized computation reads collection. Called by every CompanyFinancials fetch path.
+
+    Args:
+        collection (str): Collection name.
+    """
+    sources = _current_sources.get()
+    if sources is not None:
+        sources.add(collection)
+
+
+@contextlib.contextmanager
+def track_sources():
+    """ Context manager yielding the set of collections read by the computations run inside it, memoized or not.
+    """
+    sources = set()
+    parent_sources = _current_sources.get()
+    token = _current_sources.set(sources)
+    try:
+        yield sources
+    finally:
+        _current_sources.reset(token)
+        if parent_sources is not None:
+            # Collections read inside also count for the enclosing computation, e.g. a memoized method tracking its callees.
+            parent_sources.update(sources)
+
+
+class MetricCache:
+    """ Thread-safe LRU store of metric results bounded by an estimate of their size in bytes.
+
+    Args:
+        max_bytes (int, optional): memory budget. Defaults to METRIC_CACHE_MAX_BYTES env variable or 64 MB.
+        policy (DtypePolicy, optional): storage dtypes of result series. Defaults to DtypePolicy.from_env().
+    """
+    def __init__(self, max_bytes: int = None, policy: DtypePolicy = None) -> None:
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get('METRIC_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.policy = policy if policy is not None else DtypePolicy.from_env()
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+
+    def get(self, key: tuple, current_version) -> tuple:
+        """ Look up a result.
+
+        Args:
+            key (tuple): (owner, method, arguments) key.
+            current_version (callable): returns the current version token of a collection.
+
+        Returns:
+            tuple: (found, copy of value, source collections).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            value, versions, _ = entry
+            if all(current_version(c) == v for c, v in versions.items()):
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return True, _expand_result(value), set(versions)
+            self.pop(key)
+        with self._lock:
+            self.misses += 1
+        return False, None, None
+
+    def put(self, key: tuple, value: object, versions: dict) -> None:
+        """ Store a copy of a result.
+
+        Args:
+            key (tuple): (owner, method, arguments) key.
+            value (object): result.
+            versions (dict): version token per source collection at computation time.
+        """
+        stored = _compact_result(value, self.policy)
+        size = _sizeof(stored)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[2]
+            self._entries[key] = (stored, versions, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last= False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: tuple) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[2]
+
+    def invalidate(self, owner: tuple = None, collection: str = None) -> int:
+        """ Drop entries of one owner (company) and/or depending on one collection. Without arguments every entry is dropped.
+
+        Args:
+            owner (tuple, optional): owner key, see CompanyFinancials._memo_owner. Defaults to None.
+            collection (str, optional): Collection name. Defaults to None.
+
+        Returns:
+            int: number of dropped entries.
+        """
+        with self._lock:
+            keys = [k for k, (_, versions, _) in self._entries.items()
+                    if (owner is None or k[0] == owner) and (collection is None or collection in versions)]
+            for k in keys:
+                self.size -= self._entries.pop(k)[2]
+            return len(keys)
+
+    def stats(self) -> dict:
+        """ Counters of cache usage.
+
+        Returns:
+            dict: hits, misses, evictions, entries and size in bytes.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._entries),
+                    'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+# Process-wide cache shared by every CompanyFinancials instance (pages instantiate several of them).
+metric_cache = MetricCache()
+
+
+def memoize_method(method, owner: tuple, data_interface: object, cache: MetricCache = None):
+    """ Wrap a bound CompanyFinancials method with version-checked memoization.
+
+    Args:
+        method (callable): bound method.
+        owner (tuple): key identifying the company and data source.
+        data_interface (object): CompanyDataInterface used to read collection version tokens.
+        cache (MetricCache, optional): store. Defaults to the process-wide metric_cache.
+
+    Returns:
+        callable: memoized method.
+    """
+    cache = cache if cache is not None else metric_cache
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        try:
+            key = (owner, method.__name__, _freeze(bound.arguments))
+            hash(key)
+        except TypeError:
+            return method(*args, **kwargs)
+        parent_sources = _current_sources.get()
+        found, value, sources = cache.get(key, data_interface.get_collection_version)
+        if not found:
+            token = _current_sources.set(set())
+            try:
+                value = method(*args, **kwargs)
+                sources = _current_sources.get()
+            finally:
+                _current_sources.reset(token)
+            versions = {c: data_interface.get_collection_version(c) for c in sources}
+            # Backends without version tokens (None) are never cached.
+            if all(v is not None for v in versions.values()):
+                cache.put(key, value, versions)
+            value = _copy_result(value)
+        if parent_sources is not None:
+            # Nested memoized calls report their sources to the caller's entry.
+            parent_sources.update(sources)
+        return value
+    return wrapper
+
+
+def _freeze(value: object) -> object:
+    # Hashable form of call arguments.
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _copy_result(value: object) -> object:
+    if isinstance(value, dict):
+        return {k: list(v) if isinstance(v, list) else copy.deepcopy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    return copy.deepcopy(value)
+
+
+class _CompactSeries:
+    # List of a result stored in a compact array (see DtypePolicy), read back as an identical list.
+    __slots__ = ['values']
+
+    def __init__(self, values: object) -> None:
+        self.values = values
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sys.getsizeof(self.values)
+
+
+def _compact_result(value: object, policy: DtypePolicy) -> object:
+    if isinstance(value, dict):
+        return {k: _compact_series(v, policy) if isinstance(v, list) else copy.deepcopy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_compact_result(v, policy) for v in value]
+    return copy.deepcopy(value)
+
+
+def _compact_series(values: list, policy: DtypePolicy) -> object:
+    compacted = policy.compact(values)
+    return _CompactSeries(compacted) if isinstance(compacted, (np.ndarray, QuarterLabelArray)) else list(values)
+
+
+def _expand_result(value: object) -> object:
+    if isinstance(value, dict):
+        return {k: v.values.tolist() if isinstance(v, _CompactSeries) else list(v) if isinstance(v, list) else copy.deepcopy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand_result(v) for v in value]
+    return copy.deepcopy(value)
+
+
+def _sizeof(value: object) -> int:
+    # Estimate of memory held by a result (containers plus their scalar elements).
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + _sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import collections
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from utils.utils import *
+from pipeline.memo import record_source
+
+
+class MetricNode:
+    """ Node of a MetricGraph. Source nodes read fields of a collection; derived nodes compute a series from other nodes.
+
+    Args:
+        name (str): node name, e.g. 'fcf_roic'.
+        compute (callable, optional): derived nodes only. Called as compute(timescale, *input_values) and returns a dict of lists.
+        inputs (list, optional): names of input nodes. A (name, timescale) tuple pins the timescale of an input. Defaults to [].
+        collection (str, optional): source nodes only. Collection name.
+        keys (list, optional): source nodes only. Fields to read, in output order.
+    """
+    def __init__(self, name: str, compute = None, inputs: list = [], collection: str = None, keys: list = []) -> None:
+        self.name = name
+        self.compute = compute
+        self.inputs = list(inputs)
+        self.collection = collection
+        self.keys = list(keys)
+
+    @property
+    def is_source(self) -> bool:
+        return self.collection is not None
+
+
+class MetricGraph:
+    """ Dependency DAG of company metrics. evaluate() resolves every requested (metric, timescale) pair together: each collection
+    is fetched once with the union of the fields its source nodes need, and every intermediate series is computed once and shared
+    by all the metrics depending on it.
+    """
+    def __init__(self) -> None:
+        self._nodes = {}
+        # Number of collection fetches of last evaluate() call.
+        self.last_fetches = 0
+
+    def add_source(self, name: str, collection: str, keys: list) -> None:
+        """ Declare a source node.
+
+        Args:
+            name (str): node name.
+            collection (str): collection name.
+            keys (list): fields to read, including 'date'.
+        """
+        self._add(MetricNode(name, collection= collection, keys= keys))
+
+    def add_metric(self, name: str, compute, inputs: list) -> None:
+        """ Declare a derived node.
+
+        Args:
+            name (str): node name.
+            compute (callable): compute(timescale, *input_values) -> dict.
+            inputs (list): input node names or (name, timescale) tuples.
+        """
+        self._add(MetricNode(name, compute= compute, inputs= inputs))
+
+    def _add(self, node: MetricNode) -> None:
+        if node.name in self._nodes:
+            raise Exception('Metric {} is already defined'.format(node.name))
+        self._nodes[node.name] = node
+
+    def node(self, name: str) -> MetricNode:
+        return self._nodes[name]
+
+    @property
+    def metrics(self) -> list:
+        return list(self._nodes.keys())
+
+    def resolve(self, requests: list) -> list:
+        """ Every (node, timescale) pair needed by requests, in dependency order.
+
+        Args:
+            requests (list): list of (metric name, timescale) tuples.
+
+        Raises:
+            Exception: unknown metric or cycle in graph.
+
+        Returns:
+            list: (node name, timescale) tuples, inputs before the nodes using them.
+        """
+        order = []
+        state = {}
+        def visit(item, path):
+            if state.get(item) == 'done':
+                return
+            if state.get(item) == 'visiting':
+                raise Exception('Cycle in metric graph: {}'.format(' -> '.join(n for n, _ in path + [item])))
+            name, timescale = item
+            if name not in self._nodes:
+                raise Exception('Metric {} is not defined'.format(name))
+            state[item] = 'visiting'
+            for dependency in self._nodes[name].inputs:
+                visit(dependency if isinstance(dependency, tuple) else (dependency, timescale), path + [item])
+            state[item] = 'done'
+            order.append(item)
+        for request in requests:
+            visit(tuple(request), [])
+        return order
+
+    def evaluate(self, financials: object, requests: list) -> dict:
+        """ Compute requested metrics.
+
+        Args:
+            financials (object): CompanyFinancials instance providing the data interface and timescale conversion.
+            requests (list): list of (metric name, timescale) tuples.
+
+        Returns:
+            dict: result dict of lists per (metric name, timescale) request.
+        """
+        order = self.resolve(requests)
+        server_side = getattr(financials, '_server_side_aggregation', False) and hasattr(financials._db_interface, 'aggregate')
+        columns = self._fetch_sources(financials, order, server_side)
+        values = {}
+        for name, timescale in order:
+            node = self._nodes[name]
+            if node.is_source:
+                if server_side and timescale in ['YoY', 'TTM']:
+                    # Server side aggregation: the database returns the timescaled source directly.
+                    values[(name, timescale)] = financials._parse_aggregated_dict(node.collection, node.keys, timescale)
+                    self.last_fetches += 1
+                else:
+                    unpacked_data = {k: list(columns[node.collection][k]) for k in node.keys if k in columns[node.collection]}
+                    values[(name, timescale)] = financials._to_timescaled_dict(unpacked_data, node.collection, node.keys, timescale)
+            else:
+                # Compute methods may mutate their inputs, so every consumer gets its own copy.
+                inputs = [_copy(values[d if isinstance(d, tuple) else (d, timescale)]) for d in node.inputs]
+                values[(name, timescale)] = node.compute(timescale, *inputs)
+        return {tuple(request): values[tuple(request)] for request in requests}
+
+    def _fetch_sources(self, financials: object, order: list, server_side: bool = False) -> dict:
+        # One fetch per collection with the union of fields of its source nodes (in first seen order).
+        fields = collections.OrderedDict()
+        for name, timescale in order:
+            node = self._nodes[name]
+            if not node.is_source or (server_side and timescale in ['YoY', 'TTM']):
+                continue
+            keys = fields.get(node.collection, [])
+            fields[node.collection] = keys + [k for k in node.keys if k not in keys]
+        self.last_fetches = 0
+        columns = {}
+        for collection, keys in fields.items():
+            record_source(collection)
+            packed_data = financials._db_interface._find_values_for_multiple_keys(collection, keys)
+            columns[collection] = unpack_cursor_object_multiple(packed_data, keys)
+            self.last_fetches += 1
+        return columns
+
+
+def _copy(data: dict) -> dict:
+    return {k: list(v) for k, v in data.items()}
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from utils.utils import QuarterIndex, rolling_window, unpack_cursor_object_multiple
+
+# Cross-company panel: one float array of shape (companies, quarters, fields) aligned on the union of every company's quarters
+# (newest first), with NaN where a company has no value. Metric formulas are written once over whole (companies, periods) arrays,
+# so screening many issuers is a few broadcast operations instead of one pandas pass per company. Windows and growth shifts run
+# along calendar quarters: a quarter missing for a company is a gap, not skipped over.
+
+# Fields loaded per collection by FinancialPanel.from_financials (pipeline names, see pipeline.companies for other layouts).
+PANEL_FIELDS = {
+    'statement_operations': ['TotalRevenues', 'GrossProfit', 'IncomeFromOperations', 'NetIncome', 'IncomeBeforeIncomeTaxes', 'ProvisionForIncomeTaxes'],
+    'gaap_non_gaap': ['AdjustedEBITDA'],
+    'cash_flow': ['NetCashOperatingActivities', 'Capex'],
+    'balance_sheet': ['TotalAssets', 'AccountsPayable', 'AccruedLiabilitiesAndOther', 'CashAndCashEquivalents', 'TotalCurrentAssets',
+                      'TotalCurrentLiabilities', 'TotalStockholdersEquity', 'Inventory']
+}
+# Balance sheet values are stocks, not flows: their yearly value is the yearly sum averaged over 4 quarters (as in TeslaFinancials).
+STOCK_FIELDS = PANEL_FIELDS['balance_sheet']
+
+
+class FinancialPanel:
+    """ Company x quarter x field array.
+
+    Args:
+        tickers (list): company keys, first axis.
+        ordinals (_type_): quarter ordinals sorted newest first, second axis (see QuarterIndex).
+        fields (list): field names, third axis.
+        values (np.ndarray): float array of shape (len(tickers), len(ordinals), len(fields)). NaN marks missing values.
+    """
+    def __init__(self, tickers: list, ordinals, fields: list, values: np.ndarray) -> None:
+        self.tickers = list(tickers)
+        self.quarters = QuarterIndex(ordinals)
+        self.fields = list(fields)
+        self.values = np.asarray(values, dtype= float)
+        self._field_position = {f: i for i, f in enumerate(self.fields)}
+
+    @classmethod
+    def from_dicts(cls, data: dict, fields: list = None) -> 'FinancialPanel':
+        """ Build a panel from per company dicts of lists with a 'date' key (the layout returned by the getters).
+
+        Args:
+            data (dict): ticker -> {field: list, 'date': list of quarter labels}.
+            fields (list, optional): fields to keep. Defaults to every field found.
+
+        Returns:
+            FinancialPanel: _description_
+        """
+        if fields is None:
+            fields = list(dict.fromkeys(k for company in data.values() for k in company if k != 'date'))
+        indexes = {t: QuarterIndex.from_labels(company['date']) for t, company in data.items()}
+        ordinals = np.unique(np.concatenate([index.ordinals for index in indexes.values()] + [np.empty(0, dtype= np.int64)]))[::-1]
+        panel_index = QuarterIndex(ordinals)
+        values = np.full((len(data), len(ordinals), len(fields)), np.nan)
+        for c, (ticker, company) in enumerate(data.items()):
+            positions = panel_index.align(indexes[ticker])
+            for f, field in enumerate(fields):
+                if field in company:
+                    values[c, positions, f] = np.array([np.nan if v is None else v for v in company[field]], dtype= float)
+        return cls(list(data.keys()), ordinals, fields, values)
+
+    @classmethod
+    def from_financials(cls, financials: dict, fields: dict = None) -> 'FinancialPanel':
+        """ Load a panel through the data interfaces of several companies. Missing collections leave their fields empty.
+
+        Args:
+            financials (dict): ticker -> CompanyFinancials instance.
+            fields (dict, optional): collection -> fields. Defaults to PANEL_FIELDS.
+
+        Returns:
+            FinancialPanel: _description_
+        """
+        fields = fields or PANEL_FIELDS
+        all_fields = [f for collection_fields in fields.values() for f in collection_fields]
+        data = {}
+        for ticker, company in financials.items():
+            rows = {}
+            for collection, collection_fields in fields.items():
+                try:
+                    packed_data = company._db_interface._find_values_for_multiple_keys(collection, collection_fields + ['date'])
+                except Exception:
+                    continue
+                unpacked_data = unpack_cursor_object_multiple(packed_data, collection_fields + ['date'])
+                for i, label in enumerate(unpacked_data.get('date', [])):
+                    row = rows.setdefault(label, {})
+                    for f in collection_fields:
+                        if f in unpacked_data:
+                            row[f] = unpacked_data[f][i]
+            labels = list(rows.keys())
+            data[ticker] = {'date': labels, **{f: [rows[label].get(f) for label in labels] for f in all_fields}}
+        return cls.from_dicts(data, all_fields)
+
+    @classmethod
+    def from_registry(cls, tickers: list, fields: dict = None) -> 'FinancialPanel':
+        """ Load a panel of registered companies (see pipeline.companies).
+
+        Returns:
+            FinancialPanel: _description_
+        """
+        from pipeline.companies import registry
+        return cls.from_financials({t: registry.get(t).create() for t in tickers}, fields)
+
+    @property
+    def mask(self) -> np.ndarray:
+        """ True where a company has a value for a quarter and field.
+        """
+        return ~np.isnan(self.values)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """ (companies, quarters) array of a field. Derived fields added with __setitem__ are available as well.
+        """
+        return self.values[:, :, self._field_position[field]]
+
+    def __setitem__(self, field: str, values: np.ndarray) -> None:
+        values = np.broadcast_to(np.asarray(values, dtype= float), self.values.shape[:2])
+        if field in self._field_position:
+            self.values[:, :, self._field_position[field]] = values
+        else:
+            self.values = np.concatenate([self.values, values[:, :, None]], axis= 2)
+            self._field_position[field] = len(self.fields)
+            self.fields.append(field)
+
+    def timescaled(self, timescale: str = 'QoQ') -> tuple:
+        """ Every field in a timescale.
+
+        Args:
+            timescale (str, optional): 'QoQ', 'TTM' (4 quarter trailing mean, as the getters) or 'YoY' (yearly sum, stocks averaged
+                over 4 quarters). Defaults to 'QoQ'.
+
+        Returns:
+            tuple: (values of shape (companies, periods, fields), period labels).
+        """
+        if timescale == 'QoQ':
+            return self.values, self.quarters.labels()
+        if timescale == 'TTM':
+            return rolling_window(self.values, 4, min_periods= 1, axis= 1), self.quarters.labels()
+        if timescale == 'YoY':
+            # Quarters are sorted newest first, so every year is a contiguous run of the quarter axis.
+            years = self.quarters.years
+            if len(years) == 0:
+                return self.values, []
+            starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+            valid = ~np.isnan(self.values)
+            sums = np.add.reduceat(np.where(valid, self.values, 0.0), starts, axis= 1)
+            sums[np.add.reduceat(valid, starts, axis= 1) == 0] = np.nan
+            stocks = [self._field_position[f] for f in STOCK_FIELDS if f in self._field_position]
+            sums[:, :, stocks] /= 4
+            return sums, years[starts].tolist()
+        raise TypeError('Timescale specified is not contemplated. Please enter "QoQ", "TTM" or "YoY"')
+
+    def evaluate(self, metric: str, timescale: str = 'QoQ') -> tuple:
+        """ Evaluate a metric formula (see PANEL_METRICS) for every company and period at once.
+
+        Args:
+            metric (str): metric name, e.g. 'fcf_roic'.
+            timescale (str, optional): Defaults to 'QoQ'.
+
+        Returns:
+            tuple: ((companies, periods) array, period labels).
+        """
+        if metric not in PANEL_METRICS:
+            raise Exception('Metric {} is not defined. Please enter one of: {}'.format(metric, list(PANEL_METRICS)))
+        values, periods = self.timescaled(timescale)
+        columns = {f: values[:, :, i] for i, f in enumerate(self.fields)}
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            return PANEL_METRICS[metric](columns), periods
+
+    def latest(self, values: np.ndarray) -> np.ndarray:
+        """ Newest available value of every company (first non missing period).
+
+        Args:
+            values (np.ndarray): (companies, periods) array.
+
+        Returns:
+            np.ndarray: (companies,) array, NaN for companies without values.
+        """
+        valid = ~np.isnan(values)
+        first = valid.argmax(axis= 1)
+        return np.where(valid.any(axis= 1), values[np.arange(values.shape[0]), first], np.nan)
+
+    def rank(self, values: np.ndarray, ascending: bool = False) -> list:
+        """ Tickers ordered by a (companies,) array, missing values last.
+
+        Returns:
+            list: tickers.
+        """
+        order = np.argsort(values if ascending else -values, kind= 'stable')
+        return [self.tickers[i] for i in order]
+
+    def screen(self, condition: np.ndarray) -> list:
+        """ Tickers for which a (companies,) boolean array holds.
+
+        Returns:
+            list: tickers.
+        """
+        return [t for t, keep in zip(self.tickers, np.asarray(condition)) if keep]
+
+
+def _growth(values: np.ndarray) -> np.ndarray:
+    # Change over previous (older) period in percent, as CompanyFinancials._get_growth_metric_dict.
+    previous = np.concatenate([values[:, 1:], np.full((values.shape[0], 1), np.nan)], axis= 1)
+    return (values - previous) / np.abs(previous) * 100
+
+
+def _fcf(c: dict) -> np.ndarray:
+    return c['NetCashOperatingActivities'] + c['Capex']
+
+
+def _invested_capital(c: dict) -> np.ndarray:
+    # Same formula as TeslaFinancials._compute_invested_capital.
+    return (c['TotalAssets'] - c['AccountsPayable'] - c['AccruedLiabilitiesAndOther'] - c['CashAndCashEquivalents']
+            - np.fmax(0, c['TotalCurrentLiabilities'] - c['TotalCurrentAssets'] + c['CashAndCashEquivalents']))
+
+
+def _nopat(c: dict) -> np.ndarray:
+    return c['IncomeFromOperations'] * (1 - c['ProvisionForIncomeTaxes'] / c['IncomeBeforeIncomeTaxes'])
+
+
+# Metric formulas over {field: (companies, periods) array}.
+PANEL_METRICS = {
+    'revenue': lambda c: c['TotalRevenues'],
+    'gross_profit': lambda c: c['GrossProfit'],
+    'income_ops': lambda c: c['IncomeFromOperations'],
+    'net_income': lambda c: c['NetIncome'],
+    'adj_ebitda': lambda c: c['AdjustedEBITDA'],
+    'fcf': _fcf,
+    'gross_profit_margin': lambda c: c['GrossProfit'] / c['TotalRevenues'],
+    'income_ops_margin': lambda c: c['IncomeFromOperations'] / c['TotalRevenues'],
+    'net_income_margin': lambda c: c['NetIncome'] / c['TotalRevenues'],
+    'adj_ebitda_margin': lambda c: c['AdjustedEBITDA'] / c['TotalRevenues'],
+    'current_ratio': lambda c: c['TotalCurrentAssets'] / c['TotalCurrentLiabilities'],
+    'quick_ratio': lambda c: (c['TotalCurrentAssets'] - c['Inventory']) / c['TotalCurrentLiabilities'],
+    'equity_ratio': lambda c: c['TotalStockholdersEquity'] / c['TotalAssets'],
+    'revenue_growth': lambda c: _growth(c['TotalRevenues']),
+    'gross_profit_growth': lambda c: _growth(c['GrossProfit']),
+    'income_ops_growth': lambda c: _growth(c['IncomeFromOperations']),
+    'net_income_growth': lambda c: _growth(c['NetIncome']),
+    'adj_ebitda_growth': lambda c: _growth(c['AdjustedEBITDA']),
+    'fcf_growth': lambda c: _growth(_fcf(c)),
+    'invested_capital': _invested_capital,
+    'total_assets': lambda c: c['TotalAssets'],
+    'return_on_assets': lambda c: c['NetIncome'] / c['TotalAssets'],
+    'return_on_equity': lambda c: c['NetIncome'] / c['TotalStockholdersEquity'],
+    'nopat': _nopat,
+    'fcf_roic': lambda c: _fcf(c) / _invested_capital(c),
+    'nopat_roic': lambda c: _nopat(c) / _invested_capital(c),
+}
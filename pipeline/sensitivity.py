@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from utils.utils import QuarterIndex
+
+# Sensitivity of the FcF projection (see CompanyFinancials.projected_fcf) and of the price target derived from it. Every scenario
+# axis is an array dimension, so a whole grid of invested capital growth rates, FcF ROIC caps, price multiples and share counts is
+# one broadcast computation:
+#   projection (rates, caps, quarters) -> yearly FcF (rates, caps) -> price target (rates, caps, multiples, shares)
+# Money amounts are in millions of $ and share counts in millions, as in the company collections.
+
+FCF_ROIC_CAP = 0.4
+# Default scenario axes.
+FCF_ROIC_CAPS = [0.2, 0.3, 0.4, 0.5, 0.6]
+INVESTED_CAPITAL_RATES = [0, 1, 2, 3, 4, 5, 6, 7, 8] # % per projected period
+MULTIPLES = [15, 25, 35, 45, 55]
+
+
+def project_fcf_grid(invested_capital_start: float, invested_capital_rates, fcf_roic_start: float, fcf_roic_rate: float, fcf_roic_caps,
+                     n_quarters: int = 41) -> np.ndarray:
+    """ Projected FcF for every combination of invested capital growth rate and FcF ROIC cap. Period i of a scenario is
+    invested_capital_start * (1 + rate)^i * min(fcf_roic_start * (1 + fcf_roic_rate)^i, cap).
+
+    Args:
+        invested_capital_start (float): invested capital of the first projected period.
+        invested_capital_rates (_type_): invested capital growth rates in % per period.
+        fcf_roic_start (float): FcF ROIC of the first projected period.
+        fcf_roic_rate (float): FcF ROIC growth rate in % per period.
+        fcf_roic_caps (_type_): maximum FcF ROIC values.
+        n_quarters (int, optional): projected periods. Defaults to 41.
+
+    Returns:
+        np.ndarray: float array of shape (len(invested_capital_rates), len(fcf_roic_caps), n_quarters).
+    """
+    periods = np.arange(n_quarters)
+    invested_capital = invested_capital_start * (1 + np.asarray(invested_capital_rates, dtype= float).reshape(-1, 1) / 100)**periods
+    fcf_roic = np.minimum(fcf_roic_start * (1 + fcf_roic_rate / 100)**periods, np.asarray(fcf_roic_caps, dtype= float).reshape(-1, 1))
+    return invested_capital[:, None, :] * fcf_roic[None, :, :]
+
+
+def price_target_surface(fcf_grid: np.ndarray, quarters: list, year: int, multiples, shares) -> np.ndarray:
+    """ Price per share of every scenario: FcF of the projected quarters of year times a multiple, divided by a share count.
+
+    Args:
+        fcf_grid (np.ndarray): projected FcF with quarters on the last axis, e.g. project_fcf_grid output.
+        quarters (list): labels of the projected quarters.
+        year (int): target year, e.g. 2030.
+        multiples (_type_): price to FcF multiples.
+        shares (_type_): share counts (millions).
+
+    Raises:
+        Exception: year is not projected.
+
+    Returns:
+        np.ndarray: float array of shape fcf_grid.shape[:-1] + (len(multiples), len(shares)).
+    """
+    in_year = QuarterIndex.from_labels(quarters).years == year
+    if not in_year.any():
+        raise Exception('Year {} is not in projected quarters {} - {}'.format(year, quarters[0], quarters[-1]))
+    yearly_fcf = fcf_grid[..., in_year].sum(axis= -1)
+    multiples, shares = np.asarray(multiples, dtype= float), np.asarray(shares, dtype= float)
+    return yearly_fcf[..., None, None] * multiples[:, None] / shares[None, :]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.sensitivity import FCF_ROIC_CAP
+
+# Monte Carlo projection of free cash flow. As in CompanyFinancials.projected_fcf, projected FcF is invested capital times FcF ROIC
+# (capped), both compounding from a starting value; here every path draws the growth rate of each projected quarter from the
+# recent trailing twelve month rates of change (bootstrap) instead of repeating the latest one. All paths are simulated at once as
+# a (paths, quarters) array, very large runs can be split across worker processes with independent random streams. Usage:
+#   bands = simulate_fcf_percentiles(23000, ic_rates, 0.1, roic_rates, n_paths= 10000, seed= 0)
+
+PERCENTILES = [5, 50, 95]
+
+
+def sample_growth(rates, n_paths: int, n_quarters: int, rng: np.random.Generator) -> np.ndarray:
+    """ Cumulative growth factors of random paths. Every quarter after the first one grows by a rate (in %) drawn from rates.
+
+    Args:
+        rates (_type_): historical rates of change in %. NaN values are ignored.
+        n_paths (int): number of paths.
+        n_quarters (int): number of quarters, the first one has factor 1.
+        rng (np.random.Generator): random generator.
+
+    Returns:
+        np.ndarray: float array of shape (n_paths, n_quarters).
+    """
+    rates = np.asarray(rates, dtype= float)
+    rates = rates[~np.isnan(rates)]
+    if len(rates) == 0:
+        rates = np.zeros(1)
+    growth = np.ones((n_paths, n_quarters))
+    if n_quarters > 1:
+        # A quarter can not lose more than everything.
+        factors = np.maximum(1 + rng.choice(rates, size= (n_paths, n_quarters - 1)) / 100, 0)
+        np.cumprod(factors, axis= 1, out= growth[:, 1:])
+    return growth
+
+
+def simulate_fcf_paths(invested_capital_start: float, invested_capital_rates, fcf_roic_start: float, fcf_roic_rates, n_quarters: int = 41,
+                       n_paths: int = 10000, seed = None, cap: float = FCF_ROIC_CAP) -> np.ndarray:
+    """ Projected FcF paths.
+
+    Args:
+        invested_capital_start (float): invested capital of the first projected quarter.
+        invested_capital_rates (_type_): historical invested capital rates of change in %.
+        fcf_roic_start (float): FcF ROIC of the first projected quarter.
+        fcf_roic_rates (_type_): historical FcF ROIC rates of change in %.
+        n_quarters (int, optional): projected quarters. Defaults to 41.
+        n_paths (int, optional): number of paths. Defaults to 10000.
+        seed (_type_, optional): int or np.random.SeedSequence. Defaults to None.
+        cap (float, optional): maximum FcF ROIC. Defaults to FCF_ROIC_CAP.
+
+    Returns:
+        np.ndarray: float array of shape (n_paths, n_quarters).
+    """
+    rng = np.random.default_rng(seed)
+    invested_capital = invested_capital_start * sample_growth(invested_capital_rates, n_paths, n_quarters, rng)
+    fcf_roic = np.minimum(fcf_roic_start * sample_growth(fcf_roic_rates, n_paths, n_quarters, rng), cap)
+    return invested_capital * fcf_roic
+
+
+def simulate_fcf_percentiles(invested_capital_start: float, invested_capital_rates, fcf_roic_start: float, fcf_roic_rates, n_quarters: int = 41,
+                             n_paths: int = 10000, seed = None, cap: float = FCF_ROIC_CAP, percentiles: list = PERCENTILES, workers: int = 1) -> np.ndarray:
+    """ Percentile bands of projected FcF per quarter (see simulate_fcf_paths).
+
+    Args:
+        percentiles (list, optional): Defaults to PERCENTILES.
+        workers (int, optional): processes sharing the paths, 0 for one per cpu. Results with the same seed depend on the number
+            of workers. Defaults to 1.
+
+    Returns:
+        np.ndarray: float array of shape (len(percentiles), n_quarters).
+    """
+    args = (invested_capital_start, invested_capital_rates, fcf_roic_start, fcf_roic_rates, n_quarters)
+    workers = min(workers or os.cpu_count() or 1, n_paths)
+    if workers <= 1:
+        paths = simulate_fcf_paths(*args, n_paths= n_paths, seed= seed, cap= cap)
+    else:
+        chunks = [len(c) for c in np.array_split(np.arange(n_paths), workers)]
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        with ProcessPoolExecutor(max_workers= workers) as executor:
+            futures = [executor.submit(simulate_fcf_paths, *args, n_paths= n, seed= s, cap= cap) for n, s in zip(chunks, seeds)]
+            paths = np.concatenate([future.result() for future in futures])
+    return np.percentile(paths, percentiles, axis= 0)
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import os
+import sys
+import time
+import inspect
+import argparse
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import CompanyFinancials
+from pipeline.companies import registry, run_universe, print_progress
+from pipeline.materialize import load_financials, metric_key, TIMESCALES
+from utils.utils import ColumnarFrame, QuarterIndex, rolling_window, unpack_cursor_object_multiple, encode_json
+
+# Streaming computation of metrics over long histories. A collection is read in batches (see CompanyDataInterface.iter_batches)
+# and every batch flows through chained generator stages (trailing window, growth, ratio, yearly sum). A stage holds back only
+# the rows whose result still depends on older quarters: n_periods - 1 rows for a trailing window, one row for a growth rate, the
+# quarters of one year for a yearly sum. Memory is bounded by the batch size, whatever the length of the history or the number of
+# companies, and results are the same as the getters of CompanyFinancials. Batches are ColumnarFrame objects sorted from newest
+# to oldest quarter, as the collections. Usage:
+#   for frame in growth_stage(stream_timescaled(interface, 'statement_operations', ['TotalRevenues', 'date'], 'TTM'), 'TotalRevenues'): ...
+#   python -m pipeline.streaming tesla --output backfill/
+
+STREAM_BATCH_SIZE = 128
+# Getters with a streaming counterpart: stage applied after the timescale (None, 'growth' or 'ratio'). The collection and keys
+# are the getter defaults of the company class.
+STREAM_METRICS = {
+    'get_revenue': None, 'get_gross_profit': None, 'get_income_ops': None, 'get_net_income': None, 'get_adj_ebitda': None,
+    'get_gross_profit_margin': 'ratio', 'get_income_ops_margin': 'ratio', 'get_net_income_margin': 'ratio',
+    'get_current_ratio': 'ratio', 'get_equity_ratio': 'ratio',
+    'get_revenue_growth': 'growth', 'get_gross_profit_growth': 'growth', 'get_income_ops_growth': 'growth',
+    'get_net_income_growth': 'growth', 'get_adj_ebitda_growth': 'growth',
+}
+
+
+def stream_collection(interface: object, collection: str, keys: list, batch_size: int = STREAM_BATCH_SIZE) -> object:
+    """ Batches of a collection projected on keys.
+
+    Args:
+        interface (object): CompanyDataInterface instance.
+        collection (str): collection name.
+        keys (list): keys/fields to read.
+        batch_size (int, optional): rows per batch. Defaults to STREAM_BATCH_SIZE.
+
+    Returns:
+        object: generator of ColumnarFrame.
+    """
+    for cursor in interface.iter_batches(collection, keys, batch_size):
+        unpacked_data = unpack_cursor_object_multiple(cursor, keys)
+        if len(unpacked_data) > 0:
+            yield ColumnarFrame.from_dict(unpacked_data)
+
+
+def integer_keys(interface: object, collection: str, keys: list, batch_size: int = STREAM_BATCH_SIZE) -> list:
+    """ Keys whose values are integers in every row of a collection, the columns _to_timescaled_dict rolls for 'TTM'. Found with
+    a first pass over the batches: a column holding floats or missing values in any batch is not rolled.
+
+    Args:
+        interface (object): CompanyDataInterface instance.
+        collection (str): collection name.
+        keys (list): keys/fields to check.
+        batch_size (int, optional): rows per batch. Defaults to STREAM_BATCH_SIZE.
+
+    Returns:
+        list: integer keys, in keys order.
+    """
+    integer, n_batches = set(keys), 0
+    for frame in stream_collection(interface, collection, keys, batch_size):
+        integer = {k for k in integer if k in frame and frame[k].dtype.kind in 'iu'}
+        n_batches += 1
+    return [k for k in keys if k in integer] if n_batches > 0 else []
+
+
+def _lookahead(batches, n_rows: int) -> object:
+    # Pairs (frame, n_ready): rows held back from previous batches followed by the next batch. The n_ready first rows of frame
+    # have their n_rows older quarters in frame; at the end of the stream the held back rows are released as they are.
+    held = None
+    for batch in batches:
+        frame = batch if held is None else ColumnarFrame.concat([held, batch])
+        n_ready = max(len(frame) - n_rows, 0)
+        held = frame.take(slice(n_ready, None))
+        yield frame, n_ready
+    if held is not None and len(held) > 0:
+        yield held, len(held)
+
+
+def ttm_stage(batches, keys: list, n_periods: int = 4, names: list = None) -> object:
+    """ Add the trailing window mean of some columns (min_periods= 1, as _to_timescaled_dict). New columns go first.
+
+    Args:
+        batches (_type_): iterable of ColumnarFrame.
+        keys (list): columns to roll.
+        n_periods (int, optional): window length. Defaults to 4.
+        names (list, optional): new column names. Defaults to 'TTM' + key.
+
+    Returns:
+        object: generator of ColumnarFrame.
+    """
+    names = names or ['TTM' + k for k in keys]
+    for frame, n_ready in _lookahead(batches, n_periods - 1):
+        if n_ready == 0:
+            continue
+        ready = frame.take(slice(0, n_ready))
+        if len(keys) > 0:
+            values = rolling_window(np.column_stack([frame[k] for k in keys]), n_periods, min_periods= 1)
+            for i, name in enumerate(names):
+                ready.insert(i, name, values[:n_ready, i])
+        yield ready
+
+
+def growth_stage(batches, key: str, name: str = 'GrowthRatio', absolute: bool = True) -> object:
+    """ Add the % change of a column with respect to the previous (older) quarter, as _get_growth_metric_dict. The new column goes
+    last.
+
+    Args:
+        batches (_type_): iterable of ColumnarFrame.
+        key (str): column name.
+        name (str, optional): new column name. Defaults to 'GrowthRatio'.
+        absolute (bool, optional): divide by the absolute previous value (growth) or by the previous value (rate of change, as
+            _compute_rate_invested_capital). Defaults to True.
+
+    Returns:
+        object: generator of ColumnarFrame.
+    """
+    for frame, n_ready in _lookahead(batches, 1):
+        if n_ready == 0:
+            continue
+        previous = frame.shift(key)
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            change = (frame[key] - previous) / (np.abs(previous) if absolute else previous) * 100
+        ready = frame.take(slice(0, n_ready))
+        ready[name] = change[:n_ready]
+        yield ready
+
+
+def ratio_stage(batches, numerator: str = None, denominator: str = None, name: str = None) -> object:
+    """ Add the ratio of two columns, as _add_ratio_metric_to_dict. Stateless.
+
+    Args:
+        batches (_type_): iterable of ColumnarFrame.
+        numerator (str, optional): Defaults to the first column.
+        denominator (str, optional): Defaults to the second column.
+        name (str, optional): new column name. Defaults to 'Ratio' + numerator + '/' + denominator.
+
+    Returns:
+        object: generator of ColumnarFrame.
+    """
+    for frame in batches:
+        keys = frame.columns
+        numerator_key, denominator_key = numerator or keys[0], denominator or keys[1]
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            ratio = np.asarray(frame[numerator_key], dtype= float) / np.asarray(frame[denominator_key], dtype= float)
+        frame[name or 'Ratio' + numerator_key + '/' + denominator_key] = ratio
+        yield frame
+
+
+def yearly_stage(batches, date_key: str = 'date') -> object:
+    """ Sum quarters by year, as _to_timescaled_dict with timescale 'YoY'. Quarters of a year must be consecutive rows, which holds
+    for data sorted by quarter.
+
+    Args:
+        batches (_type_): iterable of ColumnarFrame.
+        date_key (str, optional): quarter label column, replaced by 'Year'. Defaults to 'date'.
+
+    Returns:
+        object: generator of ColumnarFrame with 'Year' first.
+    """
+    def group(frame, years):
+        frame['Year'] = years
+        return frame.drop([date_key]).group_sum('Year')
+    held = None
+    for batch in batches:
+        frame = batch if held is None else ColumnarFrame.concat([held, batch])
+        years = QuarterIndex.from_labels(frame[date_key]).years
+        # The oldest year of the frame may go on in the next batch.
+        n_ready = len(frame) - int(np.count_nonzero(years == years[-1]))
+        held = frame.take(slice(n_ready, None))
+        if n_ready > 0:
+            yield group(frame.take(slice(0, n_ready)), years[:n_ready])
+    if held is not None and len(held) > 0:
+        yield group(held, QuarterIndex.from_labels(held[date_key]).years)
+
+
+def stream_timescaled(interface: object, collection: str, keys: list, timescale: str = 'QoQ', batch_size: int = STREAM_BATCH_SIZE,
+                      ttm_keys: list = None) -> object:
+    """ Streaming counterpart of CompanyFinancials._parse_to_timescaled_dict.
+
+    Args:
+        interface (object): CompanyDataInterface instance.
+        collection (str): collection name.
+        keys (list): keys/fields to read.
+        timescale (str, optional): 'QoQ', 'YoY' or 'TTM'. Defaults to 'QoQ'.
+        batch_size (int, optional): rows per batch. Defaults to STREAM_BATCH_SIZE.
+        ttm_keys (list, optional): columns rolled for 'TTM'. Defaults to integer_keys, at the cost of a first pass over the
+            collection.
+
+    Raises:
+        TypeError: wrong timescale.
+
+    Returns:
+        object: generator of ColumnarFrame.
+    """
+    if timescale == 'QoQ':
+        return stream_collection(interface, collection, keys, batch_size)
+    elif timescale == 'YoY':
+        return yearly_stage(stream_collection(interface, collection, keys, batch_size))
+    elif timescale == 'TTM':
+        if ttm_keys is None:
+            ttm_keys = integer_keys(interface, collection, keys, batch_size)
+        return ttm_stage(stream_collection(interface, collection, keys, batch_size), ttm_keys)
+    raise TypeError('Timescale specified is not contemplated. Please enter "QoQ", "YoY" or "TTM"')
+
+
+def stream_metric(financials: CompanyFinancials, method: str, timescale: str = None, batch_size: int = STREAM_BATCH_SIZE) -> object:
+    """ Streaming counterpart of a getter of STREAM_METRICS, read with its default collection and keys.
+
+    Args:
+        financials (CompanyFinancials): company instance.
+        method (str): getter name, e.g. 'get_revenue_growth'.
+        timescale (str, optional): Defaults to the getter default ('QoQ' for getters without timescale).
+        batch_size (int, optional): rows per batch. Defaults to STREAM_BATCH_SIZE.
+
+    Raises:
+        Exception: getter without streaming counterpart or without default collection and keys.
+
+    Returns:
+        object: generator of ColumnarFrame.
+    """
+    if method not in STREAM_METRICS:
+        raise Exception('Getter {} has no streaming counterpart. Please enter one of: {}'.format(method, ', '.join(STREAM_METRICS)))
+    parameters = inspect.signature(getattr(financials, method)).parameters
+    collection, keys = parameters['collection'].default, parameters['keys'].default
+    if not isinstance(collection, str) or not keys:
+        raise Exception('Getter {} of {} has no default collection and keys'.format(method, financials.company_name))
+    if timescale is None:
+        timescale = parameters['timescale'].default if 'timescale' in parameters else 'QoQ'
+    batches = stream_timescaled(financials._db_interface, collection, keys, timescale, batch_size)
+    if STREAM_METRICS[method] == 'growth':
+        return growth_stage(batches, keys[0])
+    if STREAM_METRICS[method] == 'ratio':
+        return ratio_stage(batches)
+    return batches
+
+
+def collect(batches) -> dict:
+    """ Concatenate a stream into a dict of lists, the layout returned by getters.
+
+    Returns:
+        dict: _description_
+    """
+    return ColumnarFrame.concat(list(batches)).to_dict()
+
+
+def write_ndjson(batches, f, metric: str = None) -> int:
+    """ Write every row of a stream as a JSON line, batch after batch. Non finite values are written as null.
+
+    Args:
+        batches (_type_): iterable of ColumnarFrame.
+        f (_type_): text file object.
+        metric (str, optional): value of a 'metric' field added to every row. Defaults to None.
+
+    Returns:
+        int: number of rows written.
+    """
+    n_rows = 0
+    for frame in batches:
+        columns = frame.to_dict()
+        for row in zip(*columns.values()):
+            document = dict(zip(columns, row))
+            f.write(encode_json(document if metric is None else dict({'metric': metric}, **document)).decode('utf-8') + '\n')
+        n_rows += len(frame)
+    return n_rows
+
+
+def run_job(company: str, host: str = None, database: str = None, output: str = None, methods: list = None, timescales: list = None,
+            batch_size: int = STREAM_BATCH_SIZE) -> dict:
+    """ Stream every metric of STREAM_METRICS of one company to a <company>_backfill.ndjson file. Runs in a worker process of
+    backfill().
+
+    Returns:
+        dict: summary with company, metrics, rows, target and elapsed seconds.
+    """
+    started = time.perf_counter()
+    financials = load_financials(company, host, database)
+    path = os.path.join(output, '{}_backfill.ndjson'.format(company.lower())) if os.path.isdir(output) else output
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    n_metrics, n_rows = 0, 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for method in methods or STREAM_METRICS:
+            has_timescale = 'timescale' in inspect.signature(getattr(financials, method)).parameters
+            for timescale in (timescales or TIMESCALES) if has_timescale else [None]:
+                n_rows += write_ndjson(stream_metric(financials, method, timescale, batch_size), f, metric_key(method, timescale))
+                n_metrics += 1
+    os.replace(tmp_path, path)
+    return {'company': company, 'metrics': n_metrics, 'rows': n_rows, 'target': path, 'seconds': time.perf_counter() - started}
+
+
+def backfill(companies: list, host: str = None, database: str = None, output: str = None, workers: int = None, batch_size: int = STREAM_BATCH_SIZE,
+             progress = None) -> list:
+    """ Backfill several companies in parallel worker processes (see pipeline.companies.run_universe).
+
+    Returns:
+        list: run_job summaries in the same order as companies.
+    """
+    results = run_universe(companies, run_job, workers= workers, progress= progress, host= host, database= database, output= output, batch_size= batch_size)
+    return [results[registry.get(c).ticker] for c in companies]
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description= 'Stream company metrics over the full history to NDJSON files with bounded memory.')
+    parser.add_argument('companies', nargs= '*', help= 'tickers: {}. Defaults to every registered company'.format(', '.join(registry.tickers)))
+    parser.add_argument('--host', default= None, help= 'data host url (mongodb://... or file://folder). Defaults to company default')
+    parser.add_argument('--database', default= None, help= 'database name. Defaults to company default')
+    parser.add_argument('--output', required= True, help= 'NDJSON file or folder')
+    parser.add_argument('--workers', type= int, default= None, help= 'parallel processes. Defaults to number of cpus')
+    parser.add_argument('--batch-size', type= int, default= STREAM_BATCH_SIZE, help= 'rows read per batch')
+    args = parser.parse_args(argv)
+    for summary in backfill(args.companies or registry.tickers, args.host, args.database, args.output, args.workers, args.batch_size, print_progress):
+        if 'error' in summary:
+            print('[{ticker}] failed: {error}'.format(**summary))
+        else:
+            print('[{company}] {metrics} metrics, {rows} rows -> {target} in {seconds:.2f}s'.format(**summary))
+
+if __name__ == '__main__':
+    main()
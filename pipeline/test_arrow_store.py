@@ -0,0 +1,68 @@
+# GLOBAL IMPORTS
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.materialize import MaterializedFinancials, materialize_company, read_metrics_file, run_job
+from pipeline.arrow_store import series_kind, bundle_to_columns
+
+
+class TestArrowStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        return super().setUp()
+
+    def test_series_kinds(self):
+        self.assertEqual([series_kind(v) for v in [[1, 2], [0.5, np.nan], ['3Q22'], [1, 0.5], [1, None], [True], [], [[1], [2]]]],
+                         ['int', 'float', 'str', 'json', 'json', 'json', 'json', 'json'])
+        columns, metadata = bundle_to_columns({'company': 'Tesla', 'created': None,
+                                               'metrics': {'get_revenue:QoQ': {'versions': {'statement_operations': 1}, 'data': {'TotalRevenues': [2, 1], 'date': ['3Q22', '2Q22']}}}})
+        self.assertEqual(columns['kind'], ['int', 'str'])
+        self.assertEqual(columns['int_values'], [[2, 1], None])
+        self.assertEqual(metadata['company'], 'Tesla')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_round_trip(self):
+        result = materialize_company(self.tesla_financial)
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        for format in ['arrow', 'parquet']:
+            summary = run_job('tesla', host= 'file://db/tesla', output= folder, format= format)
+            self.assertTrue(summary['target'].endswith('.' + format))
+            stored = read_metrics_file(summary['target'])
+            self.assertEqual(stored['company'], result['company'])
+            self.assertEqual(list(stored['metrics']), list(result['metrics']))
+            for key, entry in result['metrics'].items():
+                self.assertEqual(stored['metrics'][key]['versions'], entry['versions'])
+                for name, values in entry['data'].items():
+                    if isinstance(values[0], str):
+                        self.assertEqual(stored['metrics'][key]['data'][name], values)
+                    else:
+                        np.testing.assert_array_equal(stored['metrics'][key]['data'][name], values)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_materialized_financials_read_mapped_file(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        run_job('tesla', host= 'file://db/tesla', output= folder, format= 'arrow')
+        self.assertEqual(os.listdir(folder), ['tesla_metrics.arrow'])
+        materialized = MaterializedFinancials(TeslaFinancials(host= 'file://db/tesla'), folder)
+        revenue = materialized.get_revenue(timescale= 'TTM')
+        self.assertDictEqual(revenue, self.tesla_financial.get_revenue(timescale= 'TTM'))
+        self.assertIsInstance(revenue['TotalRevenues'][0], int)
+        self.assertDictEqual(materialized.get_fcf_roic(), self.tesla_financial.get_fcf_roic())
+        self.assertEqual(materialized.served, 2)
+
+if __name__ == '__main__':
+    unittest.main()
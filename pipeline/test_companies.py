@@ -0,0 +1,63 @@
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.companies import CompanyDefinition, registry, run_universe, compute_bundle
+
+
+class TestCompanyUniverse(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Copy of the Tesla data using other field names for revenue and net income.
+        cls.folder = tempfile.mkdtemp()
+        cls.fields = {'TotalRevenues': 'Revenue', 'NetIncome': 'NetIncomeLoss'}
+        for file_name in os.listdir('db/tesla'):
+            if file_name.endswith('.json'):
+                with open(os.path.join('db/tesla', file_name), 'r', encoding='utf-8') as f:
+                    documents = [{cls.fields.get(k, k): v for k, v in doc.items()} for doc in json.load(f)]
+                with open(os.path.join(cls.folder, file_name), 'w', encoding='utf-8') as f:
+                    json.dump(documents, f)
+        registry.register(CompanyDefinition('tsla_file', 'Tesla file', 'file://db/tesla', 'tesla_db'))
+        registry.register(CompanyDefinition('tsla_mapped', 'Tesla mapped', 'file://' + cls.folder, 'tesla_db', fields= cls.fields))
+
+    def test_mapped_company_matches_tesla(self):
+        tesla = TeslaFinancials(host= 'file://db/tesla')
+        mapped = registry.get('tsla_mapped').create()
+        self.assertDictEqual(mapped.get_revenue(timescale= 'TTM'), tesla.get_revenue(timescale= 'TTM'))
+        self.assertDictEqual(mapped.get_return_on_assets(timescale= 'YoY'), tesla.get_return_on_assets(timescale= 'YoY'))
+
+    def test_runner_across_processes(self):
+        progress = []
+        bundle = [('fcf_roic', 'TTM'), ('net_income_margin', 'QoQ')]
+        results = run_universe(['tsla_file', 'tsla_mapped'], workers= 2, chunk_size= 1,
+                               progress= lambda done, total, chunk: progress.append(done), bundle= bundle)
+        self.assertEqual(results['tsla_mapped'], compute_bundle('tsla_file', bundle))
+        self.assertEqual(progress, [1, 2])
+
+    def test_failing_company_is_reported(self):
+        registry.register(CompanyDefinition('broken', 'Broken', 'file://' + os.path.join(self.folder, 'missing'), 'missing_db'))
+        results = run_universe(['broken', 'tsla_file'], workers= 1, bundle= [('revenue', 'QoQ')])
+        self.assertIn('error', results['broken'])
+        self.assertEqual(results['broken']['ticker'], 'broken')
+        self.assertIn('revenue:QoQ', results['tsla_file'])
+
+    def test_instance_is_shared(self):
+        tesla = registry.instance('tsla_file')
+        self.assertIs(registry.instance('TSLA_FILE'), tesla)
+        registry.register(CompanyDefinition('tsla_file', 'Tesla file', 'file://db/tesla', 'tesla_db'))
+        self.assertIsNot(registry.instance('tsla_file'), tesla)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.folder)
+
+if __name__ == '__main__':
+    unittest.main()
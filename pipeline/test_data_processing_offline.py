@@ -0,0 +1,142 @@
+# GLOBAL IMPORTS
+import sys
+import json
+import asyncio
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.metric_graph import MetricGraph
+from pipeline.memo import MetricCache, metric_cache
+from utils.utils import DtypePolicy
+
+# Same checks as test_data_processing.py but against the JSON seed files in db/tesla, so they run without a MongoDb host.
+
+class TestTeslaFinancialsOffline(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        return super().setUp()
+
+    def test_get_revenue(self):
+        self.assertEqual(type(self.tesla_financial.get_revenue()), dict)
+        self.assertDictEqual(self.tesla_financial.get_revenue(), {'TotalRevenues': [21454, 16934, 18756, 17719, 13757, 11958, 10389, 10744, 8771, 6036, 5985, 7384, 6303, 6350, 4541], 'date': ['3Q22', '2Q22', '1Q22', '4Q21', '3Q21', '2Q21', '1Q21', '4Q20', '3Q20', '2Q20', '1Q20', '4Q19', '3Q19', '2Q19', '1Q19']}
+        )
+
+    def test_get_revenue_yoy(self):
+        data = self.tesla_financial.get_revenue(timescale= 'YoY')
+        self.assertEqual(data['Year'], [2022, 2021, 2020, 2019])
+        self.assertEqual(data['TotalRevenues'], [57144, 53823, 31536, 24578])
+
+    def test_latest_outstanding_shares(self):
+        self.tesla_financial.invalidate_cache()
+        self.tesla_financial._db_interface.query_stats.reset()
+        latest = self.tesla_financial.get_outstanding_shares(last_n= 1)
+        self.assertDictEqual(latest, {k: v[:1] for k, v in self.tesla_financial.get_outstanding_shares().items()})
+        operations = [q['operation'] for q in self.tesla_financial._db_interface.query_stats.snapshot()['queries']]
+        self.assertIn('find_values_for_quarter_range', operations)
+
+    def test_get_fcf(self):
+        data = self.tesla_financial.get_fcf()
+        self.assertEqual(data['FcF'][0], 5100 - 1803)
+    def test_async_getters_match_sync(self):
+        for timescale in ['QoQ', 'TTM', 'YoY']:
+            self.assertDictEqual(asyncio.run(self.tesla_financial.aget_return_on_assets(timescale= timescale)), self.tesla_financial.get_return_on_assets(timescale= timescale))
+            self.assertDictEqual(asyncio.run(self.tesla_financial.aget_fcf_roic(timescale= timescale)), self.tesla_financial.get_fcf_roic(timescale= timescale))
+        revenue, = asyncio.run(self.tesla_financial.aget_metrics([('get_revenue', {'timescale': 'QoQ'})]))
+        self.assertDictEqual(revenue, self.tesla_financial.get_revenue())
+
+    def test_metric_graph_matches_getters(self):
+        requests = [('invested_capital', 'TTM'), ('fcf_roic', 'TTM'), ('nopat_roic', 'TTM'), ('return_on_assets', 'YoY')]
+        results = self.tesla_financial.evaluate_metrics(requests)
+        # Statement of operations, balance sheet and cash flow are fetched once each.
+        self.assertEqual(self.tesla_financial.metric_graph.last_fetches, 3)
+        self.assertDictEqual(results[0], self.tesla_financial.get_invested_capital(timescale= 'TTM'))
+        self.assertDictEqual(results[2], self.tesla_financial.get_nopat_roic(timescale= 'TTM'))
+        self.assertDictEqual(results[3], self.tesla_financial.get_return_on_assets(timescale= 'YoY'))
+
+    def test_metric_graph_rejects_cycles(self):
+        graph = MetricGraph()
+        graph.add_metric('a', lambda timescale, b: b, ['b'])
+        graph.add_metric('b', lambda timescale, a: a, ['a'])
+        with self.assertRaises(Exception):
+            graph.resolve([('a', 'QoQ')])
+
+class TestMetricCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        self.tesla_financial.invalidate_cache()
+        return super().setUp()
+
+    def test_repeated_call_is_a_hit(self):
+        hits = metric_cache.stats()['hits']
+        first = self.tesla_financial.get_fcf_roic(timescale= 'TTM')
+        self.assertDictEqual(TeslaFinancials(host= 'file://db/tesla').get_fcf_roic(timescale= 'TTM'), first)
+        self.assertEqual(metric_cache.stats()['hits'], hits + 1)
+
+    def test_results_are_private_copies(self):
+        self.tesla_financial.get_revenue()['TotalRevenues'][0] = 0
+        self.assertEqual(self.tesla_financial.get_revenue()['TotalRevenues'][0], 21454)
+
+    def test_invalidation_by_collection(self):
+        self.tesla_financial.get_revenue()
+        self.tesla_financial.get_fcf()
+        self.tesla_financial.invalidate_cache('cash_flow')
+        misses = metric_cache.stats()['misses']
+        self.tesla_financial.get_revenue()
+        self.tesla_financial.get_fcf()
+        self.assertEqual(metric_cache.stats()['misses'], misses + 1)
+
+    def test_financials_in_json(self):
+        document = json.loads(self.tesla_financial.financials_in_json)
+        self.assertEqual(document['company'], 'Tesla')
+        self.assertDictEqual(document['metrics']['get_revenue:TTM']['data'], self.tesla_financial.get_revenue(timescale= 'TTM'))
+        self.assertEqual(document['metrics']['get_fcf:QoQ']['versions'], {'cash_flow': self.tesla_financial._db_interface.get_collection_version('cash_flow')})
+        body, etag = self.tesla_financial.encoded_financials()
+        hits = metric_cache.stats()['hits']
+        self.assertEqual(TeslaFinancials(host= 'file://db/tesla').encoded_financials(), (body, etag))
+        self.assertEqual(metric_cache.stats()['hits'], hits + 1)
+
+    def test_encoded_financials_follow_source_collections(self):
+        body, etag = self.tesla_financial.encoded_financials()
+        self.tesla_financial.invalidate_cache('cash_flow')
+        misses = metric_cache.stats()['misses']
+        self.assertEqual(self.tesla_financial.encoded_financials(), (body, etag))
+        self.assertGreater(metric_cache.stats()['misses'], misses)
+
+    def test_lru_size_bound(self):
+        cache = MetricCache(max_bytes= 2000)
+        for i in range(10):
+            cache.put(('owner', 'get', i), {'values': list(range(20))}, {})
+        self.assertLessEqual(cache.stats()['bytes'], 2000)
+        self.assertGreater(cache.stats()['evictions'], 0)
+        self.assertFalse(cache.get(('owner', 'get', 0), lambda c: None)[0])
+        self.assertTrue(cache.get(('owner', 'get', 9), lambda c: None)[0])
+
+    def test_compact_storage_keeps_results(self):
+        result = self.tesla_financial.get_revenue_growth(timescale= 'TTM')
+        compact, plain = MetricCache(policy= DtypePolicy()), MetricCache(policy= DtypePolicy(integer= None, floating= None, quarter_labels= False))
+        for cache in [compact, plain]:
+            cache.put(('owner', 'get', 0), result, {})
+            stored = cache.get(('owner', 'get', 0), lambda c: None)[1]
+            self.assertEqual(list(stored), list(result))
+            for key in result:
+                np.testing.assert_array_equal(stored[key], result[key])
+                self.assertEqual([type(v) for v in stored[key]], [type(v) for v in result[key]])
+        self.assertLess(compact.stats()['bytes'], plain.stats()['bytes'])
+
+    def test_lossy_float_policy_precision(self):
+        cache = MetricCache(policy= DtypePolicy(float_rtol= 1e-6))
+        for timescale in ['QoQ', 'TTM', 'YoY']:
+            result = self.tesla_financial.get_gross_profit_margin(timescale= timescale)
+            cache.put(('owner', timescale), result, {})
+            stored = cache.get(('owner', timescale), lambda c: None)[1]
+            for key in result:
+                if not isinstance(result[key][0], str):
+                    np.testing.assert_allclose(stored[key], result[key], rtol= 1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.materialize import MaterializedFinancials, materialize_company, write_metrics_file, read_metrics_file
+from pipeline.incremental import update_company, splice, run_job, NotAppendOnly
+from utils.utils import quarter_label_to_ordinal
+
+
+class TestIncrementalUpdate(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Company folder without the newest quarter, materialized before the quarter lands.
+        self.folder = tempfile.mkdtemp()
+        self._write_folder(drop= 1)
+        self.stored = materialize_company(TeslaFinancials(host= 'file://' + self.folder))
+        return super().setUp()
+
+    def _write_folder(self, drop: int = 0, restate: str = None) -> None:
+        for file_name in os.listdir('db/tesla'):
+            if file_name.endswith('.json'):
+                with open(os.path.join('db/tesla', file_name), 'r', encoding='utf-8') as f:
+                    documents = sorted(json.load(f), key= lambda doc: -quarter_label_to_ordinal(doc['date']))[drop:]
+                for doc in documents:
+                    if doc['date'] == restate and 'TotalRevenues' in doc:
+                        doc['TotalRevenues'] += 1
+                with open(os.path.join(self.folder, file_name), 'w', encoding='utf-8') as f:
+                    json.dump(documents, f)
+
+    def _assert_results_equal(self, result, expected):
+        for key, entry in expected['metrics'].items():
+            for column, values in entry['data'].items():
+                if column in ['date', 'Quarter']:
+                    self.assertEqual(result['metrics'][key]['data'][column], values)
+                else:
+                    np.testing.assert_allclose(np.array(result['metrics'][key]['data'][column], dtype= float), np.array(values, dtype= float), rtol= 1e-9, err_msg= key)
+
+    def test_appended_quarter_matches_full_recompute(self):
+        self._write_folder()
+        financials = TeslaFinancials(host= 'file://' + self.folder)
+        financials._db_interface.invalidate_snapshots()
+        result, counters = update_company(financials, self.stored)
+        self.assertEqual(counters['incremental'], len(result['metrics']))
+        self._assert_results_equal(result, materialize_company(TeslaFinancials(host= 'file://db/tesla', memoize= False)))
+
+    def test_restated_quarter_is_fully_recomputed(self):
+        self._write_folder(restate= '2Q22')
+        financials = TeslaFinancials(host= 'file://' + self.folder)
+        financials._db_interface.invalidate_snapshots()
+        result, counters = update_company(financials, self.stored)
+        self.assertGreater(counters['full'], 0)
+        self.assertEqual(result['metrics']['get_revenue:QoQ']['data']['TotalRevenues'][1], 16935)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_job_keeps_file_format(self):
+        output = tempfile.mkdtemp()
+        write_metrics_file(self.stored, output, 'arrow')
+        arrow_file = os.path.join(output, 'tesla_metrics.arrow')
+        write_metrics_file(self.stored, arrow_file)
+        self._write_folder()
+        TeslaFinancials(host= 'file://' + self.folder)._db_interface.invalidate_snapshots()
+        for target in [output, arrow_file]:
+            summary = run_job('tesla', host= 'file://' + self.folder, output= target)
+            self.assertEqual(summary['target'], arrow_file)
+            self.assertEqual(os.listdir(output), ['tesla_metrics.arrow'])
+            self._assert_results_equal(read_metrics_file(arrow_file), materialize_company(TeslaFinancials(host= 'file://db/tesla', memoize= False)))
+        self.assertEqual(summary['unchanged'], len(self.stored['metrics']))
+        materialized = MaterializedFinancials(TeslaFinancials(host= 'file://' + self.folder), output)
+        self.assertDictEqual(materialized.get_revenue(), TeslaFinancials(host= 'file://db/tesla').get_revenue())
+        self.assertEqual(materialized.fallbacks, 0)
+        shutil.rmtree(output)
+
+    def test_splice_requires_newer_quarters(self):
+        stored = {'Revenue': [2, 1], 'date': ['2Q22', '1Q22']}
+        self.assertEqual(splice(stored, {'Revenue': [3, 2], 'date': ['3Q22', '2Q22']}), {'Revenue': [3, 2, 1], 'date': ['3Q22', '2Q22', '1Q22']})
+        with self.assertRaises(NotAppendOnly):
+            splice(stored, {'Revenue': [2, 1], 'date': ['2Q22', '1Q22']})
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main()
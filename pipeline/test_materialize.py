@@ -0,0 +1,64 @@
+# GLOBAL IMPORTS
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.materialize import MaterializedFinancials, run_job, read_metrics_file, write_metrics_file
+
+
+class TestMaterialize(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.summary = run_job('tesla', host= 'file://db/tesla', output= self.folder)
+        self.tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+        return super().tearDown()
+
+    def test_results_match_live_getters(self):
+        materialized = MaterializedFinancials(TeslaFinancials(host= 'file://db/tesla'), self.folder)
+        self.assertDictEqual(materialized.get_revenue(timescale= 'TTM'), self.tesla_financial.get_revenue(timescale= 'TTM'))
+        self.assertDictEqual(materialized.get_fcf_roic(), self.tesla_financial.get_fcf_roic())
+        self.assertDictEqual(materialized.get_current_ratio(), self.tesla_financial.get_current_ratio())
+        self.assertEqual(materialized.served, 3)
+        self.assertEqual(materialized.fallbacks, 0)
+
+    def test_file_is_strict_json(self):
+        with open(self.summary['target'], 'r', encoding='utf-8') as f:
+            text = f.read()
+        self.assertNotIn('NaN', text)
+        growth = json.loads(text, parse_constant= self.fail)['metrics']['get_revenue_growth:QoQ']['data']['GrowthRatio']
+        self.assertIsNone(growth[-1])
+        stored = read_metrics_file(self.summary['target'])['metrics']['get_revenue_growth:QoQ']['data']['GrowthRatio']
+        np.testing.assert_array_equal(stored, self.tesla_financial.get_revenue_growth()['GrowthRatio'])
+
+    def test_format_follows_file_extension(self):
+        result = read_metrics_file(self.summary['target'])
+        path = os.path.join(self.folder, 'copy.json')
+        self.assertEqual(write_metrics_file(result, path), path)
+        with self.assertRaises(TypeError):
+            write_metrics_file(result, path, 'arrow')
+
+    def test_stale_results_fall_back_to_live(self):
+        path = self.summary['target']
+        with open(path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        result['metrics']['get_revenue:QoQ']['versions']['statement_operations'] = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        materialized = MaterializedFinancials(TeslaFinancials(host= 'file://db/tesla'), path)
+        self.assertDictEqual(materialized.get_revenue(), self.tesla_financial.get_revenue())
+        self.assertEqual(materialized.fallbacks, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# GLOBAL IMPORTS
+import sys
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.panel import FinancialPanel
+
+
+class TestFinancialPanel(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        self.panel = FinancialPanel.from_financials({'tesla': self.tesla_financial})
+        return super().setUp()
+
+    def test_metrics_match_getters(self):
+        for timescale in ['QoQ', 'TTM']:
+            prefix = 'TTM' if timescale == 'TTM' else ''
+            revenue = self.tesla_financial.get_revenue(timescale= timescale)[prefix + 'TotalRevenues']
+            np.testing.assert_allclose(self.panel.evaluate('revenue', timescale)[0][0], revenue)
+            margin = self.tesla_financial.get_net_income_margin(timescale= timescale)['Ratio{0}NetIncome/{0}TotalRevenues'.format(prefix)]
+            np.testing.assert_allclose(self.panel.evaluate('net_income_margin', timescale)[0][0], margin)
+            invested_capital = self.tesla_financial.get_invested_capital(timescale= timescale)['InvestedCapital']
+            np.testing.assert_allclose(self.panel.evaluate('invested_capital', timescale)[0][0], invested_capital)
+        values, years = self.panel.evaluate('revenue', 'YoY')
+        self.assertEqual(years, [2022, 2021, 2020, 2019])
+        np.testing.assert_allclose(values[0], [57144, 53823, 31536, 24578])
+
+    def test_companies_align_on_quarters(self):
+        panel = FinancialPanel.from_dicts({'a': {'TotalRevenues': [30, 20, 10], 'GrossProfit': [3, 2, 1], 'date': ['3Q22', '2Q22', '1Q22']},
+                                           'b': {'TotalRevenues': [40, 10], 'GrossProfit': [20, 1], 'date': ['4Q22', '2Q22']}})
+        self.assertEqual(panel.quarters.labels(), ['4Q22', '3Q22', '2Q22', '1Q22'])
+        margins = panel.evaluate('gross_profit_margin')[0]
+        np.testing.assert_allclose(margins, [[np.nan, 0.1, 0.1, 0.1], [0.5, np.nan, 0.1, np.nan]])
+        latest = panel.latest(margins)
+        self.assertEqual(panel.rank(latest), ['b', 'a'])
+        self.assertEqual(panel.screen(latest > 0.2), ['b'])
+
+    def test_derived_fields(self):
+        self.panel['FcF'] = self.panel['NetCashOperatingActivities'] + self.panel['Capex']
+        self.assertEqual(self.panel['FcF'][0, 0], 5100 - 1803)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# GLOBAL IMPORTS
+import sys
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.sensitivity import project_fcf_grid, price_target_surface
+
+
+class TestSensitivityGrid(unittest.TestCase):
+
+    def test_grid_matches_scenario_loop(self):
+        rates, caps = [0, 2, 5], [0.1, 0.4]
+        grid = project_fcf_grid(1000, rates, 0.05, 30, caps, n_quarters= 8)
+        self.assertEqual(grid.shape, (3, 2, 8))
+        for r, rate in enumerate(rates):
+            for c, cap in enumerate(caps):
+                expected = [1000 * (1 + rate / 100)**i * min(0.05 * 1.3**i, cap) for i in range(8)]
+                np.testing.assert_allclose(grid[r, c], expected)
+
+    def test_price_target_surface(self):
+        grid = np.ones((2, 3, 8))
+        quarters = ['4Q22', '1Q23', '2Q23', '3Q23', '4Q23', '1Q24', '2Q24', '3Q24']
+        surface = price_target_surface(grid, quarters, 2023, [10, 20], [2, 4, 8])
+        self.assertEqual(surface.shape, (2, 3, 2, 3))
+        np.testing.assert_allclose(surface[0, 0], [[20, 10, 5], [40, 20, 10]])
+        with self.assertRaises(Exception):
+            price_target_surface(grid, quarters, 2030, [10], [1])
+
+    def test_projection_is_a_grid_scenario(self):
+        tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        projection = tesla_financial.projected_fcf()
+        rate = tesla_financial._get_rate_invested_capital()['RateTTM'][0]
+        result = tesla_financial.price_target_grid(shares= [3000, 6000], fcf_roic_caps= [0.4], invested_capital_rates= [rate], multiples= [35], year= 2025)
+        self.assertEqual(np.array(result['PriceTarget']).shape, (1, 1, 1, 2))
+        fcf_2025 = sum(fcf for fcf, quarter in zip(projection['FcFProjected'], projection['Quarter']) if quarter.endswith('25'))
+        np.testing.assert_allclose(result['PriceTarget'][0][0][0], [fcf_2025 * 35 / 3000, fcf_2025 * 35 / 6000])
+
+    def test_projection_starts_from_fcf_roic_mean(self):
+        tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        ratio = tesla_financial._get_rate_fcf_roic()['RatioFcF/InvestedCapital']
+        invested_capital = tesla_financial._get_rate_invested_capital()['InvestedCapital']
+        projection = tesla_financial.projected_fcf()
+        np.testing.assert_allclose(projection['FcFProjected'][0], np.mean(invested_capital[:4]) * np.mean(ratio[:4]))
+        # FcF ROIC is below the caps during the first projected year, so the cap does not scale its price target.
+        result = tesla_financial.price_target_grid(shares= [3000], fcf_roic_caps= [0.2, 0.4], invested_capital_rates= [0], multiples= [35], year= 2023)
+        low, high = np.array(result['PriceTarget'])[0, :, 0, 0]
+        self.assertLess(high, 2 * low)
+        self.assertGreater(high, low)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# GLOBAL IMPORTS
+import sys
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.simulation import sample_growth, simulate_fcf_paths, simulate_fcf_percentiles
+
+
+class TestFcfSimulation(unittest.TestCase):
+
+    def test_constant_rates_match_deterministic_formula(self):
+        paths = simulate_fcf_paths(1000, [10], 0.1, [50], n_quarters= 5, n_paths= 3, seed= 1)
+        expected = [1000 * 1.1**i * min(0.1 * 1.5**i, 0.4) for i in range(5)]
+        np.testing.assert_allclose(paths, np.tile(expected, (3, 1)))
+
+    def test_growth_factors(self):
+        growth = sample_growth([np.nan, -250], 4, 3, np.random.default_rng(0))
+        np.testing.assert_array_equal(growth, np.tile([1, 0, 0], (4, 1)))
+
+    def test_percentiles_are_ordered_and_reproducible(self):
+        args = (1000, [5, -3, 12, 8], 0.1, [20, -10, 4])
+        bands = simulate_fcf_percentiles(*args, n_paths= 2000, seed= 7)
+        self.assertEqual(bands.shape, (3, 41))
+        self.assertTrue((bands[0] <= bands[1]).all() and (bands[1] <= bands[2]).all())
+        np.testing.assert_array_equal(bands, simulate_fcf_percentiles(*args, n_paths= 2000, seed= 7))
+
+    def test_projected_fcf_bands(self):
+        tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        deterministic = tesla_financial.projected_fcf()
+        result = tesla_financial.projected_fcf(n_paths= 1000)
+        self.assertEqual(list(result), ['FcFProjected', 'FcFP5', 'FcFP50', 'FcFP95', 'Quarter'])
+        self.assertEqual(result['FcFProjected'], deterministic['FcFProjected'])
+        self.assertEqual(result['Quarter'], deterministic['Quarter'])
+        self.assertEqual(result['FcFP5'][0], result['FcFP95'][0])
+        self.assertAlmostEqual(result['FcFP50'][0], result['FcFProjected'][0])
+
+if __name__ == '__main__':
+    unittest.main()
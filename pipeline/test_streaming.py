@@ -0,0 +1,92 @@
+# GLOBAL IMPORTS
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.streaming import stream_metric, stream_timescaled, integer_keys, growth_stage, ttm_stage, collect, run_job
+from utils.utils import ColumnarFrame, unpack_cursor_object_multiple
+
+
+class ListInterface:
+    # In memory collection of documents, newest quarter first.
+    def __init__(self, documents: list) -> None:
+        self.documents = documents
+
+    def iter_batches(self, collection: str, keys: list, batch_size: int = 128) -> object:
+        for start in range(0, len(self.documents), batch_size):
+            yield [{k: d[k] for k in keys if k in d} for d in self.documents[start:start + batch_size]]
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tesla_financial = TeslaFinancials(host= 'file://db/tesla', memoize= False)
+        return super().setUp()
+
+    def assertSameResult(self, streamed, expected):
+        self.assertEqual(list(streamed), list(expected))
+        for key in expected:
+            if isinstance(expected[key][0], str):
+                self.assertEqual(streamed[key], expected[key])
+            else:
+                np.testing.assert_allclose(np.asarray(streamed[key], dtype= float), np.asarray(expected[key], dtype= float))
+
+    def test_streams_match_getters(self):
+        for batch_size in [1, 3, 5, 128]:
+            for timescale in ['QoQ', 'TTM', 'YoY']:
+                self.assertSameResult(collect(stream_metric(self.tesla_financial, 'get_revenue', timescale, batch_size)),
+                                      self.tesla_financial.get_revenue(timescale= timescale))
+                self.assertSameResult(collect(stream_metric(self.tesla_financial, 'get_net_income_growth', timescale, batch_size)),
+                                      self.tesla_financial.get_net_income_growth(timescale= timescale))
+                self.assertSameResult(collect(stream_metric(self.tesla_financial, 'get_gross_profit_margin', timescale, batch_size)),
+                                      self.tesla_financial.get_gross_profit_margin(timescale= timescale))
+            self.assertSameResult(collect(stream_metric(self.tesla_financial, 'get_current_ratio', batch_size= batch_size)),
+                                  self.tesla_financial.get_current_ratio())
+
+    def test_ttm_keys_checked_in_every_batch(self):
+        # Integers in the newest batch only: the getter does not roll the column, neither does the stream.
+        interface = ListInterface([{'Value': 4, 'Count': 4, 'date': '3Q22'}, {'Value': 3, 'Count': 3, 'date': '2Q22'},
+                                   {'Value': 2.5, 'Count': 2, 'date': '1Q22'}, {'Value': None, 'Count': 1, 'date': '4Q21'}])
+        keys = ['Value', 'Count', 'date']
+        self.assertEqual(integer_keys(interface, 'values', keys, batch_size= 2), ['Count'])
+        expected = self.tesla_financial._to_timescaled_dict(unpack_cursor_object_multiple(interface.documents, keys), 'values', keys, 'TTM')
+        streamed = collect(stream_timescaled(interface, 'values', keys, 'TTM', batch_size= 2))
+        self.assertEqual(list(streamed), list(expected))
+        self.assertEqual(streamed['TTMCount'], expected['TTMCount'])
+        np.testing.assert_array_equal(streamed['Value'], expected['Value'])
+
+    def test_rate_of_change(self):
+        invested_capital = self.tesla_financial.get_invested_capital(timescale= 'QoQ')
+        frame = ColumnarFrame.from_dict(invested_capital)
+        batches = [frame.take(slice(i, i + 2)) for i in range(0, len(frame), 2)]
+        streamed = collect(ttm_stage(growth_stage(batches, 'InvestedCapital', 'Rate', absolute= False), ['Rate'], names= ['RateTTM']))
+        self.assertSameResult(streamed, self.tesla_financial._compute_rate_invested_capital(invested_capital))
+
+    def test_stages_hold_bounded_rows(self):
+        frame = ColumnarFrame({'Value': np.arange(10, 0, -1), 'date': ['{}Q2{}'.format(4 - i % 4, 2 - i // 4) for i in range(10)]})
+        released = []
+        for batch in ttm_stage((frame.take([i]) for i in range(len(frame))), ['Value']):
+            released.append(len(batch))
+        # Three rows wait for their older quarters, then one row is released per row read.
+        self.assertEqual(released, [1] * 7 + [3])
+
+    def test_backfill_job(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        summary = run_job('tesla', host= 'file://db/tesla', output= folder, methods= ['get_revenue', 'get_current_ratio'], batch_size= 4)
+        self.assertEqual(summary['metrics'], 4)
+        with open(summary['target'], 'r', encoding= 'utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), summary['rows'])
+        ttm_revenue = [row['TTMTotalRevenues'] for row in rows if row['metric'] == 'get_revenue:TTM']
+        np.testing.assert_allclose(ttm_revenue, self.tesla_financial.get_revenue(timescale= 'TTM')['TTMTotalRevenues'])
+        self.assertEqual(os.listdir(folder), [os.path.basename(summary['target'])])
+
+if __name__ == '__main__':
+    unittest.main()
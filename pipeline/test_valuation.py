@@ -0,0 +1,69 @@
+# GLOBAL IMPORTS
+import sys
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from pipeline.data_processing import TeslaFinancials
+from pipeline.valuation import cost_of_equity, wacc, discounted_value, value_per_share
+
+
+class TestValuation(unittest.TestCase):
+
+    def test_cost_of_capital(self):
+        self.assertAlmostEqual(float(cost_of_equity(0.04, 2.0, 0.05)), 0.14)
+        np.testing.assert_allclose(wacc([60, 0], [40, 10], 0.1, 0.05, 0.2), [0.6 * 0.1 + 0.4 * 0.05 * 0.8, 0.04])
+
+    def test_discounted_value_matches_loop(self):
+        cash_flows, rates, growths = [100, 110, 120, 130, 140], [0.08, 0.1], [0.0, 0.02, 0.2]
+        result = discounted_value(cash_flows, rates, growths)
+        self.assertEqual(result.shape, (2, 3))
+        for i, rate in enumerate(rates):
+            period_rate = (1 + rate)**0.25 - 1
+            explicit = sum(cf / (1 + period_rate)**(t + 1) for t, cf in enumerate(cash_flows))
+            for j, growth in enumerate(growths):
+                period_growth = (1 + growth)**0.25 - 1
+                if growth >= rate:
+                    self.assertTrue(np.isnan(result[i, j]))
+                    continue
+                terminal = cash_flows[-1] * (1 + period_growth) / (period_rate - period_growth) / (1 + period_rate)**len(cash_flows)
+                self.assertAlmostEqual(result[i, j], explicit + terminal)
+        np.testing.assert_allclose(discounted_value(np.tile(cash_flows, (4, 1)), rates, growths), np.tile(result, (4, 1, 1)))
+        self.assertEqual(float(value_per_share(1000, -200, 10)), 120)
+
+    def test_tesla_wacc_and_dcf(self):
+        tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        for timescale, index in [('QoQ', 'date'), ('TTM', 'date'), ('YoY', 'Year')]:
+            wacc_dict = tesla_financial.get_wacc(timescale= timescale)
+            self.assertEqual(list(wacc_dict)[:4], ['WACC', 'CostOfEquity', 'CostOfDebt', 'TaxRate'])
+            self.assertEqual(list(wacc_dict)[-1], index)
+            self.assertTrue(0 < wacc_dict['WACC'][0] < wacc_dict['CostOfEquity'][0])
+        wacc_dict = tesla_financial.get_wacc(timescale= 'QoQ')
+        self.assertEqual(wacc_dict['Debt'][0], 1457 + 2096)
+        self.assertAlmostEqual(wacc_dict['CostOfDebt'][0], (53 + 44 - 61 + 71) / (1457 + 2096))
+        dcf = tesla_financial.get_dcf_value(discount_rates= [0.1, 0.12], terminal_growth_rates= [0.02], invested_capital_rate= 3)
+        self.assertEqual(np.array(dcf['ValuePerShare']).shape, (2, 1))
+        self.assertGreater(dcf['ValuePerShare'][0][0], dcf['ValuePerShare'][1][0])
+        self.assertEqual(dcf['Shares'], 3468)
+        np.testing.assert_allclose(dcf['ValuePerShare'], (np.array(dcf['EnterpriseValue']) - dcf['NetDebt']) / 3468)
+        # Default scenario: value per share at WACC within the order of magnitude of the share price, not millions of $.
+        dcf = tesla_financial.get_dcf_value()
+        at_wacc = dcf['ValuePerShare'][dcf['DiscountRate'].index(dcf['WACC'])][dcf['TerminalGrowthRate'].index(0.025)]
+        self.assertTrue(10 < at_wacc < 5000)
+        self.assertEqual(dcf['ValuePerShare'], tesla_financial.get_dcf_value(invested_capital_rate= 8)['ValuePerShare'])
+        with self.assertRaises(TypeError):
+            tesla_financial.get_dcf_value(timescale= 'YoY')
+
+    def test_dcf_follows_fcf_roic(self):
+        tesla_financial = TeslaFinancials(host= 'file://db/tesla')
+        def value(**kwargs):
+            return tesla_financial.get_dcf_value(discount_rates= [0.1], terminal_growth_rates= [0.02], invested_capital_rate= 3, **kwargs)['ValuePerShare'][0][0]
+        # FcF ROIC starts below the caps, so a cap twice as high gives less than twice the value.
+        self.assertLess(value(fcf_roic_cap= 0.2), value(fcf_roic_cap= 0.4))
+        self.assertLess(value(fcf_roic_cap= 0.4), 2 * value(fcf_roic_cap= 0.2))
+        self.assertLess(value(fcf_roic_rate= 0), value(fcf_roic_rate= 10))
+        self.assertEqual(value(), value(fcf_roic_rate= tesla_financial._get_rate_fcf_roic()['RateTTM'][0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# GLOBAL IMPORTS
+import sys
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+
+# Valuation building blocks: cost of capital (CAPM cost of equity and WACC) and discounted cash flow value with a Gordon growth
+# terminal value. Every function broadcasts over its inputs, so a whole grid of discount rates and terminal growth rates (or a
+# series of periods) is one array operation. Rates are annual decimals (0.08 = 8%); cash flows are per period, periods_per_year
+# of them per year. Money amounts are in millions of $ and share counts in millions, as in the company collections.
+
+RISK_FREE_RATE = 0.04
+EQUITY_RISK_PREMIUM = 0.055
+# Default valuation grid: discount rates around WACC and terminal growth rates.
+DISCOUNT_RATE_SPREADS = [-0.02, -0.01, 0, 0.01, 0.02]
+TERMINAL_GROWTH_RATES = [0.01, 0.02, 0.025, 0.03, 0.04]
+
+
+def cost_of_equity(risk_free_rate = RISK_FREE_RATE, beta = 1.0, equity_risk_premium = EQUITY_RISK_PREMIUM) -> np.ndarray:
+    """ CAPM cost of equity: risk free rate + beta * equity risk premium.
+
+    Returns:
+        np.ndarray: broadcast of inputs.
+    """
+    return np.asarray(risk_free_rate, dtype= float) + np.asarray(beta, dtype= float) * np.asarray(equity_risk_premium, dtype= float)
+
+
+def wacc(equity, debt, equity_cost, debt_cost, tax_rate) -> np.ndarray:
+    """ Weighted average cost of capital: E / (D + E) * Re + D / (D + E) * Rd * (1 - t).
+
+    Args:
+        equity (_type_): equity value (market or book).
+        debt (_type_): debt value.
+        equity_cost (_type_): cost of equity.
+        debt_cost (_type_): pre tax cost of debt.
+        tax_rate (_type_): effective tax rate.
+
+    Returns:
+        np.ndarray: broadcast of inputs, NaN where equity plus debt is 0.
+    """
+    equity, debt = np.asarray(equity, dtype= float), np.asarray(debt, dtype= float)
+    with np.errstate(divide= 'ignore', invalid= 'ignore'):
+        equity_weight = equity / (equity + debt)
+    return equity_weight * equity_cost + (1 - equity_weight) * np.asarray(debt_cost, dtype= float) * (1 - np.asarray(tax_rate, dtype= float))
+
+
+def discounted_value(cash_flows, discount_rates, terminal_growth_rates, periods_per_year: int = 4) -> np.ndarray:
+    """ Present value of projected cash flows plus the Gordon growth terminal value after the last one. The first cash flow is
+    discounted one period.
+
+    Args:
+        cash_flows (_type_): array-like with periods on the last axis, e.g. (periods,) or (scenarios, periods).
+        discount_rates (_type_): annual discount rates.
+        terminal_growth_rates (_type_): annual growth rates after the last period.
+        periods_per_year (int, optional): Defaults to 4 (quarterly cash flows).
+
+    Returns:
+        np.ndarray: float array of shape cash_flows.shape[:-1] + (len(discount_rates), len(terminal_growth_rates)). NaN where the
+            discount rate does not exceed the terminal growth rate.
+    """
+    cash_flows = np.asarray(cash_flows, dtype= float)
+    period_rates = (1 + np.asarray(discount_rates, dtype= float).reshape(-1, 1))**(1 / periods_per_year) - 1 # (rates, 1)
+    period_growth = (1 + np.asarray(terminal_growth_rates, dtype= float).reshape(1, -1))**(1 / periods_per_year) - 1 # (1, growths)
+    factors = (1 + period_rates)**-np.arange(1, cash_flows.shape[-1] + 1) # (rates, periods)
+    explicit = cash_flows @ factors.T
+    with np.errstate(divide= 'ignore', invalid= 'ignore'):
+        terminal = np.where(period_rates > period_growth, cash_flows[..., -1, None, None] * (1 + period_growth) / (period_rates - period_growth), np.nan)
+    return explicit[..., :, None] + terminal * factors[:, -1:]
+
+
+def value_per_share(enterprise_value, net_debt, shares) -> np.ndarray:
+    """ Equity value per share: (enterprise value - net debt) / shares.
+
+    Returns:
+        np.ndarray: broadcast of inputs.
+    """
+    return (np.asarray(enterprise_value, dtype= float) - np.asarray(net_debt, dtype= float)) / np.asarray(shares, dtype= float)
@@ -0,0 +1,135 @@
+# GLOBAL IMPORTS
+import sys
+import json
+import unittest
+import numpy as np
+
+# LOCAL IMPORTS
+sys.path.insert(0, "C:\\Users\\dario\\pet_projects\\tmts-oracle-app")
+from utils.utils import rolling_window, compute_rolling_window, QuarterIndex, ColumnarFrame, DtypePolicy, QuarterLabelArray, encode_json, _json_builtin
+
+
+class TestRollingWindow(unittest.TestCase):
+
+    def test_forward_mean_matches_slices(self):
+        values = [21454, 16934, 18756, 17719, 13757, 11958]
+        expected = [np.mean(values[i:i+4]) for i in range(len(values))]
+        np.testing.assert_allclose(compute_rolling_window(values, 4), expected)
+
+    def test_min_periods_and_backward_sum(self):
+        result = rolling_window([1, 2, 3, 4], 2, how= 'sum', orientation= 'backward')
+        np.testing.assert_array_equal(result, [np.nan, 3, 5, 7])
+
+    def test_missing_values_are_skipped(self):
+        self.assertEqual(compute_rolling_window([1.0, np.nan, 3.0], 2), [1.0, 3.0, 3.0])
+
+    def test_2d_columns_roll_independently(self):
+        values = np.array([[1, 10], [2, 20], [3, 30]])
+        result = rolling_window(values, 2, min_periods= 1)
+        np.testing.assert_array_equal(result, [[1.5, 15], [2.5, 25], [3, 30]])
+        np.testing.assert_array_equal(rolling_window(values.T, 2, min_periods= 1, axis= 1), result.T)
+
+class TestQuarterIndex(unittest.TestCase):
+
+    def test_labels_round_trip(self):
+        index = QuarterIndex.from_labels(['3Q22', '2Q22', '4Q19'])
+        self.assertEqual(index.years.tolist(), [2022, 2022, 2019])
+        self.assertEqual(index.quarters.tolist(), [3, 2, 4])
+        self.assertEqual(index.labels(), ['3Q22', '2Q22', '4Q19'])
+
+    def test_invalid_label(self):
+        for label in ['3Q2022', '5Q22', '3X22']:
+            with self.assertRaises(ValueError):
+                QuarterIndex.from_labels([label])
+
+    def test_next_quarters_cross_year(self):
+        index = QuarterIndex.from_labels(['3Q22', '2Q22'])
+        self.assertEqual(index.next(3).labels(), ['4Q22', '1Q23', '2Q23'])
+        self.assertEqual(len(index.next(41)), 41)
+        self.assertEqual(index.next(41).labels()[-1], '4Q32')
+
+    def test_sort_and_align(self):
+        index = QuarterIndex.from_labels(['1Q22', '3Q22', '2Q22'])
+        self.assertEqual(index[index.argsort(ascending= False)].labels(), ['3Q22', '2Q22', '1Q22'])
+        self.assertEqual(index.align(QuarterIndex.range('2Q22', 3)).tolist(), [2, 1, -1])
+
+class TestColumnarFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = ColumnarFrame.from_dict({'TotalRevenues': [30, 20, 10, 5], 'Capex': [1.5, None, 2.0, 1.0], 'date': ['1Q22', '4Q21', '3Q21', '2Q21']})
+
+    def test_dict_round_trip_keeps_types(self):
+        data = self.frame.to_dict()
+        self.assertEqual(list(data), ['TotalRevenues', 'Capex', 'date'])
+        self.assertEqual(data['TotalRevenues'], [30, 20, 10, 5])
+        self.assertIsInstance(data['TotalRevenues'][0], int)
+        self.assertTrue(np.isnan(data['Capex'][1]))
+        self.assertEqual(data['date'], ['1Q22', '4Q21', '3Q21', '2Q21'])
+
+    def test_insert_shift_and_drop(self):
+        self.frame.insert(0, 'Growth', (self.frame['TotalRevenues'] - self.frame.shift('TotalRevenues')) / self.frame.shift('TotalRevenues'))
+        self.assertEqual(self.frame.columns[0], 'Growth')
+        np.testing.assert_allclose(self.frame['Growth'], [0.5, 1, 1, np.nan])
+        self.assertEqual(self.frame.drop(['Growth', 'Capex']).columns, ['TotalRevenues', 'date'])
+        with self.assertRaises(ValueError):
+            self.frame['Bad'] = [1, 2]
+
+    def test_group_sum_by_year(self):
+        frame = self.frame.drop(['date'])
+        frame['Year'] = self.frame.index.years
+        yearly = frame.group_sum('Year').to_dict()
+        self.assertEqual(yearly, {'Year': [2022, 2021], 'TotalRevenues': [30, 35], 'Capex': [1.5, 3.0]})
+
+    def test_chronological(self):
+        self.assertEqual(self.frame.chronological()['date'].tolist(), ['2Q21', '3Q21', '4Q21', '1Q22'])
+        self.assertEqual(ColumnarFrame({'Year': [2022, 2021]}).chronological()['Year'].tolist(), [2021, 2022])
+
+    def test_concat(self):
+        frame = ColumnarFrame.concat([self.frame.take(slice(0, 1)), ColumnarFrame(), self.frame.take(slice(1, None))])
+        self.assertEqual(frame.to_dict()['TotalRevenues'], [30, 20, 10, 5])
+        self.assertEqual(frame.columns, self.frame.columns)
+
+class TestDtypePolicy(unittest.TestCase):
+
+    def test_compact_dtypes(self):
+        policy = DtypePolicy()
+        self.assertEqual(policy.compact([21454, -16934]).dtype, np.int32)
+        self.assertEqual(policy.compact([2**40, 1]).dtype, np.int64)
+        self.assertEqual(policy.compact([0.5, 2.0, np.nan]).dtype, np.float32)
+        self.assertEqual(policy.compact([0.1, 2.0]).dtype, np.float64)
+        self.assertEqual(policy.compact([1, None]), [1, None])
+        self.assertEqual(policy.compact([True, False]), [True, False])
+        labels = policy.compact(['3Q22', '2Q22', '1Q22'])
+        self.assertIsInstance(labels, QuarterLabelArray)
+        self.assertEqual(labels.nbytes, 6)
+        self.assertEqual(labels[1:].tolist(), ['2Q22', '1Q22'])
+        self.assertEqual(labels[np.array([2, 0])].tolist(), ['1Q22', '3Q22'])
+        self.assertEqual(policy.compact(['Tesla', 'Ford']).tolist(), ['Tesla', 'Ford'])
+
+    def test_values_round_trip(self):
+        for values in [[21454, 16934], [0.95, -1.25, np.inf], ['4Q21', '3Q21']]:
+            compacted = DtypePolicy().compact(values)
+            self.assertEqual(compacted.tolist(), values)
+            self.assertEqual([type(v) for v in compacted.tolist()], [type(v) for v in values])
+
+    def test_precision_check(self):
+        ratios = np.array([0.1, 0.3337, 1 / 3, np.nan])
+        self.assertEqual(DtypePolicy().compact(ratios).dtype, np.float64)
+        lossy = DtypePolicy(float_rtol= 1e-6)
+        compacted = lossy.compact(ratios)
+        self.assertEqual(compacted.dtype, np.float32)
+        np.testing.assert_allclose(compacted, ratios, rtol= 1e-6)
+        self.assertEqual(lossy.compact([1e300, 1.5]).dtype, np.float64)
+        self.assertFalse(lossy.check_precision([np.nan], [0.0]))
+
+class TestEncodeJson(unittest.TestCase):
+
+    def test_numpy_values(self):
+        document = {'Ratio': np.array([0.5, np.nan], dtype= np.float32), 'Shares': np.arange(2, dtype= np.int16), 'Year': np.int64(2022),
+                    'date': QuarterLabelArray.from_labels(['3Q22', '2Q22']), 'name': np.array(['Tesla'])}
+        expected = {'Ratio': [0.5, None], 'Shares': [0, 1], 'Year': 2022, 'date': ['3Q22', '2Q22'], 'name': ['Tesla']}
+        self.assertEqual(json.loads(encode_json(document)), expected)
+        self.assertEqual(_json_builtin(document), expected)
+
+if __name__ == '__main__':
+    unittest.main()
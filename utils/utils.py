@@ -1,16 +1,28 @@
 # GLOBAL IMPORTS
+import os
+import json
 import numpy as np
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # General purpose functions
 
 def unpack_cursor_object(object, field: str) -> list:
+    if hasattr(object, 'columns'):
+        # Columnar snapshot cursor: no per document unpacking needed.
+        return object.columns[field].tolist()
     obj_list = []
     for obj in object:
         obj_list.append(obj[field])
     return obj_list
 
 def unpack_cursor_object_multiple(object, field: list = []) -> dict:
+    if hasattr(object, 'columns'):
+        # Columnar snapshot cursor: no per document unpacking needed.
+        return {f: object.columns[f].tolist() for f in field if f in object.columns}
     obj_dict = {}
     for obj in object:
         for f in field:
@@ -20,6 +32,435 @@ def unpack_cursor_object_multiple(object, field: list = []) -> dict:
                 obj_dict[f] = [obj[f]]
     return obj_dict
 
+def quarter_label_to_ordinal(label: str) -> int:
+    # '3Q22' -> 2022 * 4 + 3 - 1. Consecutive quarters have consecutive ordinals.
+    return (2000 + int(label[2:])) * 4 + int(label[0]) - 1
+
+def ordinal_to_quarter_label(ordinal: int) -> str:
+    year, quarter = divmod(int(ordinal), 4)
+    return '{}Q{:02d}'.format(quarter + 1, year % 100)
+
+class QuarterIndex:
+    """ Compact index of quarters stored as an integer array of ordinals (see quarter_label_to_ordinal), so that parsing, grouping,
+    sorting and range generation are array operations instead of per label string work.
+
+    Args:
+        ordinals (_type_): array-like of quarter ordinals.
+    """
+    def __init__(self, ordinals) -> None:
+        self.ordinals = np.asarray(ordinals, dtype=np.int64).reshape(-1)
+
+    @classmethod
+    def from_labels(cls, labels) -> 'QuarterIndex':
+        """ Parse labels such as '3Q22' in a single pass over their code points.
+
+        Args:
+            labels (_type_): iterable of quarter labels.
+
+        Raises:
+            ValueError: a label does not follow the '<quarter>Q<yy>' format.
+
+        Returns:
+            QuarterIndex: index with one ordinal per label.
+        """
+        labels = np.asarray(labels, dtype=str).reshape(-1)
+        if len(labels) == 0:
+            return cls([])
+        if labels.dtype.itemsize != 16 or (np.char.str_len(labels) != 4).any():
+            raise ValueError('Quarter labels must have the format "3Q22"')
+        codes = labels.view(np.uint32).reshape(-1, 4).astype(np.int64) - ord('0')
+        quarters, years = codes[:, 0], 2000 + codes[:, 2] * 10 + codes[:, 3]
+        if (codes[:, 1] != ord('Q') - ord('0')).any() or ((quarters < 1) | (quarters > 4)).any() or ((codes[:, 2:] < 0) | (codes[:, 2:] > 9)).any():
+            raise ValueError('Quarter labels must have the format "3Q22"')
+        return cls(years * 4 + quarters - 1)
+
+    @classmethod
+    def range(cls, start, periods: int, step: int = 1) -> 'QuarterIndex':
+        """ Consecutive quarters.
+
+        Args:
+            start (_type_): first quarter, as label or ordinal.
+            periods (int): number of quarters.
+            step (int, optional): quarters between consecutive entries, -1 goes back in time. Defaults to 1.
+
+        Returns:
+            QuarterIndex: generated index.
+        """
+        start = quarter_label_to_ordinal(start) if isinstance(start, str) else int(start)
+        return cls(start + step * np.arange(periods))
+
+    @property
+    def years(self) -> np.ndarray:
+        return self.ordinals // 4
+
+    @property
+    def quarters(self) -> np.ndarray:
+        return self.ordinals % 4 + 1
+
+    def labels(self) -> list:
+        """ Quarter labels such as '3Q22'.
+
+        Returns:
+            list: one label per quarter.
+        """
+        if len(self) == 0:
+            return []
+        return np.char.add(np.char.add(self.quarters.astype(str), 'Q'), np.char.zfill((self.years % 100).astype(str), 2)).tolist()
+
+    def argsort(self, ascending: bool = True) -> np.ndarray:
+        """ Stable positions that sort the index chronologically.
+
+        Args:
+            ascending (bool, optional): oldest quarter first. Defaults to True.
+
+        Returns:
+            np.ndarray: positions.
+        """
+        return np.argsort(self.ordinals if ascending else -self.ordinals, kind='stable')
+
+    def latest(self) -> int:
+        return int(self.ordinals.max())
+
+    def next(self, periods: int) -> 'QuarterIndex':
+        """ Quarters following the latest one in index, e.g. projection periods.
+
+        Args:
+            periods (int): number of quarters.
+
+        Returns:
+            QuarterIndex: generated index.
+        """
+        return QuarterIndex.range(self.latest() + 1, periods)
+
+    def align(self, other: 'QuarterIndex') -> np.ndarray:
+        """ Position in this index of every quarter of other. Missing quarters get -1.
+
+        Args:
+            other (QuarterIndex): quarters to look up.
+
+        Returns:
+            np.ndarray: positions, same length as other.
+        """
+        order = np.argsort(self.ordinals, kind='stable')
+        sorted_ordinals = self.ordinals[order]
+        found = np.searchsorted(sorted_ordinals, other.ordinals).clip(0, max(len(self) - 1, 0))
+        if len(self) == 0:
+            return np.full(len(other), -1)
+        return np.where(sorted_ordinals[found] == other.ordinals, order[found], -1)
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __getitem__(self, item) -> 'QuarterIndex':
+        return QuarterIndex(self.ordinals[item])
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, QuarterIndex) and np.array_equal(self.ordinals, other.ordinals)
+
+    def __repr__(self) -> str:
+        return 'QuarterIndex({})'.format(self.labels())
+
+class ColumnarFrame:
+    """ Lightweight table of named 1D NumPy columns of equal length, rows in database order (newest quarter first). Pipeline
+    methods compute on whole columns and results are converted to dicts of lists only when they leave the pipeline (to_dict);
+    pages plot the column arrays directly.
+
+    Args:
+        columns (dict, optional): column name -> array-like. Defaults to None.
+    """
+    def __init__(self, columns: dict = None) -> None:
+        self._columns = {}
+        for name, values in (columns or {}).items():
+            self[name] = values
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ColumnarFrame':
+        """ Frame from a dict of lists (the layout returned by getters) or a copy of another frame.
+
+        Returns:
+            ColumnarFrame: _description_
+        """
+        return cls(data._columns if isinstance(data, ColumnarFrame) else data)
+
+    @classmethod
+    def concat(cls, frames: list) -> 'ColumnarFrame':
+        """ Rows of several frames with the columns of the first one, one frame after the other. Integer columns become float when
+        another frame holds floats in them.
+
+        Returns:
+            ColumnarFrame: _description_
+        """
+        frames = [frame for frame in frames if len(frame.columns) > 0]
+        if len(frames) == 0:
+            return cls()
+        return cls({name: np.concatenate([frame[name] for frame in frames]) for name in frames[0].columns})
+
+    def to_dict(self) -> dict:
+        """ Dict of lists of Python scalars, e.g. for callers, caches and JSON.
+
+        Returns:
+            dict: one list per column.
+        """
+        return {name: values.tolist() for name, values in self._columns.items()}
+
+    @property
+    def columns(self) -> list:
+        return list(self._columns.keys())
+
+    @property
+    def index(self) -> QuarterIndex:
+        """ Quarters of the rows, from the 'date' (or 'Quarter') column.
+        """
+        for date_key in ['date', 'Quarter']:
+            if date_key in self._columns:
+                return QuarterIndex.from_labels(self._columns[date_key])
+        raise KeyError('Frame has no quarter column')
+
+    def __len__(self) -> int:
+        return len(next(iter(self._columns.values()))) if len(self._columns) > 0 else 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    def __setitem__(self, name: str, values) -> None:
+        # Existing columns keep their position, new ones are appended.
+        self._columns[name] = self._to_column(values)
+
+    def insert(self, loc: int, name: str, values) -> None:
+        """ Add a column at position loc.
+        """
+        columns = list(self._columns.items())
+        columns.insert(loc, (name, self._to_column(values)))
+        self._columns = dict(columns)
+
+    def drop(self, names: list) -> 'ColumnarFrame':
+        """ Frame without some columns.
+
+        Returns:
+            ColumnarFrame: _description_
+        """
+        return ColumnarFrame({k: v for k, v in self._columns.items() if k not in names})
+
+    def take(self, positions) -> 'ColumnarFrame':
+        """ Frame with the rows at positions.
+
+        Returns:
+            ColumnarFrame: _description_
+        """
+        return ColumnarFrame({k: v[positions] for k, v in self._columns.items()})
+
+    def shift(self, name: str, periods: int = -1) -> np.ndarray:
+        """ Float copy of a column moved by periods rows, NaN filled. periods= -1 aligns every row with the previous (older) quarter.
+
+        Returns:
+            np.ndarray: _description_
+        """
+        values = np.asarray(self._columns[name], dtype=float)
+        shifted = np.full(len(values), np.nan)
+        if periods >= 0:
+            shifted[periods:] = values[:len(values) - periods]
+        else:
+            shifted[:periods] = values[-periods:]
+        return shifted
+
+    def group_sum(self, key: str) -> 'ColumnarFrame':
+        """ Sum every other column by the values of key (e.g. 'Year'). Groups are sorted in descending order, missing values count as 0.
+
+        Raises:
+            TypeError: a column to sum is not numeric.
+
+        Returns:
+            ColumnarFrame: key column followed by the summed columns.
+        """
+        groups, positions = np.unique(self._columns[key], return_inverse= True)
+        result = {key: groups[::-1]}
+        for name, values in self._columns.items():
+            if name == key:
+                continue
+            if values.dtype.kind not in 'biuf':
+                raise TypeError('Column {} is not numeric'.format(name))
+            if values.dtype.kind == 'f':
+                values = np.where(np.isnan(values), 0.0, values)
+            sums = np.zeros(len(groups), dtype= np.int64 if values.dtype.kind == 'b' else values.dtype)
+            np.add.at(sums, positions, values)
+            result[name] = sums[::-1]
+        return ColumnarFrame(result)
+
+    def chronological(self) -> 'ColumnarFrame':
+        """ Rows sorted from oldest to newest period, for quarterly ('date' or 'Quarter') or yearly ('Year') data. Other frames are
+        reversed.
+
+        Returns:
+            ColumnarFrame: _description_
+        """
+        if 'date' in self._columns or 'Quarter' in self._columns:
+            return self.take(self.index.argsort())
+        if 'Year' in self._columns:
+            return self.take(np.argsort(self._columns['Year'], kind='stable'))
+        return self.take(slice(None, None, -1))
+
+    def to_pandas(self) -> object:
+        import pandas as pd
+        return pd.DataFrame(self._columns)
+
+    def _to_column(self, values) -> np.ndarray:
+        if np.ndim(values) == 0:
+            values = np.full(len(self), values)
+        column = self.to_array(values)
+        if len(self._columns) > 0 and len(column) != len(self):
+            raise ValueError('Length of values ({}) does not match length of frame ({})'.format(len(column), len(self)))
+        return column
+
+    @staticmethod
+    def to_array(values) -> np.ndarray:
+        """ 1D array of a list: integer, float (None becomes NaN), string or, for anything else, object dtype.
+        """
+        if isinstance(values, np.ndarray):
+            return values.reshape(-1)
+        values = list(values)
+        array = np.asarray(values)
+        if array.dtype.kind == 'U' and not all(isinstance(v, str) for v in values):
+            # NumPy would cast numbers mixed with strings to strings.
+            array = np.asarray(values, dtype=object)
+        if array.dtype.kind == 'O' and any(v is None for v in values):
+            try:
+                array = np.asarray([np.nan if v is None else v for v in values], dtype=float)
+            except (TypeError, ValueError):
+                pass
+        return array.reshape(-1)
+
+    def __repr__(self) -> str:
+        return 'ColumnarFrame({} rows: {})'.format(len(self), ', '.join(self.columns))
+
+class QuarterLabelArray:
+    """ Column of quarter labels ('3Q22') stored as int16 quarter ordinals, 2 bytes per row instead of 16 for a string array. It
+    supports what readers do with cached columns: len, slicing, integer and mask indexing, nbytes and tolist.
+
+    Args:
+        ordinals (_type_): array-like of quarter ordinals.
+    """
+    def __init__(self, ordinals) -> None:
+        self.ordinals = np.asarray(ordinals, dtype=np.int16).reshape(-1)
+
+    @classmethod
+    def from_labels(cls, labels) -> 'QuarterLabelArray':
+        """ Compact copy of labels, None if a label does not follow the '<quarter>Q<yy>' format.
+        """
+        try:
+            return cls(QuarterIndex.from_labels(labels).ordinals)
+        except ValueError:
+            return None
+
+    @property
+    def nbytes(self) -> int:
+        return self.ordinals.nbytes
+
+    def tolist(self) -> list:
+        return [ordinal_to_quarter_label(o) for o in self.ordinals.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __getitem__(self, item) -> object:
+        ordinals = self.ordinals[item]
+        return QuarterLabelArray(ordinals) if np.ndim(ordinals) > 0 else ordinal_to_quarter_label(ordinals)
+
+    def __array__(self, dtype = None, copy = None) -> np.ndarray:
+        return np.asarray(self.tolist(), dtype=dtype)
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + self.ordinals.__sizeof__()
+
+    def __repr__(self) -> str:
+        return 'QuarterLabelArray({})'.format(self.tolist())
+
+class DtypePolicy:
+    """ Storage dtypes of series kept in memory by caches (collection snapshots, memoized results). Integer columns ($m line items,
+    share counts) are stored as `integer` when every value fits, float columns as `floating` when the round trip error passes
+    check_precision, and quarter labels as QuarterLabelArray. Readers get back the same Python values (tolist), computations keep
+    running on 64 bit arrays.
+
+    Args:
+        integer (str, optional): compact integer dtype, None to keep int64. Defaults to 'int32'.
+        floating (str, optional): compact float dtype, None to keep float64. Defaults to 'float32'.
+        float_rtol (float, optional): maximum relative error of compact floats. Defaults to 0 (lossless only).
+        quarter_labels (bool, optional): store quarter labels as ordinals. Defaults to True.
+    """
+    def __init__(self, integer: str = 'int32', floating: str = 'float32', float_rtol: float = 0.0, quarter_labels: bool = True) -> None:
+        self.integer = None if integer is None else np.dtype(integer)
+        self.floating = None if floating is None else np.dtype(floating)
+        self.float_rtol = float_rtol
+        self.quarter_labels = quarter_labels
+
+    @classmethod
+    def from_env(cls) -> 'DtypePolicy':
+        """ Policy set by environment variables: COMPACT_DTYPES=0 disables compaction, COMPACT_FLOAT_RTOL sets float_rtol.
+        """
+        if os.environ.get('COMPACT_DTYPES', '1') == '0':
+            return cls(integer= None, floating= None, quarter_labels= False)
+        return cls(float_rtol= float(os.environ.get('COMPACT_FLOAT_RTOL', 0.0)))
+
+    def compact(self, values) -> object:
+        """ Compact copy of a column. Lists are compacted only when all their elements have the same type (int, float or str), so
+        that tolist() gives back identical elements. Anything else is returned unchanged.
+
+        Args:
+            values (_type_): NumPy array or list.
+
+        Returns:
+            object: NumPy array, QuarterLabelArray or values.
+        """
+        array = self._to_array(values)
+        if array is None or isinstance(array, np.ma.MaskedArray) or len(array) == 0:
+            return values
+        if array.dtype.kind == 'i' and self.integer is not None and self.integer.itemsize < array.dtype.itemsize:
+            info = np.iinfo(self.integer)
+            if info.min <= array.min() and array.max() <= info.max:
+                return array.astype(self.integer)
+        elif array.dtype.kind == 'f' and self.floating is not None and self.floating.itemsize < array.dtype.itemsize:
+            with np.errstate(over= 'ignore'):
+                # Out of range values become inf and fail the precision check.
+                compacted = array.astype(self.floating)
+            if self.check_precision(array, compacted):
+                return compacted
+        elif array.dtype.kind == 'U' and self.quarter_labels:
+            compacted = QuarterLabelArray.from_labels(array)
+            if compacted is not None:
+                return compacted
+        return array if isinstance(values, list) else values
+
+    def check_precision(self, values, compacted) -> bool:
+        """ Whether a compact copy of a float column is within float_rtol of it. NaN and infinite values must be kept as they are.
+
+        Returns:
+            bool: _description_
+        """
+        values, restored = np.asarray(values, dtype=float), np.asarray(compacted, dtype=float)
+        same = (values == restored) | (np.isnan(values) & np.isnan(restored))
+        if same.all():
+            return True
+        with np.errstate(divide= 'ignore', invalid= 'ignore'):
+            error = np.abs(restored[~same] - values[~same]) / np.abs(values[~same])
+        return bool((error <= self.float_rtol).all())
+
+    @staticmethod
+    def _to_array(values) -> np.ndarray:
+        if not isinstance(values, list):
+            return values if isinstance(values, np.ndarray) else None
+        types = set(type(v) for v in values)
+        if len(types) != 1 or types.pop() not in (int, float, str):
+            return None
+        try:
+            return np.asarray(values)
+        except OverflowError:
+            return None
+
 def dict_values_to_list_values_in_dict(dict_with_dicts: dict = {}) -> dict:
     dict_with_lists = {}
     for key,values in dict_with_dicts.items():
@@ -30,12 +471,100 @@ def dict_values_to_list_values_in_dict(dict_with_dicts: dict = {}) -> dict:
     return dict_with_lists
 
 
-def compute_rolling_window(input_list: list = [], n_periods: int = 0) -> list:
-    output_list = []
-    for i in range (len(input_list)):
-        rolling_value = sum(input_list[i:i+n_periods]) / n_periods
-        output_list.append(rolling_value)
-    return output_list
+def rolling_window(array, n_periods: int, how: str = 'mean', min_periods: int = None, orientation: str = 'forward', axis: int = 0) -> np.ndarray:
+    """ O(n) rolling sum or mean based on cumulative sums. NaN values are treated as missing.
+
+    Args:
+        array (_type_): 1D or 2D array-like. With 2D input every column (axis= 0) or row (axis= 1) rolls independently.
+        n_periods (int): window length.
+        how (str, optional): 'mean' or 'sum'. Defaults to 'mean'.
+        min_periods (int, optional): minimum of non missing values in a window, otherwise result is NaN. Defaults to n_periods.
+        orientation (str, optional): 'forward' covers positions [i, i + n_periods), which is the trailing window for data sorted from
+            newest to oldest quarter. 'backward' covers (i - n_periods, i]. Defaults to 'forward'.
+        axis (int, optional): axis along which the window rolls. Defaults to 0.
+
+    Raises:
+        ValueError: wrong how, orientation or n_periods.
+
+    Returns:
+        np.ndarray: float array with the same shape as input.
+    """
+    if how not in ['mean', 'sum']:
+        raise ValueError('Rolling window aggregation must be "mean" or "sum"')
+    if orientation not in ['forward', 'backward']:
+        raise ValueError('Rolling window orientation must be "forward" or "backward"')
+    if n_periods < 1:
+        raise ValueError('Rolling window needs at least one period')
+    min_periods = n_periods if min_periods is None else min_periods
+    values = np.moveaxis(np.asarray(array, dtype=float), axis, 0)
+    if orientation == 'forward':
+        values = values[::-1]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    n_rows = values.shape[0]
+    upper = np.arange(1, n_rows + 1)
+    lower = np.maximum(upper - n_periods, 0)
+    counts = _prefix_sum(valid.astype(float))
+    counts = counts[upper] - counts[lower]
+    if np.isfinite(filled).all():
+        sums = _prefix_sum(filled)
+        sums = sums[upper] - sums[lower]
+    else:
+        # Infinite values would leak into every later window through the cumulative sum.
+        padded = np.concatenate([np.zeros((n_periods - 1,) + filled.shape[1:]), filled])
+        sums = np.lib.stride_tricks.sliding_window_view(padded, n_periods, axis= 0).sum(axis= -1)
+    with np.errstate(invalid= 'ignore', divide= 'ignore'):
+        result = sums / counts if how == 'mean' else sums
+    result = np.where(counts >= max(min_periods, 1), result, np.nan)
+    if orientation == 'forward':
+        result = result[::-1]
+    return np.moveaxis(result, 0, axis)
+
+def _prefix_sum(values: np.ndarray) -> np.ndarray:
+    # Cumulative sum along first axis with a leading row of zeros, so that window sums are prefix[upper] - prefix[lower].
+    return np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis= 0)])
+
+def compute_rolling_window(input_list: list = [], n_periods: int = 0, how: str = 'mean', min_periods: int = 1) -> list:
+    # Forward window over newest-first data. Truncated tail windows are averaged over the values they hold (as $avg does in
+    # db.aggregation.ttm_pipeline) instead of being divided by n_periods.
+    if len(input_list) == 0:
+        return []
+    return rolling_window(input_list, n_periods, how= how, min_periods= min_periods).tolist()
+
+def encode_json(document: object) -> bytes:
+    """ UTF-8 JSON encoding of a document of dicts, lists, scalars and NumPy arrays or scalars. Uses orjson when installed, which
+    serializes NumPy arrays natively; the standard library encoder is the fallback. NaN and infinite values are encoded as null
+    by both.
+
+    Args:
+        document (object): _description_
+
+    Returns:
+        bytes: _description_
+    """
+    if orjson is not None:
+        return orjson.dumps(document, option= orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default= _json_default)
+    return json.dumps(_json_builtin(document), separators= (',', ':'), ensure_ascii= False).encode('utf-8')
+
+def _json_default(value: object) -> object:
+    # Arrays orjson does not serialize natively (e.g. strings, non contiguous) and other NumPy values.
+    if isinstance(value, (np.ndarray, np.generic, QuarterLabelArray)):
+        return _json_builtin(value)
+    raise TypeError('Type is not JSON serializable: {}'.format(type(value).__name__))
+
+def _json_builtin(value: object) -> object:
+    # Builtin form of a document for the standard library encoder, with non finite floats as None.
+    if isinstance(value, dict):
+        return {k if isinstance(k, str) else str(k): _json_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_builtin(v) for v in value]
+    if isinstance(value, QuarterLabelArray):
+        return value.tolist()
+    if isinstance(value, (np.ndarray, np.generic)):
+        return _json_builtin(value.tolist())
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
 
 def get_list(set) -> list:
     list = []
@@ -44,7 +573,8 @@ def get_list(set) -> list:
          
     return list
 
-def average_of_dict_keys_n_values(input_dict: dict = {}, keys: list = [], number_of_values_for_average: list = []) -> int:
-    first_output_int = input_dict[keys[0]][0]
-    second_output_int = np.average(np.asarray(input_dict[keys[1]][:5]))
-    return first_output_int, second_output_int
\ No newline at end of file
+def average_of_dict_keys_n_values(input_dict: dict = {}, keys: list = [], number_of_values_for_average: list = []) -> tuple:
+    """ Mean of the first n values of every key, e.g. [1, 4] gives the latest value of the first key and the 4qtr mean of the second.
+    NaN values are ignored.
+    """
+    return tuple(np.nanmean(np.asarray(input_dict[key][:n], dtype= float)) for key, n in zip(keys, number_of_values_for_average))
\ No newline at end of file